@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import List
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 from pathlib import Path
 
@@ -16,6 +16,70 @@ class Settings(BaseSettings):
     default_rtsp_port: int = 554
     hls_segment_duration: int = 2
     hls_playlist_size: int = 5
+    stream_start_concurrency: int = 4  # Parallel FFmpeg starts for bulk requests
+    stream_idle_timeout: float = 60.0  # Stop streams nobody fetched for this long (0 disables)
+    stream_reaper_interval: float = 10.0
+
+    # Supervised restarts of dropped streams
+    stream_restart_base_delay: float = 2.0
+    stream_restart_max_delay: float = 60.0
+    stream_restart_max_failures: int = 5  # Consecutive failures before the circuit opens
+    stream_stable_after: float = 30.0  # Uptime that resets the failure streak
+    stream_circuit_cooldown: float = 300.0  # Dahua lockouts typically last 5 minutes
+
+    # Global stream budget (0 disables a limit). When a budget is exhausted
+    # the admission policy applies: "evict" stops the least recently viewed
+    # stream, "queue" waits for capacity, "reject" answers 429
+    stream_max_processes: int = 16
+    stream_cpu_budget: float = 0  # Estimated CPU cores for all streams
+    stream_bandwidth_budget_kbps: int = 0  # Estimated camera bandwidth for all streams
+    stream_cpu_copy: float = 0.05  # Estimated cores per remuxed (copy) stream
+    stream_cpu_transcode: float = 1.0  # Estimated cores per transcoded stream
+    stream_cpu_decode: float = 0.25  # Estimated cores per low-rate decoder (snapshots, motion)
+    stream_admission_policy: str = "evict"
+    stream_admission_timeout: float = 15.0  # Max queueing time with the "queue" policy
+
+    # Per-stream telemetry from FFmpeg's -progress reports (about 2 per second)
+    stream_metrics_samples: int = 120  # Reports kept per stream
+    stream_metrics_min_speed: float = 0.95  # Average speed below this flags a stream as degraded
+    stream_metrics_stall_seconds: float = 5.0  # Report age that flags a stream as stalled
+
+    # Stream registry shared by API workers (uvicorn --workers), so exactly
+    # one FFmpeg runs per stream and every worker can answer its status.
+    # Set stream_multi_worker when running several workers; the stream
+    # worker and handover below use the registry regardless
+    stream_multi_worker: bool = False
+    stream_heartbeat_interval: float = 5.0
+    stream_lease_timeout: float = 20.0  # Heartbeat age after which another worker takes a stream over
+    # When set, FFmpeg runs in the standalone stream worker
+    # (python -m app.stream_worker) listening on this socket, and the API
+    # only forwards start/stop calls to it
+    stream_worker_socket: Optional[Path] = None
+    # Leave running disk- and RAM-backed FFmpeg processes to the next server
+    # process on shutdown (reloads, deploys) instead of stopping them (Linux)
+    stream_handover: bool = False
+
+    # Continuous recording (cameras with record enabled) into an on-disk
+    # ring buffer per camera, written by the live stream's FFmpeg
+    recording_segment_seconds: int = 10
+    recording_retention_hours: float = 48  # 0 keeps segments regardless of age
+    recording_max_gb: float = 0  # Per-camera size cap, 0 disables
+
+    # Motion detection (needs numpy) on small grayscale substream frames
+    motion_fps: float = 3.0
+    motion_width: int = 160
+    motion_height: int = 96
+    motion_pixel_threshold: int = 25  # Gray level change that counts a pixel as changed
+    motion_background_alpha: float = 0.05  # How fast the background adapts, per frame
+    motion_min_area: float = 0.01  # Fraction of the frame moving that counts as motion
+    motion_trigger_frames: int = 2  # Consecutive moving frames that open an event
+    motion_cooldown: float = 5.0  # Still seconds that close an event
+
+    # Event clips cut from the HLS segments of a running stream
+    clip_preroll_seconds: float = 5.0
+    clip_postroll_seconds: float = 10.0
+    clip_max_seconds: float = 60.0  # Cap on preroll + postroll per clip
+    clip_on_motion: bool = False  # Cut a clip for each motion event on a streaming camera
 
     # Network scanning
     network_scan_timeout: float = 1.0
@@ -24,6 +88,51 @@ class Settings(BaseSettings):
     # Paths
     base_dir: Path = Path(__file__).parent.parent
     hls_output_dir: Path = base_dir / "streams"
+    recording_dir: Path = base_dir / "recordings"
+    clip_dir: Path = base_dir / "clips"
+
+    # HLS segment storage: "auto" uses tmpfs when available, "ram" requires it
+    # (startup fails without one), "disk" always writes to hls_output_dir and
+    # "memory" has FFmpeg upload segments into the API process over HTTP
+    hls_storage: str = "auto"
+    hls_ram_dir: Optional[Path] = None  # Defaults to /dev/shm/jarvis-hls
+    hls_ram_budget_mb: int = 64  # Per-camera cap for RAM/memory-backed segments
+    hls_memory_segments: int = 6  # Segments kept per stream in memory mode
+    internal_base_url: str = "http://127.0.0.1:8101"  # Where FFmpeg reaches this server
+
+    # LL-HLS (memory storage only): fMP4 parts with blocking playlist reload
+    hls_low_latency: bool = False
+    hls_part_duration: float = 0.333  # Seconds per partial segment
+    hls_parts_per_segment: int = 3
+    hls_blocking_timeout: float = 3.0  # Max wait for a blocking reload
+
+    # Adaptive bitrate: master playlist over the main stream and substream
+    # (copied), plus an optional transcoded low rung
+    hls_abr: bool = False
+    hls_abr_low_rung: bool = False
+    hls_abr_low_height: int = 240
+    hls_abr_low_bitrate_kbps: int = 300
+    hls_abr_main_bandwidth_kbps: int = 4096  # Estimates for copied streams (ABR, budgets)
+    hls_abr_sub_bandwidth_kbps: int = 768
+
+    # WebSocket fMP4 relay
+    ws_fragment_duration: float = 0.5  # Max seconds per pushed fragment
+    ws_queue_fragments: int = 8  # Fragments buffered per client before dropping
+    ws_max_drops: int = 30  # Consecutive drops before a client is disconnected
+    ws_start_timeout: float = 15.0  # Wait for the relay's init segment
+
+    # Snapshot / MJPEG frame cache
+    snapshot_fps: float = 0.5  # Frames decoded per second per camera
+    snapshot_width: int = 640
+    snapshot_quality: int = 5  # FFmpeg -q:v, 2 (best) to 31
+    snapshot_timeout: float = 10.0  # Wait for a first or next frame
+    snapshot_idle_timeout: float = 30.0  # Stop a decoder nobody has asked for
+
+    # Camera list thumbnails: one keyframe from the newest segment per camera
+    thumbnail_interval: float = 30.0  # Refresh period for cameras with segments
+    thumbnail_ttl: float = 300.0  # Oldest thumbnail still served
+    thumbnail_width: int = 320
+    thumbnail_cache_size: int = 64  # Cameras kept in memory (LRU)
 
     class Config:
         env_file = ".env"
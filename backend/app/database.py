@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
 from .config import settings
@@ -25,6 +25,30 @@ def get_db():
         db.close()
 
 
+def _add_missing_columns():
+    """
+    Add model columns that are missing from existing tables.
+
+    ``create_all`` only creates new tables, so columns added to a model after
+    a database was created are appended here with their scalar default.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                if column.default is not None and column.default.is_scalar:
+                    value = column.default.arg
+                    ddl += f" DEFAULT {int(value) if isinstance(value, bool) else repr(value)}"
+                conn.execute(text(ddl))
+
+
 def init_db():
     """Initialize the database tables."""
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
@@ -0,0 +1,167 @@
+"""
+Compare HLS delivery modes from the viewers' side.
+
+    python -m app.hls_benchmark --camera 1 --viewers 4 --duration 60
+
+Joins a camera's stream on a running server and has simulated players
+follow it the way hls.js does: plain HLS reloads the playlist every target
+duration (half of it while nothing changed) and fetches each new segment,
+LL-HLS (HLS_LOW_LATENCY) holds blocking playlist reloads for the next part
+and fetches each new part. Run it once per server configuration and compare
+the per-viewer request rate and the estimated live latency: the hold-back a
+player keeps from the live edge, plus how long new media took to show up in
+a playlist the player fetched, plus its download time.
+"""
+import argparse
+import asyncio
+import re
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+from urllib.parse import urljoin
+
+import httpx
+
+_TARGET_DURATION = re.compile(r"#EXT-X-TARGETDURATION:(\d+)")
+_PART_HOLD_BACK = re.compile(r"PART-HOLD-BACK=([\d.]+)")
+_PRELOAD_HINT = re.compile(r'#EXT-X-PRELOAD-HINT:TYPE=PART,URI="p(\d+)\.(\d+)\.m4s"')
+_PART = re.compile(r'#EXT-X-PART:.*URI="([^"]+)"')
+
+
+@dataclass
+class ViewerStats:
+    """What one simulated player saw."""
+
+    requests: int = 0
+    discovery_delays: List[float] = field(default_factory=list)
+    download_times: List[float] = field(default_factory=list)
+    errors: int = 0
+
+
+async def _fetch(client: httpx.AsyncClient, url: str, stats: ViewerStats) -> Optional[httpx.Response]:
+    stats.requests += 1
+    try:
+        response = await client.get(url)
+    except httpx.HTTPError:
+        stats.errors += 1
+        return None
+    if response.status_code != 200:
+        stats.errors += 1
+        return None
+    return response
+
+
+async def _follow_hls(client: httpx.AsyncClient, playlist_url: str, text: str, stats: ViewerStats, until: float) -> None:
+    """Poll a plain HLS playlist like hls.js and fetch every new segment."""
+    seen = {line for line in text.splitlines() if line and not line.startswith("#")}
+    last_poll = time.monotonic()
+    match = _TARGET_DURATION.search(text)
+    target = float(match.group(1)) if match else 1.0
+    changed = True
+    while time.monotonic() < until:
+        await asyncio.sleep(target if changed else target / 2)
+        response = await _fetch(client, playlist_url, stats)
+        now = time.monotonic()
+        changed = False
+        if response is not None:
+            for line in response.text.splitlines():
+                if not line or line.startswith("#") or line in seen:
+                    continue
+                seen.add(line)
+                changed = True
+                # The segment appeared at some point since the previous poll
+                stats.discovery_delays.append((now - last_poll) / 2)
+                started = time.monotonic()
+                if await _fetch(client, urljoin(playlist_url, line), stats) is not None:
+                    stats.download_times.append(time.monotonic() - started)
+        last_poll = now
+
+
+async def _follow_ll_hls(client: httpx.AsyncClient, playlist_url: str, text: str, stats: ViewerStats, until: float) -> None:
+    """Follow an LL-HLS playlist with blocking reloads and fetch every new part."""
+    seen = set(_PART.findall(text))
+    base = playlist_url.split("?", 1)[0]
+    while time.monotonic() < until:
+        hint = _PRELOAD_HINT.search(text)
+        url = f"{base}?_HLS_msn={hint.group(1)}&_HLS_part={hint.group(2)}" if hint else base
+        response = await _fetch(client, url, stats)
+        if response is None:
+            await asyncio.sleep(0.5)
+            continue
+        text = response.text
+        for uri in _PART.findall(text):
+            if uri in seen:
+                continue
+            seen.add(uri)
+            # Blocking reloads return as soon as the part is published
+            stats.discovery_delays.append(0.0)
+            started = time.monotonic()
+            if await _fetch(client, urljoin(base, uri), stats) is not None:
+                stats.download_times.append(time.monotonic() - started)
+
+
+async def _viewer(base_url: str, playlist_url: str, duration: float) -> ViewerStats:
+    stats = ViewerStats()
+    async with httpx.AsyncClient(base_url=base_url, timeout=10.0) as client:
+        url = str(client.base_url.join(playlist_url))
+        response = await _fetch(client, url, stats)
+        if response is None:
+            return stats
+        until = time.monotonic() + duration
+        if "#EXT-X-PART-INF" in response.text:
+            await _follow_ll_hls(client, url, response.text, stats, until)
+        else:
+            await _follow_hls(client, url, response.text, stats, until)
+    return stats
+
+
+async def run(base_url: str, camera_id: int, viewers: int, duration: float, profile: str) -> None:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0) as client:
+        response = await client.post(f"/api/streams/{camera_id}/start", params={"profile": profile, "abr": False})
+        response.raise_for_status()
+        started = response.json()
+        playlist_url = started["stream_url"]
+        playlist = (await client.get(playlist_url)).text
+
+    low_latency = "#EXT-X-PART-INF" in playlist
+    if low_latency:
+        match = _PART_HOLD_BACK.search(playlist)
+        hold_back = float(match.group(1)) if match else 0.0
+    else:
+        match = _TARGET_DURATION.search(playlist)
+        # Players stay three target durations behind the live edge
+        hold_back = 3 * float(match.group(1)) if match else 0.0
+
+    results = await asyncio.gather(*(_viewer(base_url, playlist_url, duration) for _ in range(viewers)))
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=10.0) as client:
+        await client.post(f"/api/streams/{camera_id}/stop", params={"viewer_id": started["viewer_id"], "profile": profile})
+
+    requests = sum(stats.requests for stats in results)
+    errors = sum(stats.errors for stats in results)
+    discovery = [delay for stats in results for delay in stats.discovery_delays]
+    downloads = [elapsed for stats in results for elapsed in stats.download_times]
+    print(f"Mode:                  {'LL-HLS' if low_latency else 'HLS'}")
+    print(f"Viewers:               {viewers} for {duration:.0f}s")
+    print(f"Requests per viewer/s: {requests / viewers / duration:.2f} ({errors} failed)")
+    if discovery and downloads:
+        discovery_delay = statistics.mean(discovery)
+        download_time = statistics.mean(downloads)
+        print(f"Hold-back:             {hold_back:.2f}s")
+        print(f"Discovery delay:       {discovery_delay:.3f}s")
+        print(f"Download time:         {download_time:.3f}s")
+        print(f"Estimated latency:     {hold_back + discovery_delay + download_time:.2f}s")
+    else:
+        print("No new media arrived during the run")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure HLS latency and request rate per viewer")
+    parser.add_argument("--url", default="http://127.0.0.1:8101", help="Server base URL")
+    parser.add_argument("--camera", type=int, required=True, help="Camera ID to stream")
+    parser.add_argument("--viewers", type=int, default=4, help="Simulated players")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to follow the stream")
+    parser.add_argument("--profile", default="main", choices=["main", "sub"])
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.camera, args.viewers, args.duration, args.profile))
@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional
@@ -5,14 +6,20 @@ from typing import Optional
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
 
 from .config import settings
 from .database import init_db, SessionLocal
 from .models import Camera
-from .routers import cameras_router, devices_router, tasks_router, shopping_router
+from .routers import cameras_router, devices_router, tasks_router, shopping_router, streams_router, hls_router
+from .services.clip_builder import clip_builder
 from .services.crypto import encrypt_secret, is_encrypted_secret
+from .services.frame_cache import frame_cache
+from .services.live_relay import live_relay
+from .services.motion_detector import motion_detector
+from .services.recorder import recorder
 from .services.stream_manager import stream_manager
+from .services.stream_targets import start_pinned_streams, stream_rtsp_url
+from .services.thumbnails import thumbnail_worker
 
 FRONTEND_DIST_DIR = settings.base_dir.parent / "frontend" / "dist"
 FRONTEND_INDEX_FILE = FRONTEND_DIST_DIR / "index.html"
@@ -125,13 +132,33 @@ async def lifespan(app: FastAPI):
     print(f"Database initialized")
     if migrated:
         print(f"Migrated {migrated} legacy camera password(s) to encrypted storage")
-    print(f"HLS streams will be saved to: {settings.hls_output_dir}")
+    print(f"HLS streams will be saved to: {', '.join(str(root) for root in stream_manager.storage_roots)}")
+    adopted = await stream_manager.adopt_streams(stream_rtsp_url)
+    if adopted:
+        print(f"Adopted {adopted} running stream(s) from the previous server process")
+    stream_manager.start_housekeeping()
+    thumbnail_worker.start()
+    if settings.clip_on_motion:
+        motion_detector.add_listener(clip_builder.on_motion)
+    # Pinned streams warm up in the background so startup is not delayed
+    pinned_startup = asyncio.create_task(start_pinned_streams())
 
     yield
 
     # Shutdown
-    print("Stopping all streams...")
-    stream_manager.stop_all_streams()
+    pinned_startup.cancel()
+    await stream_manager.stop_housekeeping()
+    await clip_builder.stop_all()
+    await thumbnail_worker.stop()
+    if settings.stream_handover:
+        print("Handing over running streams...")
+        await stream_manager.hand_over()
+    else:
+        print("Stopping all streams...")
+        await stream_manager.stop_all_streams()
+    await live_relay.stop_all()
+    await frame_cache.stop_all()
+    await motion_detector.stop_all()
 
 
 app = FastAPI(
@@ -150,14 +177,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files for HLS streams
-app.mount("/streams", StaticFiles(directory=str(settings.hls_output_dir)), name="streams")
+# HLS playlists and segments (served from memory or the storage roots)
+app.include_router(hls_router)
 
 # Include routers
 app.include_router(cameras_router, prefix="/api")
 app.include_router(devices_router, prefix="/api")
 app.include_router(tasks_router, prefix="/api")
 app.include_router(shopping_router, prefix="/api")
+app.include_router(streams_router, prefix="/api")
 
 
 @app.get("/")
@@ -180,7 +208,17 @@ async def health_check():
     """Health check endpoint."""
     return {
         "status": "healthy",
-        "active_streams": stream_manager.get_active_streams()
+        "active_streams": [str(key) for key in stream_manager.get_active_streams()],
+        "budget": stream_manager.get_budget_status(),
+        "startup": stream_manager.get_startup_status(),
+        "reaper": stream_manager.get_reaper_status(),
+        "registry": await stream_manager.get_registry_status(),
+        "stream_worker": await stream_manager.get_worker_status(),
+        "storage": stream_manager.get_storage_status(),
+        "snapshots": frame_cache.get_status(),
+        "recordings": recorder.get_status(),
+        "motion": motion_detector.get_status(),
+        "thumbnails": thumbnail_worker.get_status(),
     }
 
 
@@ -196,7 +234,7 @@ async def get_stats():
             "cameras": {
                 "total": db.query(Camera).count(),
                 "active": db.query(Camera).filter(Camera.is_active == True).count(),
-                "streaming": len(stream_manager.get_active_streams())
+                "streaming": len({key.camera_id for key in stream_manager.get_active_streams()})
             },
             "devices": {
                 "total": db.query(Device).count()
@@ -215,74 +253,6 @@ async def get_stats():
         db.close()
 
 
-# Stream management endpoints
-@app.post("/api/streams/{camera_id}/start")
-async def start_camera_stream(camera_id: int):
-    """Start HLS stream for a camera."""
-    from fastapi.responses import JSONResponse
-    from .database import SessionLocal
-    from .models import Camera
-
-    db = SessionLocal()
-    try:
-        camera = db.query(Camera).filter(Camera.id == camera_id).first()
-        if not camera:
-            return JSONResponse(
-                status_code=404,
-                content={"error": "Camera not found"}
-            )
-
-        # Check if camera has credentials
-        if not camera.username or not camera.password:
-            return JSONResponse(
-                status_code=400,
-                content={"error": "Camera credentials not configured. Edit the camera to add username and password."}
-            )
-
-        print(f"[API] Starting stream for camera {camera_id} ({camera.name})")
-        success, error = stream_manager.start_stream(camera_id, camera.rtsp_url)
-
-        if success:
-            return {
-                "status": "started",
-                "stream_url": stream_manager.get_playlist_url(camera_id)
-            }
-        else:
-            # Parse error for user-friendly message
-            error_msg = error or "Unknown error"
-            if "401" in error_msg or "Unauthorized" in error_msg.lower():
-                error_msg = "Authentication failed - check camera credentials"
-            elif "Connection refused" in error_msg:
-                error_msg = "Camera refused connection - check IP and port"
-            elif "timeout" in error_msg.lower():
-                error_msg = "Connection timed out - camera may be offline"
-
-            return JSONResponse(
-                status_code=500,
-                content={"error": error_msg}
-            )
-    finally:
-        db.close()
-
-
-@app.post("/api/streams/{camera_id}/stop")
-async def stop_camera_stream(camera_id: int):
-    """Stop HLS stream for a camera."""
-    stream_manager.stop_stream(camera_id)
-    return {"status": "stopped"}
-
-
-@app.get("/api/streams/{camera_id}/status")
-async def get_stream_status(camera_id: int):
-    """Get stream status for a camera."""
-    is_active = stream_manager.is_streaming(camera_id)
-    return {
-        "camera_id": camera_id,
-        "streaming": is_active,
-        "stream_url": stream_manager.get_playlist_url(camera_id) if is_active else None
-    }
-
-
 @app.get("/{full_path:path}")
 async def serve_frontend(full_path: str):
     """Serve frontend files and SPA routes when build assets are present."""
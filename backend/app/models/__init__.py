@@ -2,5 +2,8 @@ from .camera import Camera
 from .device import Device
 from .task import Task
 from .shopping import ShoppingItem
+from .motion_event import MotionEvent
+from .event_clip import EventClip
+from .stream_lease import StreamLease
 
-__all__ = ["Camera", "Device", "Task", "ShoppingItem"]
+__all__ = ["Camera", "Device", "Task", "ShoppingItem", "MotionEvent", "EventClip", "StreamLease"]
@@ -1,11 +1,20 @@
 from __future__ import annotations
 
+import re
+from typing import List
+
 from sqlalchemy import Column, Integer, String, Boolean, DateTime
 from sqlalchemy.sql import func
 
 from ..database import Base
 from ..services.crypto import decrypt_secret
 
+# Dahua RTSP paths select the stream with subtype=0 (main) or subtype=1 (sub)
+_SUBTYPE = re.compile(r"subtype=\d+")
+PROFILE_SUBTYPES = {"main": "0", "sub": "1"}
+# NVR RTSP paths select the recorder channel with channel=N
+_CHANNEL = re.compile(r"channel=\d+")
+
 
 class Camera(Base):
     __tablename__ = "cameras"
@@ -21,6 +30,9 @@ class Camera(Base):
     is_active = Column(Boolean, default=True)
     brand = Column(String(50), default="Dahua")
     channels = Column(Integer, default=1)
+    always_on = Column(Boolean, default=False)  # Keep the stream pre-warmed
+    record = Column(Boolean, default=False)  # Continuous recording of the main stream
+    motion_detection = Column(Boolean, default=False)  # Analyse the substream for motion
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -32,14 +44,69 @@ class Camera(Base):
     def decrypted_password(self) -> str | None:
         return decrypt_secret(self.password)
 
-    @property
-    def rtsp_url(self) -> str:
-        """Generate the full RTSP URL for this camera."""
+    def _build_rtsp_url(self, path: str) -> str:
         auth = ""
         password = self.decrypted_password
         if self.username and password:
             auth = f"{self.username}:{password}@"
-        return f"rtsp://{auth}{self.ip_address}:{self.port}{self.rtsp_path}"
+        return f"rtsp://{auth}{self.ip_address}:{self.port}{path}"
+
+    @property
+    def rtsp_url(self) -> str:
+        """Generate the full RTSP URL for this camera."""
+        return self._build_rtsp_url(self.rtsp_path)
+
+    @property
+    def has_substream(self) -> bool:
+        """Whether the RTSP path can select between main stream and substream."""
+        return bool(_SUBTYPE.search(self.rtsp_path or ""))
+
+    @property
+    def default_profile(self) -> str:
+        """The profile the configured RTSP path selects, used when a request names none."""
+        match = _SUBTYPE.search(self.rtsp_path or "")
+        return "sub" if match and match.group() == f"subtype={PROFILE_SUBTYPES['sub']}" else "main"
+
+    def stream_profile(self, profile: str) -> str:
+        """Resolve a requested profile to one this camera actually offers."""
+        return profile if self.has_substream and profile in PROFILE_SUBTYPES else "main"
+
+    def has_channel(self, channel: int) -> bool:
+        """Whether an NVR channel exists and the RTSP path can address it."""
+        if channel == 1:
+            return True
+        return 1 <= channel <= (self.channels or 1) and bool(_CHANNEL.search(self.rtsp_path or ""))
+
+    def pinned_profiles(self, grid_profile: str) -> List[str]:
+        """Profiles kept running without viewers: the grid tile's and the recorded main stream."""
+        if not (self.is_active and self.username and self.password):
+            return []
+        profiles = []
+        if self.always_on:
+            profiles.append(self.stream_profile(grid_profile))
+        if self.record and "main" not in profiles:
+            profiles.append("main")
+        return profiles
+
+    def profile_rtsp_url(self, profile: str, channel: int = 1) -> str:
+        """
+        Generate the RTSP URL for a stream profile ("main" or "sub") of a channel.
+
+        Cameras whose path has no subtype parameter only offer one stream,
+        which is used for every profile.
+
+        Raises:
+            ValueError: If the channel cannot be addressed (see has_channel)
+        """
+        if not self.has_channel(channel):
+            raise ValueError(f"Camera has no channel {channel}")
+        path = self.rtsp_path
+        if self.has_substream:
+            subtype = PROFILE_SUBTYPES[self.stream_profile(profile)]
+            path = _SUBTYPE.sub(f"subtype={subtype}", path)
+        if channel != 1:
+            path = _CHANNEL.sub(f"channel={channel}", path)
+        return self._build_rtsp_url(path)
 
     def __repr__(self):
         return f"<Camera(id={self.id}, name='{self.name}', ip='{self.ip_address}')>"
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+
+from ..database import Base
+
+
+class EventClip(Base):
+    __tablename__ = "event_clips"
+
+    id = Column(Integer, primary_key=True, index=True)
+    camera_id = Column(Integer, ForeignKey("cameras.id", ondelete="CASCADE"), nullable=False, index=True)
+    motion_event_id = Column(Integer, ForeignKey("motion_events.id", ondelete="SET NULL"), nullable=True)
+    trigger = Column(String(20), default="api")  # api, motion
+    triggered_at = Column(DateTime(timezone=True), nullable=False)
+    status = Column(String(20), default="pending")  # pending, ready, failed
+    duration = Column(Float, nullable=True)  # Seconds of video in the clip
+    size = Column(Integer, nullable=True)  # Bytes
+    error = Column(String(500), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<EventClip(id={self.id}, camera_id={self.camera_id}, status='{self.status}')>"
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey
+
+from ..database import Base
+
+
+class MotionEvent(Base):
+    __tablename__ = "motion_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    camera_id = Column(Integer, ForeignKey("cameras.id", ondelete="CASCADE"), nullable=False, index=True)
+    started_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    ended_at = Column(DateTime(timezone=True), nullable=True)  # None while motion continues
+    score = Column(Float, nullable=False)  # Peak fraction of the frame that changed
+    # Union of the moving regions, as fractions of the frame size
+    box_x = Column(Float, nullable=False)
+    box_y = Column(Float, nullable=False)
+    box_width = Column(Float, nullable=False)
+    box_height = Column(Float, nullable=False)
+
+    def __repr__(self):
+        return f"<MotionEvent(id={self.id}, camera_id={self.camera_id}, score={self.score:.3f})>"
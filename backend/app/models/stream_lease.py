@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, BigInteger, Float, String, Boolean, Text, ForeignKey, UniqueConstraint
+
+from ..database import Base
+
+
+class StreamLease(Base):
+    """Which API worker runs a stream's FFmpeg process, shared by all workers."""
+
+    __tablename__ = "stream_leases"
+    __table_args__ = (UniqueConstraint("camera_id", "profile", "channel"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    camera_id = Column(Integer, ForeignKey("cameras.id", ondelete="CASCADE"), nullable=False, index=True)
+    profile = Column(String(10), nullable=False, default="main")
+    channel = Column(Integer, nullable=False, default=1)
+    owner = Column(String(100), nullable=False)  # host:pid:boot of the worker holding the lease
+    pid = Column(Integer, nullable=True)  # FFmpeg process ID
+    token = Column(BigInteger, nullable=True)  # Start token in the FFmpeg process's output names
+    state = Column(String(20), default="starting")  # starting, ready, restarting, error
+    stream_url = Column(String(200), nullable=True)
+    error = Column(String(500), nullable=True)
+    viewers = Column(Integer, default=0)  # Viewers attached on the owning worker
+    remote_viewers = Column(Integer, default=0)  # Viewers attached through other workers
+    pinned = Column(Boolean, default=False)
+    stop_requested = Column(Boolean, default=False)
+    # A running FFmpeg left for the next server process to adopt (STREAM_HANDOVER)
+    handover = Column(Boolean, default=False)
+    output_root = Column(String(500), nullable=True)
+    recording = Column(Boolean, default=False)
+    viewer_ids = Column(Text, nullable=True)  # JSON list of the viewer sessions attached on shutdown
+    # Unix timestamps; accessed_at is the last HLS fetch served by another worker
+    accessed_at = Column(Float, nullable=True)
+    heartbeat_at = Column(Float, nullable=False)
+    started_at = Column(Float, nullable=False)
+
+    def __repr__(self):
+        return f"<StreamLease(camera_id={self.camera_id}, profile='{self.profile}', owner='{self.owner}')>"
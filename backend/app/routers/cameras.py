@@ -1,19 +1,66 @@
 import asyncio
 import re
+import time
+from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
 from ..database import get_db
 from ..models.camera import Camera
+from ..models.event_clip import EventClip
+from ..models.motion_event import MotionEvent
 from ..schemas.camera import CameraCreate, CameraUpdate, CameraResponse, CameraDiscovery
+from ..schemas.event_clip import EventClipCreate, EventClipResponse
+from ..schemas.motion_event import MotionEventResponse
 from ..services.camera_discovery import discover_cameras
+from ..services.clip_builder import clip_builder
 from ..services.crypto import encrypt_secret
+from ..services.frame_cache import frame_cache
+from ..services.motion_detector import motion_detector
+from ..services.recorder import recorder
+from ..services.stream_manager import StreamKey, stream_manager
+from ..services.thumbnails import thumbnail_worker
 
 router = APIRouter(prefix="/cameras", tags=["cameras"])
 
 
+async def _sync_pinned_stream(camera: Camera) -> None:
+    """Start or release a camera's always-on and recording streams to match its settings."""
+    await stream_manager.set_recording(camera.id, bool(camera.record and camera.is_active))
+    wanted = set()
+    for profile in camera.pinned_profiles(stream_manager.GRID_PROFILE):
+        key = StreamKey(camera.id, profile)
+        wanted.add(key)
+        # Restarts the stream if the RTSP or recording settings changed
+        await stream_manager.pin_stream(key, camera.profile_rtsp_url(profile), wait=False)
+
+    # Release pins left on a profile the camera no longer resolves to
+    for key in stream_manager.get_camera_streams(camera.id):
+        if key not in wanted and stream_manager.is_pinned(key):
+            await stream_manager.unpin_stream(key)
+
+
+def _check_motion_detection(enabled: Optional[bool]) -> None:
+    """Refuse to turn motion detection on when it cannot run."""
+    if enabled and not motion_detector.available:
+        raise HTTPException(
+            status_code=400,
+            detail="Motion detection needs numpy on the server (pip install numpy)",
+        )
+
+
+async def _sync_motion_detection(camera: Camera) -> None:
+    """Start or stop a camera's motion detector to match its settings."""
+    rtsp_url = None
+    if camera.motion_detection and camera.is_active and camera.username and camera.password:
+        # Motion is judged on tiny frames, so decode the cheaper substream
+        rtsp_url = camera.profile_rtsp_url("sub")
+    await motion_detector.configure(camera.id, rtsp_url)
+
+
 @router.get("/", response_model=List[CameraResponse])
 def get_cameras(
     skip: int = 0,
@@ -49,12 +96,13 @@ def get_camera(camera_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/", response_model=CameraResponse, status_code=201)
-def create_camera(camera: CameraCreate, db: Session = Depends(get_db)):
+async def create_camera(camera: CameraCreate, db: Session = Depends(get_db)):
     """Add a new camera."""
     # Check if camera with same IP already exists
     existing = db.query(Camera).filter(Camera.ip_address == camera.ip_address).first()
     if existing:
         raise HTTPException(status_code=400, detail="Camera with this IP already exists")
+    _check_motion_detection(camera.motion_detection)
 
     camera_data = camera.model_dump()
     if camera_data.get("password"):
@@ -64,11 +112,13 @@ def create_camera(camera: CameraCreate, db: Session = Depends(get_db)):
     db.add(db_camera)
     db.commit()
     db.refresh(db_camera)
+    await _sync_pinned_stream(db_camera)
+    await _sync_motion_detection(db_camera)
     return db_camera
 
 
 @router.put("/{camera_id}", response_model=CameraResponse)
-def update_camera(
+async def update_camera(
     camera_id: int,
     camera: CameraUpdate,
     db: Session = Depends(get_db)
@@ -87,27 +137,241 @@ def update_camera(
         ).first()
         if existing:
             raise HTTPException(status_code=400, detail="Camera with this IP already exists")
+    _check_motion_detection(update_data.get("motion_detection"))
 
     if "password" in update_data:
         update_data["password"] = encrypt_secret(update_data["password"])
 
+    snapshot_source = db_camera.profile_rtsp_url("sub")
     for key, value in update_data.items():
         setattr(db_camera, key, value)
 
     db.commit()
     db.refresh(db_camera)
+    await _sync_pinned_stream(db_camera)
+    await _sync_motion_detection(db_camera)
+    if db_camera.profile_rtsp_url("sub") != snapshot_source:
+        # The snapshot decoder would keep reading the old address or credentials
+        await frame_cache.stop(camera_id)
     return db_camera
 
 
 @router.delete("/{camera_id}", status_code=204)
-def delete_camera(camera_id: int, db: Session = Depends(get_db)):
+async def delete_camera(camera_id: int, db: Session = Depends(get_db)):
     """Delete a camera."""
     db_camera = db.query(Camera).filter(Camera.id == camera_id).first()
     if not db_camera:
         raise HTTPException(status_code=404, detail="Camera not found")
 
+    await motion_detector.configure(camera_id, None)
+    db.query(EventClip).filter(EventClip.camera_id == camera_id).delete()
+    db.query(MotionEvent).filter(MotionEvent.camera_id == camera_id).delete()
     db.delete(db_camera)
     db.commit()
+    clip_builder.delete_files(camera_id)
+    thumbnail_worker.discard(camera_id)
+    await stream_manager.stop_camera(camera_id)
+    # After stopping, so streams viewers still watch aren't restarted first
+    await stream_manager.set_recording(camera_id, False)
+    await frame_cache.stop(camera_id)
+
+
+def _snapshot_source(camera_id: int, db: Session) -> str:
+    """Resolve the RTSP URL to decode snapshots from."""
+    camera = db.query(Camera).filter(Camera.id == camera_id).first()
+    if not camera:
+        raise HTTPException(status_code=404, detail="Camera not found")
+    if not camera.username or not camera.password:
+        raise HTTPException(status_code=400, detail="Camera credentials not configured")
+    # Stills are downscaled anyway, so decode the cheaper substream
+    return camera.profile_rtsp_url("sub")
+
+
+@router.get("/{camera_id}/snapshot")
+async def get_camera_snapshot(camera_id: int, db: Session = Depends(get_db)):
+    """
+    Get the camera's latest still frame as JPEG.
+
+    Frames come from a shared low-fps decoder, so any number of dashboard
+    tiles polling this endpoint cost one FFmpeg per camera.
+    """
+    rtsp_url = _snapshot_source(camera_id, db)
+    try:
+        frame, captured_at = await frame_cache.get_frame(camera_id, rtsp_url)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return Response(
+        content=frame,
+        media_type="image/jpeg",
+        headers={"Cache-Control": "no-cache", "X-Frame-Timestamp": f"{captured_at:.3f}"},
+    )
+
+
+@router.get("/{camera_id}/thumbnail")
+async def get_camera_thumbnail(
+    camera_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Get a small JPEG of the camera for list views.
+
+    Cut from the newest segment the camera already produced, so it needs no
+    running viewer session. Supports ETag revalidation with If-None-Match.
+    """
+    if not db.query(Camera).filter(Camera.id == camera_id).first():
+        raise HTTPException(status_code=404, detail="Camera not found")
+    thumbnail = await thumbnail_worker.get(camera_id)
+    if thumbnail is None:
+        raise HTTPException(status_code=404, detail="No thumbnail yet - the camera has not streamed recently")
+
+    headers = {"ETag": thumbnail.etag, "Cache-Control": "no-cache", "X-Thumbnail-Source": thumbnail.source}
+    if if_none_match and (
+        if_none_match.strip() == "*" or thumbnail.etag in (tag.strip() for tag in if_none_match.split(","))
+    ):
+        return Response(status_code=304, headers=headers)
+    return Response(content=thumbnail.data, media_type="image/jpeg", headers=headers)
+
+
+@router.get("/{camera_id}/mjpeg")
+async def get_camera_mjpeg(camera_id: int, db: Session = Depends(get_db)):
+    """Stream the camera's cached frames as multipart MJPEG."""
+    rtsp_url = _snapshot_source(camera_id, db)
+
+    async def frames():
+        try:
+            async for frame in frame_cache.stream_frames(camera_id, rtsp_url):
+                yield (
+                    b"--frame\r\nContent-Type: image/jpeg\r\n"
+                    + f"Content-Length: {len(frame)}\r\n\r\n".encode()
+                    + frame
+                    + b"\r\n"
+                )
+        except RuntimeError:
+            return
+
+    return StreamingResponse(
+        frames(),
+        media_type="multipart/x-mixed-replace; boundary=frame",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@router.get("/{camera_id}/recordings")
+def get_camera_recordings(
+    camera_id: int,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    db: Session = Depends(get_db)
+):
+    """
+    Get a VOD playlist of a camera's recordings between two times.
+
+    Times are ISO 8601 or Unix seconds; the range defaults to the last hour.
+    """
+    if not db.query(Camera).filter(Camera.id == camera_id).first():
+        raise HTTPException(status_code=404, detail="Camera not found")
+    end_ms = int(end.timestamp() * 1000) if end else int(time.time() * 1000)
+    start_ms = int(start.timestamp() * 1000) if start else end_ms - 3600 * 1000
+    if start_ms >= end_ms:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+
+    playlist = recorder.build_playlist(camera_id, start_ms, end_ms, "recordings/{start}.ts")
+    if playlist is None:
+        raise HTTPException(status_code=404, detail="No recordings in this time range")
+    return Response(content=playlist, media_type="application/vnd.apple.mpegurl")
+
+
+@router.get("/{camera_id}/recordings/{start_ms}.ts")
+def get_recording_segment(camera_id: int, start_ms: int, db: Session = Depends(get_db)):
+    """Get one recorded segment, named by its start time in milliseconds."""
+    if not db.query(Camera).filter(Camera.id == camera_id).first():
+        raise HTTPException(status_code=404, detail="Camera not found")
+    path = recorder.get_segment_path(camera_id, start_ms)
+    if path is None or not path.is_file():
+        raise HTTPException(status_code=404, detail="Recording not found")
+    return FileResponse(path, media_type="video/mp2t")
+
+
+@router.get("/{camera_id}/events", response_model=List[MotionEventResponse])
+def get_camera_events(
+    camera_id: int,
+    since: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """Get a camera's motion events, newest first."""
+    if not db.query(Camera).filter(Camera.id == camera_id).first():
+        raise HTTPException(status_code=404, detail="Camera not found")
+    query = db.query(MotionEvent).filter(MotionEvent.camera_id == camera_id)
+    if since is not None:
+        query = query.filter(MotionEvent.started_at >= since)
+    return query.order_by(MotionEvent.started_at.desc()).limit(limit).all()
+
+
+@router.post("/{camera_id}/clips", response_model=EventClipResponse, status_code=202)
+async def create_camera_clip(
+    camera_id: int,
+    request: Optional[EventClipCreate] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Cut a clip from a few seconds before now to a few seconds after.
+
+    The clip is built in the background from the segments of the camera's
+    running stream; poll the clip list until its status is "ready".
+    """
+    if not db.query(Camera).filter(Camera.id == camera_id).first():
+        raise HTTPException(status_code=404, detail="Camera not found")
+    request = request or EventClipCreate()
+    try:
+        clip_id = clip_builder.trigger(camera_id, preroll=request.preroll, postroll=request.postroll)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return db.query(EventClip).filter(EventClip.id == clip_id).first()
+
+
+@router.get("/{camera_id}/clips", response_model=List[EventClipResponse])
+def get_camera_clips(
+    camera_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """Get a camera's event clips, newest first."""
+    if not db.query(Camera).filter(Camera.id == camera_id).first():
+        raise HTTPException(status_code=404, detail="Camera not found")
+    return (
+        db.query(EventClip)
+        .filter(EventClip.camera_id == camera_id)
+        .order_by(EventClip.triggered_at.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+@router.get("/{camera_id}/clips/{clip_id}.mp4")
+def get_camera_clip_file(camera_id: int, clip_id: int, db: Session = Depends(get_db)):
+    """Download a finished clip."""
+    clip = db.query(EventClip).filter(EventClip.id == clip_id, EventClip.camera_id == camera_id).first()
+    if not clip:
+        raise HTTPException(status_code=404, detail="Clip not found")
+    if clip.status != "ready":
+        raise HTTPException(status_code=409, detail=f"Clip is {clip.status}")
+    path = clip_builder.clip_path(camera_id, clip_id)
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="Clip file is missing")
+    return FileResponse(path, media_type="video/mp4", filename=f"camera_{camera_id}_clip_{clip_id}.mp4")
+
+
+@router.delete("/{camera_id}/clips/{clip_id}", status_code=204)
+def delete_camera_clip(camera_id: int, clip_id: int, db: Session = Depends(get_db)):
+    """Delete a clip and its file."""
+    clip = db.query(EventClip).filter(EventClip.id == clip_id, EventClip.camera_id == camera_id).first()
+    if not clip:
+        raise HTTPException(status_code=404, detail="Clip not found")
+    db.delete(clip)
+    db.commit()
+    clip_builder.delete_files(camera_id, clip_id)
 
 
 @router.post("/{camera_id}/test")
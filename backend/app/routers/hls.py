@@ -0,0 +1,105 @@
+import re
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+
+from ..services.stream_manager import StreamKey, stream_manager
+
+router = APIRouter(prefix="/streams", tags=["hls"])
+
+_FILE_NAME = re.compile(r"^[\w.-]+$")
+
+MEDIA_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+}
+
+# Playlists change every segment; segment names are unique per stream start
+PLAYLIST_CACHE_CONTROL = "no-cache, no-store, must-revalidate"
+SEGMENT_CACHE_CONTROL = "public, max-age=60, immutable"
+
+LOOPBACK_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+
+def _validate(stream_name: str, filename: str) -> Tuple[StreamKey, str]:
+    """Reject path tricks and unknown file types; return the stream key and file extension."""
+    key = stream_manager.parse_stream_name(stream_name)
+    if key is None or not _FILE_NAME.match(filename):
+        raise HTTPException(status_code=404, detail="Not found")
+    extension = filename[filename.rfind("."):] if "." in filename else ""
+    if extension not in MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail="Not found")
+    return key, extension
+
+
+@router.put("/ingest/{stream_name}/{token}/{filename}")
+async def ingest_segment(stream_name: str, token: str, filename: str, request: Request):
+    """Receive a playlist or segment uploaded by a local memory-backed FFmpeg."""
+    key, _ = _validate(stream_name, filename)
+    if request.client is None or request.client.host not in LOOPBACK_HOSTS:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    data = await request.body()
+    if not stream_manager.ingest(key, token, filename, data):
+        raise HTTPException(status_code=404, detail="Unknown stream")
+    return Response(status_code=201)
+
+
+@router.api_route("/{stream_name}/{filename}", methods=["GET", "HEAD"])
+async def get_stream_file(
+    stream_name: str,
+    filename: str,
+    hls_msn: Optional[int] = Query(None, alias="_HLS_msn", ge=0),
+    hls_part: Optional[int] = Query(None, alias="_HLS_part", ge=0),
+):
+    """
+    Serve an HLS playlist or segment from memory or from its storage root.
+
+    ``master.m3u8`` is the ABR master playlist of a camera; fetching the
+    playlist of an ABR rendition that is not running yet starts it.
+
+    LL-HLS streams support blocking playlist reload: a playlist request with
+    ``_HLS_msn`` (and optionally ``_HLS_part``) is held until that media
+    sequence number/part is available, and the part named by the preload
+    hint is held until FFmpeg delivers it.
+    """
+    key, extension = _validate(stream_name, filename)
+    stream_manager.touch(key)
+
+    cache_control = PLAYLIST_CACHE_CONTROL if extension == ".m3u8" else SEGMENT_CACHE_CONTROL
+    headers = {"Cache-Control": cache_control}
+
+    if filename == "master.m3u8":
+        master = stream_manager.get_master_playlist(key.camera_id, key.channel)
+        if master is None:
+            raise HTTPException(status_code=404, detail="Not found")
+        return Response(content=master, media_type=MEDIA_TYPES[extension], headers=headers)
+
+    if extension == ".m3u8" and not await stream_manager.ensure_abr_rendition(key):
+        if stream_manager.get_abr_source(key) is not None:
+            raise HTTPException(status_code=503, detail="Rendition failed to start")
+
+    if stream_manager.is_memory_stream(stream_name):
+        stream_manager.record_request(stream_name, filename)
+        if stream_manager.is_low_latency_stream(stream_name):
+            if hls_part is not None and hls_msn is None:
+                raise HTTPException(status_code=400, detail="_HLS_part requires _HLS_msn")
+            outcome = await stream_manager.wait_for_memory_file(stream_name, filename, hls_msn, hls_part)
+            if outcome == "invalid":
+                raise HTTPException(status_code=400, detail="Requested media is too far ahead")
+            if outcome == "timeout":
+                raise HTTPException(status_code=503, detail="Requested media not available yet")
+        data = stream_manager.read_memory_file(stream_name, filename)
+        if data is None:
+            raise HTTPException(status_code=404, detail="Not found")
+        return Response(content=data, media_type=MEDIA_TYPES[extension], headers=headers)
+
+    for root in stream_manager.storage_roots:
+        path = root / stream_name / filename
+        if path.is_file():
+            return FileResponse(path, media_type=MEDIA_TYPES[extension], headers=headers)
+
+    raise HTTPException(status_code=404, detail="Not found")
@@ -0,0 +1,416 @@
+import asyncio
+import json
+import uuid
+from typing import Optional
+
+from fastapi import APIRouter, Depends, WebSocket
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import get_db
+from ..models.camera import Camera
+from ..schemas.stream import StreamProfile, StreamStartAllRequest
+from ..services.live_relay import live_relay
+from ..services.stream_manager import StreamKey, stream_manager
+
+router = APIRouter(prefix="/streams", tags=["streams"])
+
+
+def _friendly_stream_error(error: Optional[str]) -> str:
+    """Map raw FFmpeg output to a user-friendly message."""
+    error_msg = error or "Unknown error"
+    if "401" in error_msg or "unauthorized" in error_msg.lower():
+        error_msg = "Authentication failed - check camera credentials"
+    elif "Connection refused" in error_msg:
+        error_msg = "Camera refused connection - check IP and port"
+    elif "timeout" in error_msg.lower():
+        error_msg = "Connection timed out - camera may be offline"
+    return error_msg
+
+
+@router.post("/start-all")
+async def start_all_streams(
+    request: Optional[StreamStartAllRequest] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Start streams for many cameras concurrently.
+
+    Results are streamed back as newline-delimited JSON, one object per
+    camera in the order the streams become ready (or fail). All streams are
+    joined under a single viewer session returned with each result, using
+    the requested profile (the substream by default, for grid tiles).
+    """
+    request = request or StreamStartAllRequest()
+    viewer_id = request.viewer_id or uuid.uuid4().hex
+    query = db.query(Camera)
+    if request.camera_ids is not None:
+        query = query.filter(Camera.id.in_(request.camera_ids))
+    if request.active_only:
+        query = query.filter(Camera.is_active == True)
+
+    # Resolve everything we need before the session is closed
+    targets = []
+    skipped = []
+    for camera in query.all():
+        if not camera.username or not camera.password:
+            skipped.append(camera.id)
+        else:
+            key = StreamKey(camera.id, camera.stream_profile(request.profile))
+            targets.append((key, camera.profile_rtsp_url(request.profile)))
+
+    if request.camera_ids is not None:
+        found = {key.camera_id for key, _ in targets} | set(skipped)
+        missing = [camera_id for camera_id in request.camera_ids if camera_id not in found]
+    else:
+        missing = []
+
+    async def results():
+        for camera_id in missing:
+            yield json.dumps({"camera_id": camera_id, "status": "error", "error": "Camera not found"}) + "\n"
+        for camera_id in skipped:
+            yield json.dumps({
+                "camera_id": camera_id,
+                "status": "error",
+                "error": "Camera credentials not configured"
+            }) + "\n"
+
+        async for key, success, error in stream_manager.start_streams(
+            targets, concurrency=settings.stream_start_concurrency, viewer_id=viewer_id
+        ):
+            if success:
+                result = {
+                    "camera_id": key.camera_id,
+                    "profile": key.profile,
+                    "status": "started",
+                    "stream_url": stream_manager.get_playlist_url(key),
+                    "viewer_id": viewer_id,
+                }
+            else:
+                result = {"camera_id": key.camera_id, "status": "error", "error": _friendly_stream_error(error)}
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@router.post("/stop-all")
+async def stop_all_streams():
+    """Stop every running stream concurrently, including those of other API workers."""
+    stopped = sorted({key.camera_id for key in stream_manager.get_active_streams()})
+    await stream_manager.stop_all_streams(everywhere=True)
+    return {"status": "stopped", "camera_ids": stopped}
+
+
+@router.get("/supervisor")
+async def get_supervisor_status():
+    """Get restart counters and last exit reasons for all supervised streams."""
+    return [
+        {
+            "camera_id": key.camera_id,
+            "channel": key.channel,
+            "profile": key.profile,
+            **stream_manager.get_supervisor_status(key),
+        }
+        for key in stream_manager.get_supervised_streams()
+    ]
+
+
+@router.get("/metrics")
+async def get_all_stream_metrics():
+    """Get FFmpeg telemetry summaries for every stream, with fleet totals."""
+    streams = []
+    for key in stream_manager.get_metrics_streams():
+        metrics = stream_manager.get_metrics(key)
+        if metrics is not None:
+            streams.append({"camera_id": key.camera_id, "channel": key.channel, "profile": key.profile, **metrics})
+    running = [entry for entry in streams if entry["running"]]
+    return {
+        "streams": streams,
+        "totals": {
+            "streams": len(streams),
+            "running": len(running),
+            "degraded": [str(StreamKey(entry["camera_id"], entry["profile"], entry["channel"]))
+                         for entry in running if entry["degraded"]],
+            "bitrate_kbps": round(sum(entry.get("bitrate_kbps") or 0 for entry in running), 1),
+        },
+    }
+
+
+@router.post("/{camera_id}/start")
+@router.post("/{camera_id}/{channel}/start")
+async def start_camera_stream(
+    camera_id: int,
+    channel: int = 1,
+    wait: bool = True,
+    viewer_id: Optional[str] = None,
+    profile: Optional[StreamProfile] = None,
+    abr: Optional[bool] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Start HLS stream for a camera, or join it if it is already running.
+
+    NVRs are addressed per channel (``/{camera_id}/{channel}/start``); each
+    channel runs its own RTSP session and FFmpeg process, counted against
+    the global process cap.
+
+    ``profile`` selects the HD main stream (fullscreen) or the substream
+    (grid tiles); each runs as its own shared process, so switching a view
+    joins whichever one is already running. Without it the stream the
+    camera's RTSP path selects is used. Cameras without a substream serve
+    the main stream for both.
+
+    With ``abr`` (default: the HLS_ABR setting) the returned URL is a master
+    playlist over the main stream, the substream and, if enabled, a
+    transcoded low rung. Only the requested profile is started up front;
+    the other renditions start when the player first fetches them.
+
+    The returned ``viewer_id`` identifies this viewer session; pass it back to
+    ``/stop`` so the stream is only torn down once its last viewer leaves.
+    With ``wait=false`` the call returns as soon as FFmpeg is spawned and the
+    stream reports ``"starting"`` until its first segment is playable; poll
+    ``/api/streams/{camera_id}/status`` for the transition to ``"ready"``.
+    """
+    camera = db.query(Camera).filter(Camera.id == camera_id).first()
+    if not camera:
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Camera not found"}
+        )
+
+    # Check if camera has credentials
+    if not camera.username or not camera.password:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Camera credentials not configured. Edit the camera to add username and password."}
+        )
+
+    if not camera.has_channel(channel):
+        return JSONResponse(
+            status_code=404,
+            content={"error": f"Camera has no channel {channel}"}
+        )
+
+    viewer_id = viewer_id or uuid.uuid4().hex
+    profile = profile or camera.default_profile
+    key = StreamKey(camera_id, camera.stream_profile(profile), channel)
+    use_abr = settings.hls_abr if abr is None else abr
+    if use_abr:
+        sources = {"main": camera.profile_rtsp_url("main", channel)}
+        if camera.has_substream:
+            sources["sub"] = camera.profile_rtsp_url("sub", channel)
+        if settings.hls_abr_low_rung:
+            sources[stream_manager.LOW_PROFILE] = camera.profile_rtsp_url("sub", channel)
+        stream_manager.set_abr_sources(camera_id, sources, channel)
+
+    print(f"[API] Starting {key.profile} stream for camera {key} ({camera.name})")
+    success, error = await stream_manager.start_stream(
+        key, camera.profile_rtsp_url(profile, channel), wait=wait, viewer_id=viewer_id
+    )
+
+    if success:
+        return {
+            "status": "started" if wait else stream_manager.get_stream_state(key),
+            "channel": key.channel,
+            "profile": key.profile,
+            "stream_url": (
+                stream_manager.get_master_playlist_url(camera_id, channel) if use_abr
+                else stream_manager.get_playlist_url(key)
+            ),
+            "viewer_id": viewer_id,
+            "viewers": stream_manager.get_viewer_count(key),
+        }
+
+    if error and error.startswith(stream_manager.BUDGET_ERROR):
+        return JSONResponse(
+            status_code=429,
+            content={"error": error},
+            headers={"Retry-After": str(int(settings.stream_admission_timeout))},
+        )
+
+    return JSONResponse(
+        status_code=500,
+        content={"error": _friendly_stream_error(error)}
+    )
+
+
+def _resolve_key(camera_id: int, profile: Optional[StreamProfile], channel: int, db: Session) -> StreamKey:
+    """Map a requested profile, or the camera's default one, to the stream that actually serves it."""
+    camera = db.query(Camera).filter(Camera.id == camera_id).first()
+    if camera is None:
+        return StreamKey(camera_id, profile or "main", channel)
+    return StreamKey(camera_id, camera.stream_profile(profile or camera.default_profile), channel)
+
+
+@router.post("/{camera_id}/stop")
+@router.post("/{camera_id}/{channel}/stop")
+async def stop_camera_stream(
+    camera_id: int,
+    channel: Optional[int] = None,
+    viewer_id: Optional[str] = None,
+    force: bool = False,
+    profile: Optional[StreamProfile] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Leave a camera stream.
+
+    The FFmpeg process keeps running while other viewers remain attached;
+    ``force=true`` stops it regardless. Without ``profile``, a forced stop
+    ends every profile of the channel (or of every channel when none is
+    given) and a viewer leaves the stream the camera's RTSP path selects.
+    """
+    if force and profile is None:
+        if channel is None:
+            await stream_manager.stop_camera(camera_id)
+        else:
+            for key in stream_manager.get_camera_streams(camera_id):
+                if key.channel == channel:
+                    await stream_manager.stop_stream(key)
+        return {"status": "stopped", "viewers": 0}
+
+    key = _resolve_key(camera_id, profile, channel or 1, db)
+    if force:
+        await stream_manager.stop_stream(key)
+        return {"status": "stopped", "viewers": 0}
+
+    remaining = await stream_manager.release_viewer(key, viewer_id)
+    return {"status": "stopped" if remaining == 0 else "detached", "viewers": remaining}
+
+
+@router.get("/{camera_id}/status")
+@router.get("/{camera_id}/{channel}/status")
+async def get_stream_status(
+    camera_id: int,
+    channel: int = 1,
+    profile: Optional[StreamProfile] = None,
+    db: Session = Depends(get_db)
+):
+    """Get stream status for one profile of a camera channel."""
+    key = _resolve_key(camera_id, profile, channel, db)
+    state = stream_manager.get_stream_state(key)
+    # The stream may run on another API worker
+    is_active = state in ("starting", "ready")
+    return {
+        "camera_id": camera_id,
+        "channel": key.channel,
+        "profile": key.profile,
+        "streaming": is_active,
+        "state": state,
+        "start_latency_ms": stream_manager.get_start_latency(key),
+        "viewers": stream_manager.get_viewer_count(key),
+        "pinned": stream_manager.is_pinned(key),
+        "storage": stream_manager.get_storage(key),
+        "delivery": stream_manager.get_delivery_stats(key),
+        "stream_url": stream_manager.get_playlist_url(key) if is_active else None,
+        "error": stream_manager.get_stream_error(key),
+        "supervisor": stream_manager.get_supervisor_status(key),
+        "profiles": [
+            other.profile for other in stream_manager.get_camera_streams(camera_id) if other.channel == key.channel
+        ],
+        "websocket": live_relay.get_status(key),
+    }
+
+
+@router.get("/{camera_id}/metrics")
+@router.get("/{camera_id}/{channel}/metrics")
+async def get_stream_metrics(
+    camera_id: int,
+    channel: int = 1,
+    profile: Optional[StreamProfile] = None,
+    history: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Get fps, bitrate, dropped/duplicated frames and speed for one stream.
+
+    Summaries cover the rolling window of FFmpeg progress reports; pass
+    history=true for the raw series. Metrics of a stream that exited stay
+    available until it is started again.
+    """
+    key = _resolve_key(camera_id, profile, channel, db)
+    return {
+        "camera_id": camera_id,
+        "channel": key.channel,
+        "profile": key.profile,
+        "metrics": stream_manager.get_metrics(key, history=history),
+    }
+
+
+@router.websocket("/{camera_id}/ws")
+@router.websocket("/{camera_id}/{channel}/ws")
+async def stream_websocket(
+    websocket: WebSocket,
+    camera_id: int,
+    channel: int = 1,
+    profile: Optional[StreamProfile] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Push live fragmented MP4 for a camera over a WebSocket.
+
+    ``channel`` and ``profile`` select the stream as for ``/start``; each
+    selected stream runs one shared relay. The first message is JSON text ``{"type": "init", "mime_type": ...}`` for
+    setting up a MediaSource buffer, followed by the binary init segment and
+    then one binary message per moof/mdat fragment. If the relay cannot be
+    started, a JSON ``{"type": "error", "fallback": "hls", ...}`` message is
+    sent before closing so clients can switch to ``/api/streams/{id}/start``.
+    """
+    await websocket.accept()
+
+    camera = db.query(Camera).filter(Camera.id == camera_id).first()
+    if not camera or not camera.username or not camera.password:
+        error = "Camera not found" if not camera else "Camera credentials not configured"
+        await websocket.send_json({"type": "error", "error": error})
+        await websocket.close(code=1008)
+        return
+    if not camera.has_channel(channel):
+        await websocket.send_json({"type": "error", "error": f"Camera has no channel {channel}"})
+        await websocket.close(code=1008)
+        return
+    profile = profile or camera.default_profile
+    key = StreamKey(camera_id, camera.stream_profile(profile), channel)
+    rtsp_url = camera.profile_rtsp_url(profile, channel)
+    # Don't hold a database connection for the lifetime of the socket
+    db.close()
+
+    try:
+        subscriber = await live_relay.subscribe(key, rtsp_url)
+    except RuntimeError as e:
+        await websocket.send_json({
+            "type": "error",
+            "error": _friendly_stream_error(str(e)),
+            "fallback": "hls",
+            "start_url": f"/api/streams/{camera_id}/{channel}/start?profile={key.profile}",
+        })
+        await websocket.close(code=1011)
+        return
+
+    async def send_fragments():
+        await websocket.send_json({"type": "init", "mime_type": live_relay.get_mime_type(key)})
+        await websocket.send_bytes(live_relay.get_init(key))
+        while True:
+            fragment = await subscriber.queue.get()
+            if fragment is None:
+                break
+            await websocket.send_bytes(fragment)
+        await websocket.send_json({"type": "closed", "reason": subscriber.close_reason, "fallback": "hls"})
+        await websocket.close()
+
+    async def watch_disconnect():
+        # Clients only send to keep the connection alive; wait for them to leave
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+    tasks = [asyncio.create_task(send_fragments()), asyncio.create_task(watch_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Let the relay shut FFmpeg down even if this handler is cancelled
+        await asyncio.shield(live_relay.unsubscribe(key, subscriber))
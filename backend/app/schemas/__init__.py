@@ -2,10 +2,16 @@ from .camera import CameraCreate, CameraUpdate, CameraResponse, CameraDiscovery
 from .device import DeviceCreate, DeviceUpdate, DeviceResponse
 from .task import TaskCreate, TaskUpdate, TaskResponse
 from .shopping import ShoppingItemCreate, ShoppingItemUpdate, ShoppingItemResponse
+from .stream import StreamProfile, StreamStartAllRequest
+from .motion_event import MotionEventResponse
+from .event_clip import EventClipCreate, EventClipResponse
 
 __all__ = [
     "CameraCreate", "CameraUpdate", "CameraResponse", "CameraDiscovery",
     "DeviceCreate", "DeviceUpdate", "DeviceResponse",
     "TaskCreate", "TaskUpdate", "TaskResponse",
     "ShoppingItemCreate", "ShoppingItemUpdate", "ShoppingItemResponse",
+    "StreamProfile", "StreamStartAllRequest",
+    "MotionEventResponse",
+    "EventClipCreate", "EventClipResponse",
 ]
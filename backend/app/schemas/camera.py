@@ -11,6 +11,9 @@ class CameraBase(BaseModel):
     location: Optional[str] = None
     brand: str = "Dahua"
     channels: int = 1
+    always_on: bool = False
+    record: bool = False
+    motion_detection: bool = False
 
 
 class CameraCreate(CameraBase):
@@ -28,6 +31,9 @@ class CameraUpdate(BaseModel):
     location: Optional[str] = None
     is_active: Optional[bool] = None
     channels: Optional[int] = None
+    always_on: Optional[bool] = None
+    record: Optional[bool] = None
+    motion_detection: Optional[bool] = None
 
 
 class CameraResponse(CameraBase):
@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+
+class EventClipCreate(BaseModel):
+    preroll: Optional[float] = None  # Seconds before the trigger, defaults to clip_preroll_seconds
+    postroll: Optional[float] = None  # Seconds after the trigger, defaults to clip_postroll_seconds
+
+
+class EventClipResponse(BaseModel):
+    id: int
+    camera_id: int
+    motion_event_id: Optional[int] = None
+    trigger: str
+    triggered_at: datetime
+    status: str
+    duration: Optional[float] = None
+    size: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+
+class MotionEventResponse(BaseModel):
+    id: int
+    camera_id: int
+    started_at: datetime
+    ended_at: Optional[datetime] = None
+    score: float
+    box_x: float
+    box_y: float
+    box_width: float
+    box_height: float
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+
+# "main" is the camera's HD stream, "sub" its low-resolution substream
+StreamProfile = Literal["main", "sub"]
+
+
+class StreamStartAllRequest(BaseModel):
+    camera_ids: Optional[List[int]] = None  # Defaults to every camera
+    active_only: bool = True
+    viewer_id: Optional[str] = None  # Viewer session to join all streams under
+    profile: StreamProfile = "sub"  # Grid tiles only need the substream
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import asyncio
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.event_clip import EventClip
+from .stream_manager import StreamKey, stream_manager
+
+
+class ClipBuilder:
+    """
+    Cut MP4 event clips from the HLS segments a camera is already producing.
+
+    A trigger copies the completed segments covering the pre-roll window
+    straight away, before FFmpeg deletes them, then keeps appending new
+    segments until the post-roll window has been written. The collected
+    MPEG-TS is remuxed to MP4 with stream copy, so a clip costs no decoding
+    and no extra RTSP session; the camera must be streaming for a clip to
+    be cut. Clips are indexed in the event_clips table.
+    """
+
+    # Extra wait for the segment that spans the end of the post-roll window
+    SEGMENT_GRACE = 3.0
+
+    def __init__(self):
+        # Clips being cut: clip ID -> (camera ID, task)
+        self._tasks: Dict[int, Tuple[int, asyncio.Task]] = {}
+
+    @staticmethod
+    def source_stream(camera_id: int) -> Optional[StreamKey]:
+        """Get the running stream to cut a camera's clips from, main stream first."""
+        for profile in ("main", "sub"):
+            key = StreamKey(camera_id, profile)
+            if stream_manager.is_streaming(key) and stream_manager.get_recent_segments(key):
+                return key
+        return None
+
+    @staticmethod
+    def clip_path(camera_id: int, clip_id: int) -> Path:
+        return settings.clip_dir / f"camera_{camera_id}" / f"{clip_id}.mp4"
+
+    def trigger(
+        self,
+        camera_id: int,
+        trigger: str = "api",
+        motion_event_id: Optional[int] = None,
+        preroll: Optional[float] = None,
+        postroll: Optional[float] = None,
+    ) -> int:
+        """
+        Start cutting a clip around the current moment.
+
+        Returns:
+            ID of the pending EventClip
+
+        Raises:
+            RuntimeError: If the camera has no running stream to cut from
+        """
+        key = self.source_stream(camera_id)
+        if key is None:
+            raise RuntimeError("Camera is not streaming")
+        preroll = settings.clip_preroll_seconds if preroll is None else max(preroll, 0.0)
+        postroll = settings.clip_postroll_seconds if postroll is None else max(postroll, 0.0)
+        postroll = min(postroll, max(settings.clip_max_seconds - preroll, 0.0))
+
+        triggered = time.time()
+        db = SessionLocal()
+        try:
+            clip = EventClip(
+                camera_id=camera_id,
+                motion_event_id=motion_event_id,
+                trigger=trigger,
+                triggered_at=datetime.fromtimestamp(triggered, timezone.utc),
+            )
+            db.add(clip)
+            db.commit()
+            clip_id = clip.id
+        finally:
+            db.close()
+
+        print(f"[ClipBuilder] Cutting clip {clip_id} for camera {key} ({preroll:g}s + {postroll:g}s)")
+        task = asyncio.create_task(self._build(clip_id, key, triggered - preroll, triggered + postroll))
+        self._tasks[clip_id] = (camera_id, task)
+        task.add_done_callback(lambda _: self._tasks.pop(clip_id, None))
+        return clip_id
+
+    def on_motion(self, camera_id: int, event_id: int) -> None:
+        """Motion detector listener: clip every event of a streaming camera."""
+        try:
+            self.trigger(camera_id, trigger="motion", motion_event_id=event_id)
+        except RuntimeError:
+            pass
+
+    async def _build(self, clip_id: int, key: StreamKey, start: float, end: float) -> None:
+        path = self.clip_path(key.camera_id, clip_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        collected = path.with_suffix(".ts")
+        taken: Set[str] = set()
+        duration = 0.0
+
+        def collect() -> bool:
+            """Append newly completed segments in the window; True once the window is covered."""
+            nonlocal duration
+            covered = False
+            with open(collected, "ab") as f:
+                for seg_start, seg_duration, filename in stream_manager.get_recent_segments(key):
+                    seg_end = seg_start + seg_duration
+                    covered = covered or seg_end >= end
+                    if filename in taken or seg_end <= start or seg_start >= end:
+                        continue
+                    data = stream_manager.read_segment(key, filename)
+                    if data is None:
+                        continue
+                    f.write(data)
+                    taken.add(filename)
+                    duration += seg_duration
+            return covered
+
+        try:
+            deadline = end + self.SEGMENT_GRACE
+            while not collect() and time.time() < deadline and stream_manager.is_streaming(key):
+                await asyncio.sleep(1.0)
+            if not taken:
+                raise RuntimeError("No segments were available for the clip window")
+
+            process = await asyncio.create_subprocess_exec(
+                "ffmpeg", "-hide_banner", "-nostats", "-loglevel", "error", "-y",
+                "-f", "mpegts", "-i", str(collected),
+                "-c", "copy",
+                "-movflags", "+faststart",
+                str(path),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+                stdin=asyncio.subprocess.DEVNULL,
+            )
+            try:
+                _, stderr = await process.communicate()
+            except asyncio.CancelledError:
+                # Don't leave the remux writing a clip nobody wants
+                process.kill()
+                raise
+            if process.returncode != 0:
+                raise RuntimeError(stderr.decode("utf-8", errors="ignore").strip()[-500:] or "FFmpeg failed")
+            self._finish(clip_id, "ready", duration=round(duration, 3), size=path.stat().st_size)
+            print(f"[ClipBuilder] Clip {clip_id} ready ({duration:.1f}s from {len(taken)} segments)")
+        except FileNotFoundError:
+            self._finish(clip_id, "failed", error="FFmpeg not found. Please install FFmpeg.")
+        except asyncio.CancelledError:
+            self._finish(clip_id, "failed", error="Server stopped before the clip was complete")
+            raise
+        except Exception as e:
+            print(f"[ClipBuilder] Clip {clip_id} failed: {e}")
+            self._finish(clip_id, "failed", error=str(e)[:500])
+        finally:
+            collected.unlink(missing_ok=True)
+
+    @staticmethod
+    def _finish(clip_id: int, status: str, **values) -> None:
+        db = SessionLocal()
+        try:
+            clip = db.query(EventClip).filter(EventClip.id == clip_id).first()
+            if clip is None:
+                return
+            clip.status = status
+            for name, value in values.items():
+                setattr(clip, name, value)
+            db.commit()
+        finally:
+            db.close()
+
+    def delete_files(self, camera_id: int, clip_id: Optional[int] = None) -> None:
+        """Delete one clip's file, or every clip file of a camera, abandoning clips being cut."""
+        for other_id, (other_camera_id, task) in list(self._tasks.items()):
+            if other_camera_id == camera_id and clip_id in (None, other_id):
+                # Cancelled before it next touches the clip directory
+                task.cancel()
+        if clip_id is not None:
+            self.clip_path(camera_id, clip_id).unlink(missing_ok=True)
+        else:
+            shutil.rmtree(settings.clip_dir / f"camera_{camera_id}", ignore_errors=True)
+
+    async def stop_all(self) -> None:
+        """Abandon clips still being cut."""
+        tasks = [task for _, task in self._tasks.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Global clip builder instance
+clip_builder = ClipBuilder()
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import os
+import signal
+import subprocess
+from pathlib import Path
+from typing import List, Optional
+
+# fcntl.F_SETPIPE_SZ is only exported from Python 3.10
+_F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031)
+
+# Log pipe capacity, enough for about half an hour of -progress reports
+# while no server reads them (the default pipe-max-size)
+_PIPE_SIZE = 1024 * 1024
+
+
+def _running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            # An exited process nobody has reaped yet is a zombie ("Z")
+            return f.read().rsplit(b")", 1)[-1].split()[0] != b"Z"
+    except (OSError, IndexError):
+        return True
+
+
+def runs_command(pid: int, *markers: str) -> bool:
+    """Whether a process is alive and its command line contains every marker (Linux only)."""
+    if not _running(pid):
+        return False
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            cmdline = f.read()
+    except OSError:
+        return False
+    return all(marker.encode() in cmdline for marker in markers)
+
+
+class DetachedProcess:
+    """
+    FFmpeg process that can outlive this server and be adopted by the next one.
+
+    An asyncio subprocess is killed when its transport is closed with the
+    event loop, and its stderr pipe dies with the server. A detached process
+    runs in its own session, so Ctrl+C and reloaders signalling the server's
+    process group miss it, and it logs to a named pipe next to its output,
+    which the next server reopens to keep following it.
+
+    The process holds its log pipe open for reading as well as writing, so
+    while no server follows it its writes are buffered instead of failing
+    with EPIPE; FFmpeg gives up on its -progress output after a failed
+    write. A process left unfollowed for longer than the buffer lasts
+    blocks on its log until it is adopted or stopped.
+
+    Offers the part of asyncio.subprocess.Process that StreamManager uses.
+    """
+
+    # Seconds between exit checks while waiting for the process
+    POLL_INTERVAL = 0.2
+
+    def __init__(self, pid: int, log_pipe: Path, popen: Optional[subprocess.Popen] = None):
+        self.pid = pid
+        self.log_pipe = log_pipe
+        self.stderr: Optional[asyncio.StreamReader] = None
+        self._popen = popen
+        self._returncode: Optional[int] = None
+        self._transport: Optional[asyncio.ReadTransport] = None
+
+    @classmethod
+    async def start(cls, cmd: List[str], log_pipe: Path) -> "DetachedProcess":
+        """Launch a process logging to a new named pipe at log_pipe."""
+        log_pipe.unlink(missing_ok=True)
+        os.mkfifo(log_pipe, 0o600)
+        read_fd = os.open(log_pipe, os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            # Read-write, so the pipe always has a reader (Linux semantics)
+            write_fd = os.open(log_pipe, os.O_RDWR)
+            try:
+                try:
+                    fcntl.fcntl(write_fd, _F_SETPIPE_SZ, _PIPE_SIZE)
+                except OSError:
+                    pass
+                popen = subprocess.Popen(
+                    cmd,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=write_fd,
+                    start_new_session=True,
+                )
+            finally:
+                os.close(write_fd)
+        except BaseException:
+            os.close(read_fd)
+            raise
+        process = cls(popen.pid, log_pipe, popen)
+        await process._follow_log(read_fd)
+        return process
+
+    @classmethod
+    async def adopt(cls, pid: int, log_pipe: Path) -> "DetachedProcess":
+        """
+        Follow a detached process started by an earlier server.
+
+        What it logged while no server followed it is discarded, since the
+        times of those lines are lost; callers rebuild that state from the
+        process's output files instead.
+
+        Raises:
+            OSError: If the log pipe is gone
+        """
+        read_fd = os.open(log_pipe, os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            while os.read(read_fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        except BaseException:
+            os.close(read_fd)
+            raise
+        process = cls(pid, log_pipe)
+        await process._follow_log(read_fd)
+        return process
+
+    async def _follow_log(self, read_fd: int) -> None:
+        loop = asyncio.get_running_loop()
+        self.stderr = asyncio.StreamReader()
+        self._transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(self.stderr), os.fdopen(read_fd, "rb", buffering=0)
+        )
+
+    @property
+    def returncode(self) -> Optional[int]:
+        if self._returncode is None:
+            if self._popen is not None:
+                self._returncode = self._popen.poll()
+            elif not _running(self.pid):
+                # An adopted process is not our child, so its exit status is unknown
+                self._returncode = -1
+        return self._returncode
+
+    async def wait(self) -> int:
+        while self.returncode is None:
+            await asyncio.sleep(self.POLL_INTERVAL)
+        return self._returncode
+
+    def send_signal(self, signum: int) -> None:
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self) -> None:
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self) -> None:
+        self.send_signal(signal.SIGKILL)
+
+    def detach(self) -> None:
+        """Stop following the process, leaving it running for the next server to adopt."""
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
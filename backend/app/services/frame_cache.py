@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from ..config import settings
+from .stream_manager import StreamKey, stream_manager
+
+JPEG_START = b"\xff\xd8"
+JPEG_END = b"\xff\xd9"
+
+
+class _FrameSource:
+    """Low-fps JPEG decoder and latest frame for one camera."""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.frame: Optional[bytes] = None
+        self.frame_at: Optional[float] = None
+        self.frames = 0
+        self.ended = False
+        self.updated = asyncio.Event()
+        self.stderr: Deque[str] = deque(maxlen=20)
+        self.clients = 0
+        self.last_access = time.monotonic()
+        self.tasks = []
+
+    def publish(self, frame: bytes) -> None:
+        self.frame = frame
+        self.frame_at = time.time()
+        self.frames += 1
+        # Wake waiting requests; later waiters use a fresh event
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+
+class FrameCache:
+    """
+    Keep the latest still frame per camera for snapshots and MJPEG.
+
+    One FFmpeg per camera decodes the RTSP stream at a low frame rate and
+    writes JPEGs to stdout. Every snapshot request and MJPEG viewer reads
+    from the same cached frame, so a dashboard grid costs one decoder per
+    camera however many screens show it. Sources start on first use and
+    stop once no request has touched them for ``snapshot_idle_timeout``.
+    Running decoders count against the stream budgets.
+    """
+
+    def __init__(self):
+        self._sources: Dict[int, _FrameSource] = {}
+        self._lock = asyncio.Lock()
+
+    async def _ensure_source(self, camera_id: int, rtsp_url: str) -> _FrameSource:
+        async with self._lock:
+            source = self._sources.get(camera_id)
+            if source is not None and not source.ended:
+                source.last_access = time.monotonic()
+                return source
+            if source is not None:
+                await self._terminate(source)
+
+            # Decoders read the substream, see cameras._snapshot_source
+            error = await stream_manager.acquire_session(
+                self._session(camera_id), StreamKey(camera_id, "sub"), decode=True
+            )
+            if error is not None:
+                raise RuntimeError(error)
+            print(f"[FrameCache] Starting snapshot decoder for camera {camera_id}")
+            cmd = [
+                "ffmpeg",
+                "-hide_banner",
+                "-nostats",
+                # Only errors are kept, for reporting why the decoder failed
+                "-loglevel", "error",
+                "-rtsp_transport", "tcp",
+                "-timeout", "5000000",
+                "-i", rtsp_url,
+                "-an",
+                "-vf", f"fps={settings.snapshot_fps},scale={settings.snapshot_width}:-2",
+                "-q:v", str(settings.snapshot_quality),
+                "-f", "image2pipe",
+                "-c:v", "mjpeg",
+                "pipe:1",
+            ]
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    stdin=asyncio.subprocess.DEVNULL,
+                )
+            except FileNotFoundError:
+                await stream_manager.release_session(self._session(camera_id))
+                raise RuntimeError("FFmpeg not found. Please install FFmpeg.")
+
+            source = _FrameSource(process)
+            source.tasks = [
+                asyncio.create_task(self._read_frames(source)),
+                asyncio.create_task(self._read_stderr(source)),
+                asyncio.create_task(self._stop_when_idle(camera_id, source)),
+            ]
+            self._sources[camera_id] = source
+            return source
+
+    @staticmethod
+    def _session(camera_id: int) -> str:
+        return f"snapshot:{camera_id}"
+
+    @staticmethod
+    async def _read_frames(source: _FrameSource) -> None:
+        """Split FFmpeg's concatenated JPEG output into frames."""
+        buffer = b""
+        stdout = source.process.stdout
+        while True:
+            chunk = await stdout.read(65536)
+            if not chunk:
+                break
+            buffer += chunk
+            while True:
+                start = buffer.find(JPEG_START)
+                end = buffer.find(JPEG_END, start + 2) if start != -1 else -1
+                if end == -1:
+                    break
+                source.publish(buffer[start:end + 2])
+                buffer = buffer[end + 2:]
+        # Wake waiters so they notice the decoder is gone
+        source.ended = True
+        source.updated.set()
+
+    @staticmethod
+    async def _read_stderr(source: _FrameSource) -> None:
+        """Keep FFmpeg's last log lines for error reporting."""
+        async for line in source.process.stderr:
+            decoded = line.decode("utf-8", errors="ignore").strip()
+            if decoded:
+                source.stderr.append(decoded)
+
+    async def _stop_when_idle(self, camera_id: int, source: _FrameSource) -> None:
+        while not source.ended:
+            await asyncio.sleep(settings.snapshot_idle_timeout / 2)
+            idle = time.monotonic() - source.last_access
+            if source.clients == 0 and idle >= settings.snapshot_idle_timeout:
+                async with self._lock:
+                    if self._sources.get(camera_id) is source:
+                        del self._sources[camera_id]
+                        await stream_manager.release_session(self._session(camera_id))
+                print(f"[FrameCache] Stopping idle snapshot decoder for camera {camera_id}")
+                await self._terminate(source)
+                return
+        # The decoder exited; a later request starts a new one
+        async with self._lock:
+            if self._sources.get(camera_id) is source:
+                await stream_manager.release_session(self._session(camera_id))
+
+    @staticmethod
+    async def _terminate(source: _FrameSource) -> None:
+        process = source.process
+        if process.returncode is None:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+        for task in source.tasks:
+            # The idle watchdog terminates sources itself
+            if task is not asyncio.current_task():
+                task.cancel()
+
+    @staticmethod
+    def _error(source: _FrameSource) -> str:
+        return source.stderr[-1] if source.stderr else "No frame received from camera"
+
+    async def get_frame(self, camera_id: int, rtsp_url: str, timeout: Optional[float] = None) -> Tuple[bytes, float]:
+        """
+        Get a camera's latest frame, starting its decoder if needed.
+
+        Returns:
+            Tuple of (JPEG bytes, capture timestamp)
+
+        Raises:
+            RuntimeError: If no frame arrives within the timeout
+        """
+        source = await self._ensure_source(camera_id, rtsp_url)
+        if source.frame is None:
+            deadline = time.monotonic() + (timeout or settings.snapshot_timeout)
+            while source.frame is None and not source.ended:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(source.updated.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+        if source.frame is None:
+            raise RuntimeError(self._error(source))
+        return source.frame, source.frame_at
+
+    async def stream_frames(self, camera_id: int, rtsp_url: str):
+        """
+        Yield each new frame for an MJPEG viewer until the decoder stops or stalls.
+
+        Raises:
+            RuntimeError: If FFmpeg could not be started
+        """
+        source = await self._ensure_source(camera_id, rtsp_url)
+        source.clients += 1
+        try:
+            last_seen = None
+            while True:
+                if source.frame is not None and source.frame_at != last_seen:
+                    last_seen = source.frame_at
+                    source.last_access = time.monotonic()
+                    yield source.frame
+                if source.ended:
+                    break
+                try:
+                    await asyncio.wait_for(source.updated.wait(), timeout=settings.snapshot_timeout)
+                except asyncio.TimeoutError:
+                    break
+        finally:
+            source.clients -= 1
+            source.last_access = time.monotonic()
+
+    async def stop(self, camera_id: int) -> None:
+        """Stop a camera's decoder and drop its cached frame."""
+        async with self._lock:
+            source = self._sources.pop(camera_id, None)
+            if source is not None:
+                await stream_manager.release_session(self._session(camera_id))
+        if source is not None:
+            await self._terminate(source)
+
+    async def stop_all(self) -> None:
+        """Stop every snapshot decoder."""
+        async with self._lock:
+            sources = dict(self._sources)
+            self._sources.clear()
+            for camera_id in sources:
+                await stream_manager.release_session(self._session(camera_id))
+        await asyncio.gather(*(self._terminate(source) for source in sources.values()))
+
+    def get_status(self) -> Dict[int, Dict[str, Any]]:
+        """Get frame counts, ages and MJPEG clients per camera."""
+        now = time.time()
+        return {
+            camera_id: {
+                "running": not source.ended,
+                "frames": source.frames,
+                "frame_age": round(now - source.frame_at, 1) if source.frame_at else None,
+                "mjpeg_clients": source.clients,
+            }
+            for camera_id, source in self._sources.items()
+        }
+
+
+# Global frame cache instance
+frame_cache = FrameCache()
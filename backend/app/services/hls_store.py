@@ -0,0 +1,448 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import re
+import secrets
+import struct
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+INIT_SEGMENT_NAME = "init.mp4"
+
+_EXTINF = re.compile(r"#EXTINF:([\d.]+)")
+_PART_URI = re.compile(r"^p(\d+)\.(\d+)\.m4s$")
+_SEGMENT_URI = re.compile(r"^s(\d+)\.m4s$")
+
+# ISO BMFF sample flag: sample_is_non_sync_sample
+_NON_SYNC_SAMPLE = 0x00010000
+
+
+class _StreamBuffer:
+    """Playlist and recent segments for one stream."""
+
+    def __init__(self, token: str):
+        self.token = token
+        self.playlist: Optional[bytes] = None
+        self.segments: "OrderedDict[str, bytes]" = OrderedDict()
+        self.size = 0
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+
+class _Part:
+    """One published LL-HLS partial segment."""
+
+    __slots__ = ("data", "duration", "independent")
+
+    def __init__(self, data: bytes, duration: float, independent: bool):
+        self.data = data
+        self.duration = duration
+        self.independent = independent
+
+
+def _iter_boxes(data: bytes, start: int = 0, end: Optional[int] = None):
+    """Yield (type, payload_start, box_end) for the ISO BMFF boxes in a range."""
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header = 8
+        if size == 1 and offset + 16 <= end:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield box_type, offset + header, min(offset + size, end)
+        offset += size
+
+
+def starts_with_keyframe(data: bytes) -> bool:
+    """
+    Check whether an fMP4 fragment begins with a sync sample.
+
+    Reads the first sample's flags from the first ``trun`` (or the ``tfhd``
+    defaults) of the first ``moof``. Returns False when it cannot tell.
+    """
+    for box_type, start, end in _iter_boxes(data):
+        if box_type != b"moof":
+            continue
+        for traf_type, traf_start, traf_end in _iter_boxes(data, start, end):
+            if traf_type != b"traf":
+                continue
+            default_flags = None
+            for child_type, child_start, child_end in _iter_boxes(data, traf_start, traf_end):
+                if child_end - child_start < 8:
+                    continue
+                flags = struct.unpack_from(">I", data, child_start)[0] & 0xFFFFFF
+                if child_type == b"tfhd":
+                    offset = child_start + 8
+                    offset += 8 if flags & 0x01 else 0
+                    offset += 4 if flags & 0x02 else 0
+                    offset += 4 if flags & 0x08 else 0
+                    offset += 4 if flags & 0x10 else 0
+                    if flags & 0x20 and offset + 4 <= child_end:
+                        default_flags = struct.unpack_from(">I", data, offset)[0]
+                elif child_type == b"trun":
+                    offset = child_start + 8
+                    offset += 4 if flags & 0x01 else 0
+                    if flags & 0x04 and offset + 4 <= child_end:
+                        sample_flags = struct.unpack_from(">I", data, offset)[0]
+                    elif flags & 0x400 and offset + (4 if flags & 0x100 else 0) + (4 if flags & 0x200 else 0) + 4 <= child_end:
+                        offset += 4 if flags & 0x100 else 0
+                        offset += 4 if flags & 0x200 else 0
+                        sample_flags = struct.unpack_from(">I", data, offset)[0]
+                    elif default_flags is not None:
+                        sample_flags = default_flags
+                    else:
+                        return False
+                    return not sample_flags & _NON_SYNC_SAMPLE
+        return False
+    return False
+
+
+class _LowLatencyBuffer:
+    """
+    LL-HLS state for one stream.
+
+    FFmpeg produces short fMP4 fragments as its "segments"; each one becomes
+    an LL-HLS part once FFmpeg lists it (with its duration) in the playlist it
+    uploads. Every ``parts_per_segment`` consecutive parts form one full
+    segment, served as the concatenation of its parts. Fragments uploaded
+    before the oldest one FFmpeg still lists will never be published and
+    are dropped.
+    """
+
+    def __init__(self, token: str, part_target: float, parts_per_segment: int, max_segments: int):
+        self.token = token
+        self.part_target = part_target
+        self.parts_per_segment = parts_per_segment
+        self.max_parts = max_segments * parts_per_segment
+        self.init: Optional[bytes] = None
+        self.pending: Dict[str, bytes] = {}
+        # Upload order of the fragments FFmpeg may still list
+        self._uploads: Dict[str, int] = {}
+        self._upload_count = 0
+        self.parts: List[_Part] = []
+        self.first_part = 0  # Absolute index of parts[0]
+        self.size = 0
+        self.playlist: Optional[bytes] = None
+        self.updated = asyncio.Event()
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    @property
+    def next_part(self) -> int:
+        """Absolute index of the next part to be published."""
+        return self.first_part + len(self.parts)
+
+    def add_fragment(self, filename: str, data: bytes) -> None:
+        """Hold an uploaded fragment until FFmpeg's playlist lists it."""
+        self.pending[filename] = data
+        self._uploads[filename] = self._upload_count
+        self._upload_count += 1
+
+    def publish(self, ffmpeg_playlist: str) -> None:
+        """Publish uploaded fragments listed in FFmpeg's own playlist."""
+        duration = None
+        published = False
+        listed = []
+        for line in ffmpeg_playlist.splitlines():
+            match = _EXTINF.match(line)
+            if match:
+                duration = float(match.group(1))
+                continue
+            name = line.strip()
+            if duration is not None and name and not name.startswith("#"):
+                name = name.rsplit("/", 1)[-1]
+                listed.append(name)
+                data = self.pending.pop(name, None)
+                if data is not None:
+                    self.parts.append(_Part(data, duration, starts_with_keyframe(data)))
+                    self.size += len(data)
+                    published = True
+                duration = None
+
+        oldest = self._uploads.get(listed[0]) if listed else None
+        if oldest is not None:
+            for name, number in list(self._uploads.items()):
+                if number < oldest:
+                    del self._uploads[name]
+                    self.pending.pop(name, None)
+
+        if not published:
+            return
+
+        # Drop whole segments from the front so part numbering stays aligned
+        while len(self.parts) > self.max_parts:
+            for part in self.parts[:self.parts_per_segment]:
+                self.size -= len(part.data)
+            del self.parts[:self.parts_per_segment]
+            self.first_part += self.parts_per_segment
+
+        self.playlist = self.render().encode("utf-8")
+        self.updated_at = time.time()
+        # Wake blocked requests; later waiters use a fresh event
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+    def _segment_parts(self, msn: int) -> List[_Part]:
+        start = msn * self.parts_per_segment - self.first_part
+        return self.parts[max(start, 0):start + self.parts_per_segment]
+
+    def render(self) -> str:
+        """Build the LL-HLS media playlist."""
+        per_segment = self.parts_per_segment
+        part_target = max([self.part_target] + [part.duration for part in self.parts])
+        first_msn = self.first_part // per_segment
+        complete = self.next_part // per_segment
+        target_duration = max(
+            [math.ceil(per_segment * part_target)]
+            + [math.ceil(sum(p.duration for p in self._segment_parts(msn))) for msn in range(first_msn, complete)]
+        )
+
+        def part_line(index: int) -> str:
+            part = self.parts[index - self.first_part]
+            msn, number = divmod(index, per_segment)
+            line = f'#EXT-X-PART:DURATION={part.duration:.5f},URI="p{msn}.{number}.m4s"'
+            return line + (",INDEPENDENT=YES" if part.independent else "")
+
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:9",
+            f"#EXT-X-TARGETDURATION:{target_duration}",
+            f"#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,PART-HOLD-BACK={3 * part_target:.3f}",
+            f"#EXT-X-PART-INF:PART-TARGET={part_target:.5f}",
+            f"#EXT-X-MEDIA-SEQUENCE:{first_msn}",
+            f'#EXT-X-MAP:URI="{INIT_SEGMENT_NAME}"',
+        ]
+        for msn in range(first_msn, complete):
+            # Parts are only listed for the most recent segments
+            if msn >= complete - 2:
+                lines.extend(part_line(index) for index in range(msn * per_segment, (msn + 1) * per_segment))
+            duration = sum(part.duration for part in self._segment_parts(msn))
+            lines.append(f"#EXTINF:{duration:.5f},")
+            lines.append(f"s{msn}.m4s")
+
+        lines.extend(part_line(index) for index in range(complete * per_segment, self.next_part))
+        next_msn, next_number = divmod(self.next_part, per_segment)
+        lines.append(f'#EXT-X-PRELOAD-HINT:TYPE=PART,URI="p{next_msn}.{next_number}.m4s"')
+        return "\n".join(lines) + "\n"
+
+    def get(self, filename: str) -> Optional[bytes]:
+        if filename.endswith(".m3u8"):
+            return self.playlist
+        if filename == INIT_SEGMENT_NAME:
+            return self.init
+
+        match = _PART_URI.match(filename)
+        if match:
+            index = int(match.group(1)) * self.parts_per_segment + int(match.group(2))
+            if self.first_part <= index < self.next_part:
+                return self.parts[index - self.first_part].data
+            return None
+
+        match = _SEGMENT_URI.match(filename)
+        if match:
+            msn = int(match.group(1))
+            if msn * self.parts_per_segment >= self.first_part and (msn + 1) * self.parts_per_segment <= self.next_part:
+                return b"".join(part.data for part in self._segment_parts(msn))
+        return None
+
+    def required_part(self, filename: str, msn: Optional[int], part: Optional[int]) -> Optional[int]:
+        """Absolute part index a request has to wait for, or None if it cannot block."""
+        if filename.endswith(".m3u8"):
+            if msn is None:
+                return None
+            # Without _HLS_part the whole segment must be complete
+            return msn * self.parts_per_segment + (part if part is not None else self.parts_per_segment - 1)
+        match = _PART_URI.match(filename)
+        if match:
+            return int(match.group(1)) * self.parts_per_segment + int(match.group(2))
+        return None
+
+
+class HLSMemoryStore:
+    """
+    In-memory HLS playlists and segments.
+
+    FFmpeg uploads its output over HTTP PUT to the ingest route, and the
+    serving route reads it back without touching the filesystem. Each stream
+    keeps a bounded ring of its most recent segments; playlists are replaced
+    as a whole so readers never see a half-written file.
+    """
+
+    def __init__(self, max_segments: int, max_bytes: int):
+        self._max_segments = max_segments
+        self._max_bytes = max_bytes
+        self._streams: Dict[str, Any] = {}
+        self._requests: Dict[str, Dict[str, int]] = {}
+
+    def open(
+        self,
+        stream_name: str,
+        low_latency: bool = False,
+        part_target: float = 0.333,
+        parts_per_segment: int = 3,
+    ) -> str:
+        """
+        Create an empty buffer for a stream, replacing any previous one.
+
+        Args:
+            stream_name: Published stream name
+            low_latency: Serve FFmpeg's fragments as LL-HLS parts
+            part_target: Target part duration in seconds (LL-HLS only)
+            parts_per_segment: Parts grouped into each full segment (LL-HLS only)
+
+        Returns:
+            Ingest token FFmpeg must present when uploading
+        """
+        token = secrets.token_urlsafe(16)
+        if low_latency:
+            self._streams[stream_name] = _LowLatencyBuffer(
+                token, part_target, parts_per_segment, self._max_segments
+            )
+        else:
+            self._streams[stream_name] = _StreamBuffer(token)
+        self._requests[stream_name] = {"playlist": 0, "media": 0, "blocked": 0}
+        return token
+
+    def close(self, stream_name: str) -> None:
+        """Drop a stream's buffer."""
+        self._streams.pop(stream_name, None)
+        self._requests.pop(stream_name, None)
+
+    def is_low_latency(self, stream_name: str) -> bool:
+        """Check if a stream is served as LL-HLS."""
+        return isinstance(self._streams.get(stream_name), _LowLatencyBuffer)
+
+    def has_stream(self, stream_name: str) -> bool:
+        """Check if a stream is served from memory."""
+        return stream_name in self._streams
+
+    def put(self, stream_name: str, token: str, filename: str, data: bytes) -> bool:
+        """
+        Store an uploaded playlist or segment.
+
+        Returns:
+            False if the stream is unknown or the token does not match
+        """
+        buffer = self._streams.get(stream_name)
+        if buffer is None or not secrets.compare_digest(buffer.token, token):
+            return False
+
+        buffer.updated_at = time.time()
+        if isinstance(buffer, _LowLatencyBuffer):
+            if filename == INIT_SEGMENT_NAME:
+                buffer.init = data
+            elif filename.endswith(".m3u8"):
+                buffer.publish(data.decode("utf-8", errors="ignore"))
+            else:
+                buffer.add_fragment(filename, data)
+            return True
+
+        if filename.endswith(".m3u8"):
+            buffer.playlist = data
+            return True
+
+        previous = buffer.segments.pop(filename, None)
+        if previous is not None:
+            buffer.size -= len(previous)
+        buffer.segments[filename] = data
+        buffer.size += len(data)
+
+        # Evict the oldest segments, always keeping the newest one
+        while len(buffer.segments) > 1 and (
+            len(buffer.segments) > self._max_segments or buffer.size > self._max_bytes
+        ):
+            _, evicted = buffer.segments.popitem(last=False)
+            buffer.size -= len(evicted)
+        return True
+
+    def get(self, stream_name: str, filename: str) -> Optional[bytes]:
+        """Get a playlist or segment, or None if it is not buffered."""
+        buffer = self._streams.get(stream_name)
+        if buffer is None:
+            return None
+        if isinstance(buffer, _LowLatencyBuffer):
+            return buffer.get(filename)
+        if filename.endswith(".m3u8"):
+            return buffer.playlist
+        return buffer.segments.get(filename)
+
+    async def wait_until_available(
+        self,
+        stream_name: str,
+        filename: str,
+        msn: Optional[int] = None,
+        part: Optional[int] = None,
+        timeout: float = 3.0,
+    ) -> str:
+        """
+        Block an LL-HLS request until the media it asks for exists.
+
+        Handles blocking playlist reloads (``_HLS_msn``/``_HLS_part``) and
+        requests for the part announced by the preload hint.
+
+        Returns:
+            "ready" when the request can be answered, "timeout" if the media
+            did not appear in time, or "invalid" if it is too far ahead
+        """
+        buffer = self._streams.get(stream_name)
+        if not isinstance(buffer, _LowLatencyBuffer):
+            return "ready"
+        required = buffer.required_part(filename, msn, part)
+        if required is None:
+            return "ready"
+        # Requests more than two segments ahead are rejected, as the spec requires
+        if required >= buffer.next_part + 3 * buffer.parts_per_segment:
+            return "invalid"
+
+        counters = self._requests.get(stream_name)
+        if counters is not None and required >= buffer.next_part:
+            counters["blocked"] += 1
+
+        deadline = time.monotonic() + timeout
+        while required >= buffer.next_part:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._streams.get(stream_name) is not buffer:
+                return "timeout"
+            try:
+                await asyncio.wait_for(buffer.updated.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return "timeout"
+        return "ready"
+
+    def record_request(self, stream_name: str, filename: str) -> None:
+        """Count a viewer request for delivery statistics."""
+        counters = self._requests.get(stream_name)
+        if counters is not None:
+            counters["playlist" if filename.endswith(".m3u8") else "media"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Summarize buffered streams for health reporting."""
+        stats = {}
+        for stream_name, buffer in self._streams.items():
+            counters = self._requests.get(stream_name, {})
+            elapsed = max(time.time() - buffer.created_at, 1.0)
+            entry = {
+                "bytes": buffer.size,
+                "has_playlist": buffer.playlist is not None,
+                "updated_at": buffer.updated_at,
+                "requests": dict(counters),
+                "requests_per_second": round(sum(counters.values()) / elapsed, 2),
+            }
+            if isinstance(buffer, _LowLatencyBuffer):
+                entry.update({
+                    "mode": "ll-hls",
+                    "parts": len(buffer.parts),
+                    "pending": len(buffer.pending),
+                    "next_part": buffer.next_part,
+                })
+            else:
+                entry.update({"mode": "hls", "segments": len(buffer.segments)})
+            stats[stream_name] = entry
+        return stats
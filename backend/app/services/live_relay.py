@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import asyncio
+import struct
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from ..config import settings
+from .hls_store import starts_with_keyframe
+from .stream_manager import StreamKey, stream_manager
+
+
+class Subscriber:
+    """
+    One WebSocket viewer of a live fMP4 relay.
+
+    Fragments are queued per subscriber. When the queue is full the fragment
+    is dropped and the subscriber skips ahead to the next fragment that
+    starts with a keyframe, so a slow client falls behind in whole GOPs
+    instead of stalling everyone else.
+    """
+
+    def __init__(self, max_queue: int):
+        self.queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(maxsize=max_queue)
+        self.needs_keyframe = True
+        self.dropped = 0
+        self.consecutive_drops = 0
+        self.closed = False
+        self.close_reason: Optional[str] = None
+
+    def offer(self, fragment: bytes, independent: bool, max_drops: int) -> None:
+        """Queue a fragment without blocking the shared reader."""
+        if self.closed:
+            return
+        if self.needs_keyframe and not independent:
+            return
+        try:
+            self.queue.put_nowait(fragment)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self.consecutive_drops += 1
+            self.needs_keyframe = True
+            if self.consecutive_drops >= max_drops:
+                self.close("Client too slow")
+            return
+        self.needs_keyframe = False
+        self.consecutive_drops = 0
+
+    def close(self, reason: str) -> None:
+        """Mark the subscriber closed and wake its sender."""
+        if self.closed:
+            return
+        self.closed = True
+        self.close_reason = reason
+        # Make room for the end-of-stream marker
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class _Relay:
+    """FFmpeg process and subscribers for one stream."""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.subscribers: Set[Subscriber] = set()
+        self.init_segment: Optional[bytes] = None
+        self.mime_type: Optional[str] = None
+        self.init_ready = asyncio.Event()
+        self.stderr: Deque[str] = deque(maxlen=20)
+        self.fragments = 0
+        self.tasks: List[asyncio.Task] = []
+
+
+def codec_mime_type(init_segment: bytes) -> str:
+    """
+    Build an MSE MIME type from an fMP4 init segment.
+
+    Supports H.264 (avcC) and H.265 (hvcC) sample entries; falls back to a
+    bare ``video/mp4`` when the codec is not recognized.
+    """
+    index = init_segment.find(b"avcC")
+    if index != -1 and index + 8 <= len(init_segment):
+        profile, compatibility, level = init_segment[index + 5:index + 8]
+        return f'video/mp4; codecs="avc1.{profile:02x}{compatibility:02x}{level:02x}"'
+
+    index = init_segment.find(b"hvcC")
+    if index != -1 and index + 17 <= len(init_segment):
+        config = init_segment[index + 4:]
+        profile_space = config[1] >> 6
+        tier = "H" if config[1] & 0x20 else "L"
+        profile = config[1] & 0x1F
+        # Compatibility flags are written in reverse bit order
+        compatibility = int(f"{struct.unpack_from('>I', config, 2)[0]:032b}"[::-1], 2)
+        level = config[12]
+        space = "ABC"[profile_space - 1] if profile_space else ""
+        sample_entry = "hev1" if b"hev1" in init_segment else "hvc1"
+        return f'video/mp4; codecs="{sample_entry}.{space}{profile}.{compatibility:x}.{tier}{level}"'
+
+    return "video/mp4"
+
+
+class LiveRelay:
+    """
+    Push fragmented MP4 to WebSocket viewers from one FFmpeg per stream.
+
+    A stream's relay process is started by its first subscriber and stopped
+    when the last one leaves, and counts against the stream budgets while
+    it runs. A single reader task splits FFmpeg's stdout into the init
+    segment and moof/mdat fragments and fans them out to every subscriber's
+    queue.
+    """
+
+    def __init__(self):
+        self._relays: Dict[StreamKey, _Relay] = {}
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, key: StreamKey, rtsp_url: str) -> Subscriber:
+        """
+        Join a stream's relay, starting FFmpeg if needed.
+
+        Raises:
+            RuntimeError: If the stream budget is exhausted, FFmpeg could
+                not be started or it exited before producing an init segment
+        """
+        async with self._lock:
+            relay = self._relays.get(key)
+            if relay is None or relay.process.returncode is not None:
+                relay = await self._spawn(key, rtsp_url)
+            subscriber = Subscriber(settings.ws_queue_fragments)
+            relay.subscribers.add(subscriber)
+
+        try:
+            await asyncio.wait_for(relay.init_ready.wait(), timeout=settings.ws_start_timeout)
+        except asyncio.TimeoutError:
+            pass
+        if relay.init_segment is None:
+            await self.unsubscribe(key, subscriber)
+            error = relay.stderr[-1] if relay.stderr else "Stream did not start in time"
+            raise RuntimeError(error)
+        return subscriber
+
+    async def unsubscribe(self, key: StreamKey, subscriber: Subscriber) -> None:
+        """Leave a stream's relay, stopping FFmpeg after the last subscriber."""
+        async with self._lock:
+            relay = self._relays.get(key)
+            if relay is None:
+                return
+            relay.subscribers.discard(subscriber)
+            if not relay.subscribers:
+                del self._relays[key]
+                await self._terminate(relay)
+                await stream_manager.release_session(self._session(key))
+
+    def get_init(self, key: StreamKey) -> Optional[bytes]:
+        """Get the cached init segment (ftyp + moov) for a stream."""
+        relay = self._relays.get(key)
+        return relay.init_segment if relay else None
+
+    def get_mime_type(self, key: StreamKey) -> Optional[str]:
+        """Get the MSE MIME type for a stream's relay."""
+        relay = self._relays.get(key)
+        return relay.mime_type if relay else None
+
+    @staticmethod
+    def _session(key: StreamKey) -> str:
+        return f"relay:{key}"
+
+    async def _spawn(self, key: StreamKey, rtsp_url: str) -> _Relay:
+        # A relay respawned after FFmpeg exited keeps its admitted session
+        error = await stream_manager.acquire_session(self._session(key), key)
+        if error is not None:
+            raise RuntimeError(error)
+        print(f"[LiveRelay] Starting fMP4 relay for camera {key}")
+        cmd = [
+            "ffmpeg",
+            "-hide_banner",
+            "-nostats",
+            # Only errors are kept, for reporting why the stream failed
+            "-loglevel", "error",
+            "-fflags", "+genpts+nobuffer",
+            "-flags", "low_delay",
+            "-rtsp_transport", "tcp",
+            "-timeout", "5000000",
+            "-i", rtsp_url,
+            "-c:v", "copy",
+            "-an",
+            "-f", "mp4",
+            # Fragments start at keyframes and are flushed at least every
+            # frag_duration so viewers are not held back by long GOPs
+            "-movflags", "frag_keyframe+empty_moov+default_base_moof",
+            "-frag_duration", str(int(settings.ws_fragment_duration * 1_000_000)),
+            "pipe:1",
+        ]
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                stdin=asyncio.subprocess.DEVNULL,
+            )
+        except FileNotFoundError:
+            await stream_manager.release_session(self._session(key))
+            raise RuntimeError("FFmpeg not found. Please install FFmpeg.")
+
+        relay = _Relay(process)
+        relay.tasks = [
+            asyncio.create_task(self._read_fragments(key, relay)),
+            asyncio.create_task(self._read_stderr(relay)),
+        ]
+        self._relays[key] = relay
+        return relay
+
+    async def _read_fragments(self, key: StreamKey, relay: _Relay) -> None:
+        """Split FFmpeg's fMP4 output into boxes and fan fragments out."""
+        stdout = relay.process.stdout
+        init_boxes: List[bytes] = []
+        moof: Optional[bytes] = None
+        try:
+            while True:
+                header = await stdout.readexactly(8)
+                size, box_type = struct.unpack(">I4s", header)
+                if size == 1:
+                    extended = await stdout.readexactly(8)
+                    header += extended
+                    size = struct.unpack(">Q", extended)[0]
+                if size < len(header):
+                    break
+                box = header + await stdout.readexactly(size - len(header))
+
+                if relay.init_segment is None:
+                    init_boxes.append(box)
+                    if box_type == b"moov":
+                        relay.init_segment = b"".join(init_boxes)
+                        relay.mime_type = codec_mime_type(relay.init_segment)
+                        relay.init_ready.set()
+                elif box_type == b"moof":
+                    moof = box
+                elif box_type == b"mdat" and moof is not None:
+                    fragment = moof + box
+                    moof = None
+                    relay.fragments += 1
+                    independent = starts_with_keyframe(fragment)
+                    for subscriber in list(relay.subscribers):
+                        subscriber.offer(fragment, independent, settings.ws_max_drops)
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            relay.init_ready.set()
+            for subscriber in list(relay.subscribers):
+                subscriber.close("Stream ended")
+            if self._relays.get(key) is relay:
+                print(f"[LiveRelay] Relay for camera {key} ended")
+
+    @staticmethod
+    async def _read_stderr(relay: _Relay) -> None:
+        """Keep FFmpeg's last log lines for error reporting."""
+        async for line in relay.process.stderr:
+            decoded = line.decode("utf-8", errors="ignore").strip()
+            if decoded:
+                relay.stderr.append(decoded)
+
+    @staticmethod
+    async def _terminate(relay: _Relay) -> None:
+        process = relay.process
+        if process.returncode is None:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+        for task in relay.tasks:
+            task.cancel()
+
+    def get_status(self, key: StreamKey) -> Optional[Dict[str, Any]]:
+        """Get subscriber and drop counts for a stream's relay."""
+        relay = self._relays.get(key)
+        if relay is None:
+            return None
+        return {
+            "running": relay.process.returncode is None,
+            "subscribers": len(relay.subscribers),
+            "fragments": relay.fragments,
+            "dropped": sum(subscriber.dropped for subscriber in relay.subscribers),
+            "mime_type": relay.mime_type,
+        }
+
+    async def stop_all(self) -> None:
+        """Stop every relay and disconnect its subscribers."""
+        async with self._lock:
+            relays = dict(self._relays)
+            self._relays.clear()
+        for relay in relays.values():
+            for subscriber in list(relay.subscribers):
+                subscriber.close("Server shutting down")
+        await asyncio.gather(*(self._terminate(relay) for relay in relays.values()))
+        for key in relays:
+            await stream_manager.release_session(self._session(key))
+
+
+# Global relay instance
+live_relay = LiveRelay()
@@ -0,0 +1,370 @@
+from __future__ import annotations
+
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import settings
+
+INDEX_FILENAME = "index.bin"
+PENDING_PREFIX = "pending_"
+
+
+class RecordingIndex:
+    """
+    Time index of one camera's recording ring buffer.
+
+    Each finished segment is stored as ``{start_ms}.ts`` and described by a
+    fixed-size record (start ms, duration ms, size) appended to
+    ``index.bin``. The index is loaded once into compact arrays, so time
+    range lookups are a binary search and never touch the directory.
+    Another process (the API, when a stream worker records) follows the
+    writer by reloading the index whenever the file changes.
+    """
+
+    RECORD = struct.Struct("<QII")
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.starts = array("Q")
+        self.durations = array("I")
+        self.sizes = array("I")
+        self.total_bytes = 0
+        self._signature: Optional[Tuple[int, int]] = None
+        self._prepared = False
+        directory.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    @property
+    def _index_path(self) -> Path:
+        return self.directory / INDEX_FILENAME
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self._index_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _load(self) -> None:
+        # Taken first, so a record appended while reading triggers another reload
+        self._signature = self._file_signature()
+        try:
+            data = self._index_path.read_bytes()
+        except FileNotFoundError:
+            data = b""
+        # Ignore a torn record from a crash mid-append
+        usable = len(data) - len(data) % self.RECORD.size
+        del self.starts[:], self.durations[:], self.sizes[:]
+        for start, duration, size in self.RECORD.iter_unpack(data[:usable]):
+            self.starts.append(start)
+            self.durations.append(duration)
+            self.sizes.append(size)
+        self.total_bytes = sum(self.sizes)
+
+    def refresh(self) -> None:
+        """Reload the index if another process appended to or trimmed it."""
+        if self._file_signature() != self._signature:
+            self._load()
+
+    def prepare(self) -> None:
+        """
+        Ready the buffer for this process to record into, once.
+
+        A torn record from a crash mid-append is cut off, and segments that
+        were still being written when the last writer died have no index
+        entry and are dropped.
+        """
+        if self._prepared:
+            return
+        self._prepared = True
+        self.refresh()
+        signature = self._signature
+        if signature is not None and signature[0] % self.RECORD.size:
+            self._rewrite()
+        for pending in self.directory.glob(f"{PENDING_PREFIX}*"):
+            pending.unlink(missing_ok=True)
+
+    def adopt(self, token: int) -> List[Path]:
+        """
+        Follow a writer started by an earlier process instead of preparing
+        the buffer, which would delete the writer's segment in progress.
+
+        Returns:
+            The writer's segments that are not indexed yet, oldest first
+        """
+        self._prepared = True
+        self.refresh()
+        return sorted(self.directory.glob(f"{PENDING_PREFIX}{token}_*.ts"))
+
+    def _rewrite(self) -> None:
+        tmp = self._index_path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            for record in zip(self.starts, self.durations, self.sizes):
+                f.write(self.RECORD.pack(*record))
+        os.replace(tmp, self._index_path)
+        self._signature = self._file_signature()
+
+    def segment_path(self, start_ms: int) -> Path:
+        return self.directory / f"{start_ms}.ts"
+
+    def append(self, pending: Path, start_ms: int, duration_ms: int) -> None:
+        """Move a finished segment into the buffer and index it."""
+        if self.starts and start_ms <= self.starts[-1]:
+            # Keep the index sorted even if the wall clock stepped back
+            start_ms = self.starts[-1] + 1
+        try:
+            size = pending.stat().st_size
+            os.replace(pending, self.segment_path(start_ms))
+        except FileNotFoundError:
+            return
+        self.starts.append(start_ms)
+        self.durations.append(duration_ms)
+        self.sizes.append(size)
+        self.total_bytes += size
+        with open(self._index_path, "ab") as f:
+            f.write(self.RECORD.pack(start_ms, duration_ms, size))
+        self._signature = self._file_signature()
+
+    def enforce_retention(self, max_age_ms: int, max_bytes: int) -> int:
+        """
+        Delete the oldest segments beyond the age or size limit (0 disables one).
+
+        Returns:
+            Number of segments deleted
+        """
+        now_ms = int(time.time() * 1000)
+        drop = 0
+        remaining = self.total_bytes
+        while drop < len(self.starts):
+            too_old = max_age_ms and self.starts[drop] + self.durations[drop] < now_ms - max_age_ms
+            too_big = max_bytes and remaining > max_bytes
+            if not (too_old or too_big):
+                break
+            remaining -= self.sizes[drop]
+            drop += 1
+        if not drop:
+            return 0
+
+        for start in self.starts[:drop]:
+            self.segment_path(start).unlink(missing_ok=True)
+        del self.starts[:drop]
+        del self.durations[:drop]
+        del self.sizes[:drop]
+        self.total_bytes = remaining
+        self._rewrite()
+        return drop
+
+    def find(self, start_ms: int, end_ms: int) -> List[Tuple[int, int]]:
+        """Get (start ms, duration ms) of the segments overlapping a time range."""
+        # The segment in progress at start_ms began before it
+        first = max(bisect_right(self.starts, start_ms) - 1, 0)
+        last = bisect_left(self.starts, end_ms)
+        return [
+            (self.starts[i], self.durations[i])
+            for i in range(first, last)
+            if self.starts[i] + self.durations[i] > start_ms
+        ]
+
+    def contains(self, start_ms: int) -> bool:
+        i = bisect_left(self.starts, start_ms)
+        return i < len(self.starts) and self.starts[i] == start_ms
+
+
+class _OpenSegment:
+    def __init__(self, path: Path, opened_ms: int):
+        self.path = path
+        self.opened_ms = opened_ms
+
+
+class Recorder:
+    """
+    Continuous per-camera recording into an on-disk ring buffer.
+
+    Recording does not open another RTSP session: StreamManager adds a
+    second, stream-copied output using FFmpeg's segment muxer to the
+    camera's main stream process and reports each file the muxer opens.
+    Opening segment N+1 means segment N is complete, so it is renamed to
+    its start time, indexed, and the retention limits are applied.
+    """
+
+    def __init__(self):
+        self._enabled: set = set()
+        self._indexes: Dict[int, RecordingIndex] = {}
+        self._open: Dict[int, _OpenSegment] = {}
+        self._root = settings.recording_dir
+
+    def _index(self, camera_id: int) -> RecordingIndex:
+        index = self._indexes.get(camera_id)
+        if index is None:
+            index = RecordingIndex(self._root / f"camera_{camera_id}")
+            self._indexes[camera_id] = index
+        return index
+
+    def _find_index(self, camera_id: int) -> Optional[RecordingIndex]:
+        """Get a camera's index for reading, without creating a buffer that does not exist."""
+        index = self._indexes.get(camera_id)
+        if index is None and (self._root / f"camera_{camera_id}").is_dir():
+            index = self._index(camera_id)
+        return index
+
+    def set_enabled(self, camera_id: int, enabled: bool) -> None:
+        """Record (or stop recording) a camera from its next FFmpeg start."""
+        if enabled:
+            self._enabled.add(camera_id)
+            self._index(camera_id)
+        else:
+            self._enabled.discard(camera_id)
+
+    def is_enabled(self, camera_id: int) -> bool:
+        return camera_id in self._enabled
+
+    def output_options(self, camera_id: int, token: int) -> List[str]:
+        """FFmpeg arguments for the recording output of a camera's stream."""
+        index = self._index(camera_id)
+        # Only the process about to record repairs the buffer, never a reader
+        index.prepare()
+        pattern = index.directory / f"{PENDING_PREFIX}{token}_%06d.ts"
+        return [
+            "-map", "0:v",
+            "-c:v", "copy",
+            "-an",
+            "-f", "segment",
+            "-segment_time", str(settings.recording_segment_seconds),
+            "-segment_format", "mpegts",
+            "-reset_timestamps", "1",
+            str(pattern),
+        ]
+
+    def is_segment(self, camera_id: int, filename: str) -> bool:
+        """Whether a file FFmpeg opened belongs to a camera's recording."""
+        index = self._indexes.get(camera_id)
+        return index is not None and filename.startswith(str(index.directory / PENDING_PREFIX))
+
+    def segment_opened(self, camera_id: int, filename: str, at_ms: Optional[int] = None) -> None:
+        """Finish the previous segment of a camera and track the new one, opened now or at at_ms."""
+        open_segment = self._open.get(camera_id)
+        if open_segment is not None and open_segment.path == Path(filename):
+            # Already picked up when its FFmpeg was adopted
+            return
+        now_ms = at_ms or int(time.time() * 1000)
+        self.segment_closed(camera_id, now_ms)
+        self._open[camera_id] = _OpenSegment(Path(filename), now_ms)
+
+    def resume(self, camera_id: int, token: int) -> None:
+        """
+        Pick up the recording of an FFmpeg process adopted from an earlier server.
+
+        Segments it finished while no server was following it are indexed,
+        timed by their modification times, and the one in progress is
+        tracked as if its opening had been seen here.
+        """
+        index = self._index(camera_id)
+        pending = index.adopt(token)
+        # Segments follow each other, so the first pending one opened when
+        # the last indexed one (or the FFmpeg start) ended
+        opened_ms = token
+        if index.starts:
+            opened_ms = max(opened_ms, index.starts[-1] + index.durations[-1])
+        for path in pending:
+            self.segment_opened(camera_id, str(path), at_ms=opened_ms)
+            try:
+                # Last written as the next one opened
+                opened_ms = max(opened_ms, int(path.stat().st_mtime * 1000))
+            except OSError:
+                pass
+
+    def segment_closed(self, camera_id: int, now_ms: Optional[int] = None) -> None:
+        """Index a camera's segment in progress, e.g. when FFmpeg exits."""
+        segment = self._open.pop(camera_id, None)
+        if segment is None:
+            return
+        now_ms = now_ms or int(time.time() * 1000)
+        index = self._index(camera_id)
+        index.append(segment.path, segment.opened_ms, now_ms - segment.opened_ms)
+        index.enforce_retention(
+            int(settings.recording_retention_hours * 3600 * 1000),
+            int(settings.recording_max_gb * 1024 ** 3),
+        )
+
+    def get_segment_path(self, camera_id: int, start_ms: int) -> Optional[Path]:
+        """Get the file of an indexed segment, or None if it is not (or no longer) recorded."""
+        index = self._find_index(camera_id)
+        if index is None:
+            return None
+        index.refresh()
+        return index.segment_path(start_ms) if index.contains(start_ms) else None
+
+    def get_latest_segment_path(self, camera_id: int) -> Optional[Path]:
+        """Get the newest finished segment of a camera's recording, if any."""
+        index = self._find_index(camera_id)
+        if index is None:
+            return None
+        index.refresh()
+        if not index.starts:
+            return None
+        return index.segment_path(index.starts[-1])
+
+    def build_playlist(self, camera_id: int, start_ms: int, end_ms: int, segment_uri: str) -> Optional[str]:
+        """
+        Build a VOD playlist over a camera's recordings in a time range.
+
+        Gaps between segments (FFmpeg restarts, outages) are marked as
+        discontinuities; every segment carries its wall-clock start.
+
+        Args:
+            segment_uri: URI template with a ``{start}`` placeholder
+
+        Returns:
+            Playlist text, or None if nothing was recorded in the range
+        """
+        index = self._find_index(camera_id)
+        if index is None:
+            return None
+        index.refresh()
+        segments = index.find(start_ms, end_ms)
+        if not segments:
+            return None
+
+        target = max(duration for _, duration in segments)
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{-(-target // 1000)}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+            "#EXT-X-PLAYLIST-TYPE:VOD",
+        ]
+        previous_end = None
+        for start, duration in segments:
+            # Allow for the jitter of timing segments by their log lines
+            if previous_end is not None and start - previous_end > 1000:
+                lines.append("#EXT-X-DISCONTINUITY")
+            at = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(start // 1000))
+            lines.append(f"#EXT-X-PROGRAM-DATE-TIME:{at}.{start % 1000:03d}Z")
+            lines.append(f"#EXTINF:{duration / 1000:.3f},")
+            lines.append(segment_uri.format(start=start))
+            previous_end = start + duration
+        lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+    def get_status(self) -> Dict[int, Dict[str, Any]]:
+        """Get segment counts, sizes and the recorded span per camera."""
+        status = {}
+        for camera_id, index in self._indexes.items():
+            index.refresh()
+            status[camera_id] = {
+                "recording": camera_id in self._enabled,
+                "segments": len(index.starts),
+                "bytes": index.total_bytes,
+                "oldest_ms": index.starts[0] if index.starts else None,
+                "newest_ms": index.starts[-1] + index.durations[-1] if index.starts else None,
+            }
+        return status
+
+
+# Global recorder instance
+recorder = Recorder()
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from ..config import settings
+from .stream_registry import pid_alive
+
+# Estimated (CPU cores, bandwidth in kbps) of one FFmpeg process
+Cost = Tuple[float, int]
+
+
+class StreamAdmission:
+    """
+    Global process, CPU and bandwidth budgets for FFmpeg processes.
+
+    The owner reports its running streams and their estimated cost through
+    ``running``. Streams admitted but not launched yet hold a reservation
+    until release_reservation, and FFmpeg sessions opened outside the HLS
+    pipeline (WebSocket relays, snapshot decoders, motion detectors) are
+    counted until release_session.
+
+    When a budget is exhausted the configured policy applies: "evict" has
+    ``evict`` stop a stream to make room, "queue" waits up to
+    stream_admission_timeout for capacity, and "reject" fails straight away.
+    """
+
+    # Prefix of start errors caused by admission control (HTTP 429)
+    BUDGET_ERROR = "Stream budget exhausted"
+
+    def __init__(
+        self,
+        running: Callable[[], Dict[Hashable, Cost]],
+        evict: Callable[[Hashable], Awaitable[bool]],
+    ):
+        """
+        Args:
+            running: Cost of every running stream, by key
+            evict: Stop a stream so the given one can start; returns False
+                if no stream may be evicted
+        """
+        self._running = running
+        self._evict = evict
+        self._reserved: Dict[Hashable, Cost] = {}
+        # (pid, name) -> cost of sessions outside the HLS pipeline
+        self._sessions: Dict[Tuple[int, str], Cost] = {}
+        self._capacity_freed: Optional[asyncio.Event] = None  # Created when a start queues
+        self._queued = 0
+        self._stats = {"evicted": 0, "rejected": 0}
+
+    def is_reserved(self, key: Hashable) -> bool:
+        """Check whether a stream was admitted and is being launched."""
+        return key in self._reserved
+
+    def usage(self, exclude: Optional[Hashable] = None) -> Tuple[int, float, int]:
+        """Processes, CPU and bandwidth used by running and admitted streams and sessions."""
+        costs = {**self._running(), **self._reserved}
+        costs.pop(exclude, None)
+        values = list(costs.values()) + list(self._sessions.values())
+        return len(values), sum(cpu for cpu, _ in values), sum(bandwidth for _, bandwidth in values)
+
+    def fits(self, cost: Cost, exclude: Optional[Hashable] = None) -> bool:
+        """Check whether a process of the given cost can start without exceeding any budget."""
+        processes, cpu, bandwidth = self.usage(exclude)
+        extra_cpu, extra_bandwidth = cost
+        if settings.stream_max_processes > 0 and processes + 1 > settings.stream_max_processes:
+            return False
+        if settings.stream_cpu_budget > 0 and cpu + extra_cpu > settings.stream_cpu_budget:
+            return False
+        if settings.stream_bandwidth_budget_kbps > 0 and bandwidth + extra_bandwidth > settings.stream_bandwidth_budget_kbps:
+            return False
+        return True
+
+    def notify_capacity(self) -> None:
+        """Wake starts queued for admission after a process exits."""
+        if self._capacity_freed is not None:
+            self._capacity_freed.set()
+            self._capacity_freed = None
+
+    async def admit(self, key: Hashable, cost: Cost, reserve: bool = True) -> Optional[str]:
+        """
+        Admit a process of the given cost under the configured policy.
+
+        Args:
+            key: Stream to start, or the stream a session reads
+            cost: Estimated cost of the new process
+            reserve: Admit the stream itself, replacing its own process if
+                one is running, and reserve a slot for it until
+                release_reservation; otherwise the caller records the
+                process it starts
+
+        Returns:
+            None if admitted, otherwise an error starting with BUDGET_ERROR
+        """
+        policy = settings.stream_admission_policy
+        deadline = time.monotonic() + settings.stream_admission_timeout
+        while not self.fits(cost, exclude=key if reserve else None):
+            if policy == "evict":
+                if not await self._evict(key):
+                    self._stats["rejected"] += 1
+                    return f"{self.BUDGET_ERROR} - all running streams are pinned always-on"
+                self._stats["evicted"] += 1
+                continue
+
+            remaining = deadline - time.monotonic()
+            if policy != "queue" or remaining <= 0:
+                self._stats["rejected"] += 1
+                return f"{self.BUDGET_ERROR} - try again shortly"
+
+            if self._capacity_freed is None:
+                self._capacity_freed = asyncio.Event()
+            freed = self._capacity_freed
+            self._queued += 1
+            try:
+                await asyncio.wait_for(freed.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._queued -= 1
+
+        if reserve:
+            self._reserved[key] = cost
+        return None
+
+    def release_reservation(self, key: Hashable) -> None:
+        """Drop a stream's reservation once its process was launched or failed to."""
+        self._reserved.pop(key, None)
+
+    async def acquire_session(self, pid: int, name: str, key: Hashable, cost: Cost) -> Optional[str]:
+        """
+        Admit a session of a process, unless it already holds one under that name.
+
+        Returns:
+            None if admitted, otherwise an error starting with BUDGET_ERROR
+        """
+        if (pid, name) in self._sessions:
+            return None
+        error = await self.admit(key, cost, reserve=False)
+        if error is None:
+            self._sessions[(pid, name)] = cost
+        return error
+
+    def release_session(self, pid: int, name: str) -> None:
+        if self._sessions.pop((pid, name), None) is not None:
+            self.notify_capacity()
+
+    def drop_orphaned_sessions(self) -> int:
+        """Release sessions of processes that exited without releasing them."""
+        orphaned = [
+            session for session in self._sessions
+            if session[0] != os.getpid() and not pid_alive(session[0])
+        ]
+        for session in orphaned:
+            del self._sessions[session]
+        if orphaned:
+            self.notify_capacity()
+        return len(orphaned)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Summarize budget utilization for health reporting."""
+        processes, cpu, bandwidth = self.usage()
+        return {
+            "policy": settings.stream_admission_policy,
+            "processes": {"used": processes, "limit": settings.stream_max_processes or None},
+            "sessions": len(self._sessions),
+            "cpu": {"used": round(cpu, 2), "limit": settings.stream_cpu_budget or None},
+            "bandwidth_kbps": {"used": bandwidth, "limit": settings.stream_bandwidth_budget_kbps or None},
+            "queued": self._queued,
+            **self._stats,
+        }
@@ -0,0 +1,24 @@
+from typing import NamedTuple
+
+
+class StreamKey(NamedTuple):
+    """
+    Identifies one stream: a camera, which of its RTSP profiles it carries
+    and, for NVRs, which channel.
+
+    Dahua cameras expose an HD main stream (subtype=0) and a low-resolution
+    substream (subtype=1); NVRs expose one such pair per channel. Each
+    combination runs its own FFmpeg process.
+    """
+
+    camera_id: int
+    profile: str = "main"
+    channel: int = 1
+
+    def __str__(self) -> str:
+        parts = [str(self.camera_id)]
+        if self.channel != 1:
+            parts.append(f"ch{self.channel}")
+        if self.profile != "main":
+            parts.append(self.profile)
+        return "/".join(parts)
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import math
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from ..config import settings
+from .stream_key import StreamKey
+from .stream_registry import Lease, stream_registry
+
+
+class StreamLeases:
+    """
+    This worker's side of the cross-worker stream registry.
+
+    Tracks the streams whose lease this worker holds and the viewers other
+    workers attached to them, the streams run by another worker that
+    viewers joined through this one, and every worker's leases as of the
+    last sync, so status calls never wait on the database. All registry
+    reads and writes, including handing streams over to the next server
+    process, go through here; what to do about a lease is up to
+    StreamManager.
+    """
+
+    def __init__(self):
+        self._held: Set[StreamKey] = set()
+        self._remote_viewers: Dict[StreamKey, int] = {}
+        self._joined: Dict[StreamKey, Lease] = {}
+        self._synced: Dict[StreamKey, Lease] = {}
+        self._touched: Dict[StreamKey, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return stream_registry.enabled
+
+    @property
+    def owner(self) -> str:
+        return stream_registry.owner
+
+    def holds(self, key: StreamKey) -> bool:
+        """Check whether this worker holds a stream's lease."""
+        return key in self._held
+
+    def held(self) -> List[StreamKey]:
+        return list(self._held)
+
+    def remote_viewers(self, key: StreamKey) -> int:
+        """Viewers other workers attached to a stream this worker runs, as last synced."""
+        return self._remote_viewers.get(key, 0)
+
+    def joined(self, key: StreamKey) -> bool:
+        """Check whether viewers joined a stream another worker runs through this one."""
+        return key in self._joined
+
+    def joined_streams(self) -> Dict[StreamKey, Lease]:
+        """Streams run by another worker that viewers joined here, with their last known lease."""
+        return dict(self._joined)
+
+    def join(self, key: StreamKey, lease: Lease) -> None:
+        """Follow a stream another worker runs, or update the lease it is followed by."""
+        self._joined[key] = lease
+
+    def leave(self, key: StreamKey) -> bool:
+        """Stop following a stream another worker runs; False if it was not followed."""
+        return self._joined.pop(key, None) is not None
+
+    def synced(self, key: StreamKey) -> Optional[Lease]:
+        """A stream's lease as of the last sync, live or not."""
+        return self._synced.get(key)
+
+    def elsewhere(self, key: StreamKey) -> Optional[Lease]:
+        """Get the live lease of a stream as last synced, or None if the registry is off."""
+        if not self.enabled:
+            return None
+        lease = self._joined.get(key) or self._synced.get(key)
+        return lease if lease is not None and lease.live else None
+
+    def live_streams(self) -> Set[StreamKey]:
+        """Streams with a live lease on any worker, as last synced, and those joined here."""
+        keys = set(self._joined)
+        keys.update(key for key, lease in self._synced.items() if lease.live)
+        return keys
+
+    async def refresh(self, key: StreamKey) -> Optional[Lease]:
+        """Re-read one stream's lease ahead of the next sync."""
+        lease = await stream_registry.run(stream_registry.get, key)
+        if lease is None:
+            self._synced.pop(key, None)
+        else:
+            self._synced[key] = lease
+        return lease
+
+    async def claim(self, key: StreamKey) -> Optional[Lease]:
+        """
+        Claim a stream's lease for this worker.
+
+        Returns:
+            None if this worker runs the stream, otherwise the lease of the
+            worker that does
+        """
+        if not self.enabled:
+            return None
+        lease = await stream_registry.run(stream_registry.claim, key)
+        if lease is None:
+            self._held.add(key)
+        return lease
+
+    async def attach(self, key: StreamKey, count: int) -> Optional[Lease]:
+        """Count viewers joining (or, negative, leaving) a stream another worker runs on its lease."""
+        lease = await stream_registry.run(stream_registry.attach, key, count)
+        if lease is not None:
+            self._synced[key] = lease
+            if key in self._joined:
+                self._joined[key] = lease
+        return lease
+
+    async def viewers_elsewhere(self, key: StreamKey) -> int:
+        """Re-read how many viewers other workers hold on a stream this worker runs."""
+        if key not in self._held:
+            return 0
+        lease = await stream_registry.run(stream_registry.get, key)
+        if lease is None or lease.owner != self.owner:
+            return 0
+        return lease.remote_viewers
+
+    def publish(self, key: StreamKey, values: Dict[str, Any]) -> None:
+        """Push a held stream's state to its lease straight away."""
+        if key in self._held:
+            stream_registry.submit(stream_registry.heartbeat, {key: values})
+
+    def release(self, key: StreamKey) -> None:
+        """Give up a stream's lease once this worker stopped running it."""
+        self._remote_viewers.pop(key, None)
+        if key in self._held:
+            self._held.discard(key)
+            stream_registry.submit(stream_registry.release, key)
+
+    def touch(self, key: StreamKey) -> None:
+        """Tell the worker running a stream that it was fetched, at most once per heartbeat."""
+        now = time.monotonic()
+        if now - self._touched.get(key, -math.inf) < settings.stream_heartbeat_interval:
+            return
+        self._touched[key] = now
+        stream_registry.submit(stream_registry.touch, key)
+
+    def forget(self, key: StreamKey) -> None:
+        """Drop what was last synced about a stream."""
+        self._synced.pop(key, None)
+        self._touched.pop(key, None)
+
+    def forget_camera(self, camera_id: int) -> None:
+        for key in [key for key in self._synced if key.camera_id == camera_id]:
+            self.forget(key)
+
+    def forget_all(self) -> None:
+        self._synced.clear()
+        self._touched.clear()
+
+    async def request_stop(self, key: StreamKey) -> None:
+        """Ask whichever worker runs a stream to stop it."""
+        await stream_registry.run(stream_registry.request_stop, key)
+
+    async def request_stop_all(self) -> None:
+        """Ask every worker to stop its streams."""
+        await stream_registry.run(stream_registry.request_stop_all)
+        self.forget_all()
+
+    async def heartbeat(self, values: Dict[StreamKey, Dict[str, Any]]) -> Dict[StreamKey, Optional[Lease]]:
+        """
+        Renew the held leases with each stream's current state.
+
+        Returns:
+            The renewed lease per stream, or None for one another worker took
+        """
+        leases = await stream_registry.run(stream_registry.heartbeat, values)
+        for key, lease in leases.items():
+            if lease is not None:
+                self._remote_viewers[key] = lease.remote_viewers
+        return leases
+
+    async def sync(self) -> None:
+        """Re-read every worker's leases."""
+        leases = await stream_registry.run(stream_registry.get_all)
+        self._synced = {StreamKey(*key): lease for key, lease in leases.items()}
+        for key in list(self._touched):
+            if self.elsewhere(key) is None:
+                del self._touched[key]
+
+    async def hand_over(self, key: StreamKey, values: Dict[str, Any]) -> bool:
+        """Leave a held stream's running process to the next server process; False if it cannot be."""
+        if key not in self._held or not await stream_registry.run(stream_registry.hand_over, key, values):
+            return False
+        self._held.discard(key)
+        return True
+
+    async def handovers(self) -> List[Tuple[StreamKey, Lease]]:
+        """Streams an earlier server process handed over, waiting to be adopted."""
+        return [
+            (StreamKey(*key), lease)
+            for key, lease in await stream_registry.run(stream_registry.get_handovers)
+        ]
+
+    async def adopt(self, key: StreamKey, lease: Lease) -> bool:
+        """Take a handed-over stream's lease; False if another worker adopted it first."""
+        if not await stream_registry.run(stream_registry.adopt, key, lease):
+            return False
+        self._held.add(key)
+        return True
+
+    async def end_handover(self, key: StreamKey, lease: Lease) -> None:
+        """Stop a handed-over process that will not be adopted and drop its lease."""
+        await stream_registry.run(stream_registry.end_handover, key, lease)
+
+    async def get_status(self) -> Optional[Dict[str, Any]]:
+        """Summarize the stream leases of all workers for health reporting, or None if the registry is off."""
+        if not self.enabled:
+            return None
+        return await stream_registry.run(stream_registry.get_status)
@@ -1,11 +1,52 @@
 from __future__ import annotations
-import subprocess
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import shutil
 import time
-import threading
+import uuid
+from collections import deque
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
 
 from ..config import settings
+from .detached_process import DetachedProcess, runs_command
+from .hls_store import INIT_SEGMENT_NAME, HLSMemoryStore
+from .recorder import recorder
+from .stream_admission import StreamAdmission
+from .stream_key import StreamKey
+from .stream_leases import StreamLeases
+from .stream_metrics import StreamMetrics
+from .stream_registry import Lease
+from .stream_rpc import StreamWorkerClient, StreamWorkerError
+
+
+def restart_backoff(failures: int, reason: str) -> Tuple[float, Optional[str]]:
+    """
+    Delay before reconnecting to a camera after its FFmpeg failed.
+
+    Args:
+        failures: Consecutive failures, including this one
+        reason: FFmpeg's last log lines
+
+    Returns:
+        Tuple of (delay in seconds, why the restart circuit opened or None)
+    """
+    lowered = reason.lower()
+    auth_failure = "401" in lowered or "unauthorized" in lowered
+    if auth_failure or failures >= settings.stream_restart_max_failures:
+        # Stop hammering the camera so repeated logins cannot lock the account
+        why = "authentication failure" if auth_failure else f"{failures} consecutive failures"
+        return settings.stream_circuit_cooldown, why
+
+    # Exponential backoff with jitter so cameras don't reconnect in lockstep
+    ceiling = min(settings.stream_restart_max_delay,
+                  settings.stream_restart_base_delay * (2 ** (failures - 1)))
+    return random.uniform(ceiling / 2, ceiling), None
 
 
 class StreamManager:
@@ -16,84 +57,1086 @@ class StreamManager:
     to HLS segments that can be played in web browsers.
     """
 
+    # Seconds to wait for the first playlist before letting HLS.js retry.
+    # Dahua cameras can be slow to start streaming.
+    READY_TIMEOUT = 30.0
+
+    # Viewer session that keeps pinned (always-on) streams attached
+    PINNED_VIEWER = "pinned"
+
+    # Profile used by dashboard grid tiles, and so pre-warmed for pinned cameras
+    GRID_PROFILE = "sub"
+
+    # Viewer session holding lazily started ABR renditions; they are left
+    # to the idle reaper once hls.js stops fetching them
+    ABR_VIEWER = "abr"
+
+    # Transcoded low-bitrate ABR rendition
+    LOW_PROFILE = "low"
+
+    # Prefix of start errors caused by admission control (HTTP 429)
+    BUDGET_ERROR = StreamAdmission.BUDGET_ERROR
+
+    # FFmpeg log lines kept per stream for error reports
+    STDERR_TAIL_LINES = 50
+
+    # Completed segments remembered per stream for event clips
+    SEGMENT_HISTORY = 64
+
+    # Named pipe in a stream's directory that a handover-capable FFmpeg
+    # logs to (see DetachedProcess)
+    HANDOVER_PIPE = "ffmpeg.pipe"
+
+    # Seconds without a playlist update after which a handed-over FFmpeg
+    # is considered stalled and is not adopted
+    HANDOVER_MAX_STALL = 10.0
+
+    _FFMPEG_ERROR = re.compile(rb"error|failed|401|unauthorized|connection refused", re.IGNORECASE)
+    _OPENING = re.compile(rb"Opening '(.+)' for writing")
+
+    _STREAM_NAME = re.compile(r"^camera_(\d+)(?:_ch(\d+))?(?:_([a-z]+))?$")
+
     def __init__(self):
-        self._processes: Dict[int, subprocess.Popen] = {}
-        self._errors: Dict[int, str] = {}
-        self._playlist_tokens: Dict[int, int] = {}
+        self._processes: Dict[StreamKey, asyncio.subprocess.Process] = {}
+        self._monitors: Dict[StreamKey, asyncio.Task] = {}
+        self._ready_events: Dict[StreamKey, asyncio.Event] = {}
+        self._started_at: Dict[StreamKey, float] = {}
+        # Rolling -progress telemetry, kept after an exit until the next start
+        self._metrics: Dict[StreamKey, StreamMetrics] = {}
+        self._errors: Dict[StreamKey, str] = {}
+        self._playlist_tokens: Dict[StreamKey, int] = {}
+        self._rtsp_urls: Dict[StreamKey, str] = {}
+        self._viewers: Dict[StreamKey, List[str]] = {}
+        self._start_locks: Dict[StreamKey, asyncio.Lock] = {}
+        self._last_access: Dict[StreamKey, float] = {}
+        self._reaper_log: Deque[Dict[str, Any]] = deque(maxlen=50)
+        self._housekeeping_task: Optional[asyncio.Task] = None
+        # Supervisor state for automatic restarts
+        self._supervised: set = set()
+        self._restart_tasks: Dict[StreamKey, asyncio.Task] = {}
+        self._restart_counts: Dict[StreamKey, int] = {}
+        self._consecutive_failures: Dict[StreamKey, int] = {}
+        self._ready_at: Dict[StreamKey, float] = {}
+        # Seconds from spawning FFmpeg to the first playable segment
+        self._start_latency: Dict[StreamKey, float] = {}
+        self._recent_start_latencies: Deque[float] = deque(maxlen=100)
+        self._circuit_open_until: Dict[StreamKey, float] = {}
+        self._last_exit: Dict[StreamKey, Dict[str, Any]] = {}
+        self._pinned: set = set()
         self._output_dir = settings.hls_output_dir
+        # RAM-backed (tmpfs) segment storage
+        self._ram_root = self._resolve_ram_root()
+        self._stream_roots: Dict[StreamKey, Path] = {}
+        self._disk_only: set = set()
+        # In-process segment store fed by FFmpeg over HTTP PUT
+        self._memory_store = HLSMemoryStore(
+            max_segments=settings.hls_memory_segments,
+            max_bytes=settings.hls_ram_budget_mb * 1024 * 1024,
+        )
+        self._memory_streams: set = set()
+        # Streams whose FFmpeg also writes the camera's recording
+        self._recording: set = set()
+        # Recently completed HLS segments (start, duration, filename) for
+        # event clips, and the segment each stream is writing
+        self._segment_history: Dict[StreamKey, Deque[Tuple[float, float, str]]] = {}
+        self._open_segments: Dict[StreamKey, Tuple[str, float]] = {}
+        # Global process, CPU and bandwidth budgets
+        self._admission = StreamAdmission(
+            running=lambda: {key: self._estimate_cost(key) for key in self.get_active_streams()},
+            evict=self._evict_for,
+        )
+        # ABR renditions per (camera, channel): profile -> RTSP URL
+        self._abr_sources: Dict[Tuple[int, int], Dict[str, str]] = {}
+        # Cross-worker stream registry
+        self._leases = StreamLeases()
+        self._registry_task: Optional[asyncio.Task] = None
+        # Standalone stream worker running FFmpeg in place of this process
+        self._worker: Optional[StreamWorkerClient] = None
+        if settings.stream_worker_socket is not None:
+            self._worker = StreamWorkerClient(settings.stream_worker_socket)
 
-    def _get_stream_path(self, camera_id: int) -> Path:
+    def run_locally(self) -> None:
+        """Run FFmpeg in this process even if a stream worker is configured; the worker itself does."""
+        self._worker = None
+
+    async def _forward(self, method: str, default: Any = None, timeout: float = 10.0, **params: Any) -> Any:
+        """Call the stream worker, logging and returning a default if it is unavailable."""
+        try:
+            return await self._worker.call(method, timeout=timeout, **params)
+        except StreamWorkerError as e:
+            print(f"[StreamManager] {method} failed: {e}")
+            return default
+
+    async def get_worker_status(self) -> Optional[Dict[str, Any]]:
+        """Get the stream worker's own status, or None if streams run in this process."""
+        if self._worker is None:
+            return None
+        try:
+            return await self._worker.call("status")
+        except StreamWorkerError as e:
+            return {"error": str(e)}
+
+    @staticmethod
+    def _stream_name(key: StreamKey) -> str:
+        """Get the name a stream is published under in /streams."""
+        name = f"camera_{key.camera_id}"
+        if key.channel != 1:
+            name += f"_ch{key.channel}"
+        if key.profile != "main":
+            name += f"_{key.profile}"
+        return name
+
+    @classmethod
+    def parse_stream_name(cls, stream_name: str) -> Optional[StreamKey]:
+        """Get the stream key for a published stream name, if it is valid."""
+        match = cls._STREAM_NAME.match(stream_name)
+        if not match:
+            return None
+        channel = int(match.group(2)) if match.group(2) else 1
+        if channel < 1:
+            return None
+        return StreamKey(int(match.group(1)), match.group(3) or "main", channel)
+
+    def _get_stream_path(self, key: StreamKey) -> Path:
         """Get the output directory for a camera's HLS stream."""
-        path = self._output_dir / f"camera_{camera_id}"
+        path = self._stream_roots.get(key, self._output_dir) / self._stream_name(key)
         path.mkdir(parents=True, exist_ok=True)
         return path
 
-    def get_playlist_url(self, camera_id: int) -> str:
+    @staticmethod
+    def _resolve_ram_root() -> Optional[Path]:
+        """
+        Find a tmpfs directory for HLS segments, or None to use disk only.
+
+        Raises:
+            RuntimeError: If hls_storage is "ram" and no tmpfs is usable
+        """
+        if settings.hls_storage in ("disk", "memory"):
+            return None
+        required = settings.hls_storage == "ram"
+
+        candidate = settings.hls_ram_dir
+        if candidate is None and Path("/dev/shm").is_dir():
+            candidate = Path("/dev/shm") / "jarvis-hls"
+        if candidate is None:
+            if required:
+                raise RuntimeError("HLS_STORAGE=ram but no tmpfs is available (set HLS_RAM_DIR)")
+            print("[StreamManager] No tmpfs available for HLS segments, using disk")
+            return None
+
+        try:
+            candidate.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            if required:
+                raise RuntimeError(f"HLS_STORAGE=ram but {candidate} is unusable: {e}") from e
+            print(f"[StreamManager] Cannot use {candidate} for HLS segments ({e}), using disk")
+            return None
+        return candidate
+
+    @property
+    def storage_roots(self) -> List[Path]:
+        """Directories HLS output may be written to, RAM first."""
+        return [root for root in (self._ram_root, self._output_dir) if root is not None]
+
+    @staticmethod
+    def _dir_size(path: Path) -> int:
+        """Total size in bytes of the files in a stream directory."""
+        total = 0
+        for f in path.glob("*"):
+            try:
+                total += f.stat().st_size
+            except OSError:
+                pass
+        return total
+
+    def _select_storage_root(self, key: StreamKey) -> Path:
+        """
+        Choose RAM or disk storage for a stream that is about to start.
+
+        RAM is used while the tmpfs can still hold a full per-camera budget on
+        top of the headroom reserved for the other RAM-backed streams.
+        """
+        if self._ram_root is None or key in self._disk_only:
+            return self._output_dir
+
+        budget = settings.hls_ram_budget_mb * 1024 * 1024
+        reserved = 0
+        for other, root in self._stream_roots.items():
+            if root == self._ram_root and other != key:
+                reserved += max(0, budget - self._dir_size(root / self._stream_name(other)))
+
+        try:
+            free = shutil.disk_usage(self._ram_root).free
+        except OSError:
+            free = 0
+        if free - reserved < budget:
+            print(f"[StreamManager] Not enough memory for camera {key} segments "
+                  f"({free // (1024 * 1024)} MB free), falling back to disk")
+            return self._output_dir
+        return self._ram_root
+
+    def get_storage(self, key: StreamKey) -> Optional[str]:
+        """Get where a running stream keeps its segments ("memory", "ram" or "disk")."""
+        if key in self._memory_streams:
+            return "memory"
+        root = self._stream_roots.get(key)
+        if root is None:
+            return None
+        return "ram" if root == self._ram_root else "disk"
+
+    def get_storage_status(self) -> Dict[str, Any]:
+        """Summarize HLS segment storage for health reporting."""
+        ram_free_mb = None
+        if self._ram_root is not None:
+            try:
+                ram_free_mb = shutil.disk_usage(self._ram_root).free // (1024 * 1024)
+            except OSError:
+                pass
+        return {
+            "mode": settings.hls_storage,
+            "ram_dir": str(self._ram_root) if self._ram_root else None,
+            "ram_free_mb": ram_free_mb,
+            "ram_budget_mb": settings.hls_ram_budget_mb,
+            "streams": {
+                str(key): self.get_storage(key)
+                for key in set(self._stream_roots) | self._memory_streams
+            },
+            "memory": self._memory_store.get_stats(),
+        }
+
+    def ingest(self, key: StreamKey, token: str, filename: str, data: bytes) -> bool:
+        """
+        Accept a playlist or segment uploaded by a memory-backed FFmpeg process.
+
+        The first playlist upload follows the first complete segment, so it
+        marks the stream as ready.
+
+        Returns:
+            False if the stream is not memory-backed or the token is wrong
+        """
+        if key not in self._memory_streams:
+            return False
+        if not self._memory_store.put(self._stream_name(key), token, filename, data):
+            return False
+
+        ready_event = self._ready_events.get(key)
+        if filename.endswith(".m3u8") and ready_event is not None and not ready_event.is_set():
+            self._mark_ready(key)
+        if filename.endswith(".ts"):
+            # Uploads finish when FFmpeg closes the segment
+            self._segment_completed(key, filename, time.time())
+        return True
+
+    def _segment_opened(self, key: StreamKey, filename: str) -> None:
+        """Note a new HLS segment on disk, completing the previous one."""
+        now = time.time()
+        previous = self._open_segments.get(key)
+        if previous is not None and previous[0] == filename:
+            # Already found on disk when the stream was adopted
+            return
+        if previous is not None:
+            self._segment_completed(key, previous[0], now, started=previous[1])
+        self._open_segments[key] = (filename, now)
+
+    def _segment_completed(self, key: StreamKey, filename: str, ended: float, started: Optional[float] = None) -> None:
+        history = self._segment_history.setdefault(key, deque(maxlen=self.SEGMENT_HISTORY))
+        if started is None:
+            started = history[-1][0] + history[-1][1] if history else ended - 1.0
+        history.append((started, ended - started, filename))
+
+    def get_recent_segments(self, key: StreamKey) -> List[Tuple[float, float, str]]:
+        """Get a stream's recently completed segments as (start time, duration, filename)."""
+        return list(self._segment_history.get(key, ()))
+
+    def read_segment(self, key: StreamKey, filename: str) -> Optional[bytes]:
+        """Get the bytes of a stream's HLS segment, or None once it is gone."""
+        if key in self._memory_streams:
+            return self._memory_store.get(self._stream_name(key), filename)
+        if key not in self._stream_roots:
+            return None
+        try:
+            return (self._get_stream_path(key) / filename).read_bytes()
+        except OSError:
+            return None
+
+    def read_memory_file(self, stream_name: str, filename: str) -> Optional[bytes]:
+        """Get a buffered playlist or segment for a memory-backed stream."""
+        return self._memory_store.get(stream_name, filename)
+
+    def is_memory_stream(self, stream_name: str) -> bool:
+        """Check if a published stream is served from memory."""
+        return self._memory_store.has_stream(stream_name)
+
+    def is_low_latency_stream(self, stream_name: str) -> bool:
+        """Check if a published stream is served as LL-HLS."""
+        return self._memory_store.is_low_latency(stream_name)
+
+    async def wait_for_memory_file(
+        self,
+        stream_name: str,
+        filename: str,
+        msn: Optional[int] = None,
+        part: Optional[int] = None,
+    ) -> str:
+        """
+        Hold an LL-HLS blocking request until its media is published.
+
+        Returns:
+            "ready", "timeout" or "invalid" (see HLSMemoryStore.wait_until_available)
+        """
+        return await self._memory_store.wait_until_available(
+            stream_name, filename, msn, part, timeout=settings.hls_blocking_timeout
+        )
+
+    def record_request(self, stream_name: str, filename: str) -> None:
+        """Count a viewer request against a memory-backed stream."""
+        self._memory_store.record_request(stream_name, filename)
+
+    def get_delivery_stats(self, key: StreamKey) -> Optional[Dict[str, Any]]:
+        """Get mode and viewer request rates for a memory-backed stream."""
+        return self._memory_store.get_stats().get(self._stream_name(key))
+
+    def _release_output(self, key: StreamKey) -> None:
+        """Remove a stream's HLS output, wherever it is stored."""
+        self._recording.discard(key)
+        self._segment_history.pop(key, None)
+        self._open_segments.pop(key, None)
+        if key in self._memory_streams:
+            self._memory_streams.discard(key)
+            self._memory_store.close(self._stream_name(key))
+        if key in self._stream_roots:
+            self._cleanup_stream_files(key)
+            del self._stream_roots[key]
+
+    def get_playlist_url(self, key: StreamKey) -> str:
         """Get the URL for a camera's HLS playlist."""
-        token = self._playlist_tokens.get(camera_id)
+        token = self._playlist_tokens.get(key)
         if token:
-            return f"/streams/camera_{camera_id}/stream.m3u8?v={token}"
-        return f"/streams/camera_{camera_id}/stream.m3u8"
+            return f"/streams/{self._stream_name(key)}/stream.m3u8?v={token}"
+        lease = self._lease_elsewhere(key)
+        if lease is not None and lease.stream_url:
+            return lease.stream_url
+        return f"/streams/{self._stream_name(key)}/stream.m3u8"
 
-    def get_stream_error(self, camera_id: int) -> Optional[str]:
+    def get_stream_error(self, key: StreamKey) -> Optional[str]:
         """Get the last error for a camera stream."""
-        return self._errors.get(camera_id)
+        if key in self._errors:
+            return self._errors[key]
+        lease = self._lease_elsewhere(key)
+        return lease.error if lease is not None else None
 
-    def _monitor_ffmpeg(self, camera_id: int, process: subprocess.Popen):
-        """Monitor FFmpeg process and capture errors."""
-        stderr_output = []
+    def get_stream_state(self, key: StreamKey) -> str:
+        """
+        Get the lifecycle state of a camera stream.
+
+        Returns:
+            One of "starting", "ready", "restarting", "error" or "stopped"
+        """
+        if self.is_streaming(key):
+            event = self._ready_events.get(key)
+            return "ready" if event and event.is_set() else "starting"
+        if key in self._restart_tasks:
+            return "restarting"
+        if key in self._errors:
+            return "error"
+        lease = self._lease_elsewhere(key)
+        if lease is not None:
+            return lease.state
+        return "stopped"
+
+    def _runs_here(self, key: StreamKey) -> bool:
+        return self._leases.holds(key) or key in self._processes or key in self._restart_tasks
+
+    def _lease_elsewhere(self, key: StreamKey) -> Optional[Lease]:
+        """Get the live lease of a stream another worker runs, as last synced."""
+        return None if self._runs_here(key) else self._leases.elsewhere(key)
+
+    @staticmethod
+    async def _read_lines(stream: asyncio.StreamReader) -> AsyncIterator[bytes]:
+        """Yield lines from an FFmpeg pipe, splitting on carriage returns and newlines."""
+        buffer = b""
+        while True:
+            chunk = await stream.read(4096)
+            if not chunk:
+                break
+            buffer += chunk.replace(b"\r", b"\n")
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line:
+                    yield line
+        if buffer:
+            yield buffer
+
+    async def _monitor_ffmpeg(
+        self,
+        key: StreamKey,
+        process: asyncio.subprocess.Process,
+        playlist_name: Optional[str],
+        recording: bool = False,
+        segment_prefix: Optional[str] = None,
+    ):
+        """
+        Monitor FFmpeg process, capture errors and signal stream readiness.
+
+        The HLS muxer logs "Opening '...' for writing" for every file it
+        creates. The playlist is written once the first segment is complete,
+        and the next segment is only opened after the playlist has been
+        flushed, so that second line marks the stream as playable. Memory-
+        backed streams pass no playlist name; their readiness comes from the
+        ingest route instead. The same lines from the segment muxer of a
+        recording output are passed on to the recorder, and HLS segment
+        opens (segment_prefix) time the segments kept for event clips.
+        """
+        stderr_tail: Deque[bytes] = deque(maxlen=self.STDERR_TAIL_LINES)
+        saw_playlist = False
+        ready_event = self._ready_events.get(key)
+        metrics = self._metrics.get(key)
         try:
-            for line in process.stderr:
-                decoded = line.decode('utf-8', errors='ignore').strip()
-                stderr_output.append(decoded)
-                # Keep only last 50 lines
-                if len(stderr_output) > 50:
-                    stderr_output.pop(0)
-                # Log important errors
-                if any(x in decoded.lower() for x in ['error', 'failed', '401', 'unauthorized', 'connection refused']):
-                    print(f"[FFmpeg Camera {camera_id}] {decoded}")
+            async for line in self._read_lines(process.stderr):
+                # Progress reports are interleaved with the log on stderr
+                if metrics is not None and metrics.feed(line):
+                    continue
+                stderr_tail.append(line)
+                opening = self._OPENING.search(line) if b"Opening '" in line else None
+                if opening is not None:
+                    filename = opening.group(1).decode("utf-8", errors="ignore")
+                    if recording and recorder.is_segment(key.camera_id, filename):
+                        recorder.segment_opened(key.camera_id, filename)
+                        continue
+                    if segment_prefix and Path(filename).name.startswith(segment_prefix):
+                        # temp_file has FFmpeg write segments as name.tmp first
+                        self._segment_opened(key, Path(filename).name.removesuffix(".tmp"))
+                # Detect readiness from the muxer's file events
+                if playlist_name and ready_event and not ready_event.is_set() and b"Opening '" in line:
+                    if playlist_name.encode() in line:
+                        saw_playlist = True
+                    elif saw_playlist:
+                        self._mark_ready(key)
+                # Log important errors; lines are only decoded when printed
+                if self._FFMPEG_ERROR.search(line):
+                    print(f"[FFmpeg Camera {key}] {line.decode('utf-8', errors='ignore').strip()}")
 
             # Process ended
-            return_code = process.wait()
-            if return_code != 0:
-                error_msg = '\n'.join(stderr_output[-10:])  # Last 10 lines
-                self._errors[camera_id] = f"FFmpeg exited with code {return_code}: {error_msg}"
-                print(f"[FFmpeg Camera {camera_id}] Stream ended with error: {error_msg[:500]}")
+            return_code = await process.wait()
+            if recording:
+                recorder.segment_closed(key.camera_id)
+            if self._processes.get(key) is process:
+                error_msg = '\n'.join(
+                    line.decode('utf-8', errors='ignore').strip() for line in list(stderr_tail)[-10:]
+                )
+                if return_code != 0:
+                    self._errors[key] = f"FFmpeg exited with code {return_code}: {error_msg}"
+                    print(f"[FFmpeg Camera {key}] Stream ended with error: {error_msg[:500]}")
+                self._handle_unexpected_exit(key, return_code, error_msg or "FFmpeg exited")
         except Exception as e:
-            self._errors[camera_id] = str(e)
+            self._errors[key] = str(e)
+
+    def _mark_ready(self, key: StreamKey) -> None:
+        """Flag a stream as playable and put it under supervision."""
+        ready_event = self._ready_events.get(key)
+        if ready_event is not None:
+            ready_event.set()
+            # Workers waiting for this stream poll its lease
+            self._publish(key)
+        # A stream that came up once is worth keeping alive
+        self._supervised.add(key)
+        self._ready_at[key] = now = time.monotonic()
+        started_at = self._started_at.get(key)
+        if started_at is not None:
+            self._start_latency[key] = now - started_at
+            self._recent_start_latencies.append(now - started_at)
+        self._circuit_open_until.pop(key, None)
+
+    def _handle_unexpected_exit(self, key: StreamKey, return_code: Optional[int], reason: str) -> None:
+        """
+        Drop a dead FFmpeg process and schedule a supervised restart.
+
+        Streams that never became playable are not restarted; the caller of
+        start_stream reports their error instead.
+        """
+        self._processes.pop(key, None)
+        self._ready_events.pop(key, None)
+        self._monitors.pop(key, None)
+        self._started_at.pop(key, None)
+        self._admission.notify_capacity()
+        self._last_exit[key] = {
+            "code": return_code,
+            "reason": reason[-500:],
+            "at": datetime.now(timezone.utc).isoformat(),
+        }
+
+        if key not in self._supervised and key not in self._pinned:
+            self._viewers.pop(key, None)
+            self._rtsp_urls.pop(key, None)
+            self._last_access.pop(key, None)
+            self._playlist_tokens.pop(key, None)
+            self._release_output(key)
+            self._leases.release(key)
+            return
+
+        # Only a stream that stayed up for a while clears the failure streak
+        ready_at = self._ready_at.pop(key, None)
+        if ready_at is not None and time.monotonic() - ready_at >= settings.stream_stable_after:
+            self._consecutive_failures.pop(key, None)
+        failures = self._consecutive_failures.get(key, 0) + 1
+        self._consecutive_failures[key] = failures
+        delay, circuit_reason = restart_backoff(failures, reason)
+
+        if circuit_reason is not None:
+            self._circuit_open_until[key] = time.monotonic() + delay
+            print(f"[StreamManager] Restart circuit open for camera {key} after {circuit_reason}; "
+                  f"next attempt in {delay:.0f}s")
+        else:
+            print(f"[StreamManager] Restarting camera {key} in {delay:.1f}s (failure {failures})")
 
-    def _cleanup_stream_files(self, camera_id: int) -> None:
+        self._restart_tasks[key] = asyncio.create_task(self._restart_after(key, delay))
+        self._publish(key)
+
+    async def _restart_after(self, key: StreamKey, delay: float) -> None:
+        """Restart a dropped stream once its backoff delay has elapsed."""
+        await asyncio.sleep(delay)
+        self._restart_tasks.pop(key, None)
+        rtsp_url = self._rtsp_urls.get(key)
+        if rtsp_url is None:
+            return
+
+        self._restart_counts[key] = self._restart_counts.get(key, 0) + 1
+        print(f"[StreamManager] Supervisor restarting camera {key} "
+              f"(restart #{self._restart_counts[key]})")
+        # Restarts should not count as viewer activity for the idle reaper
+        last_access = self._last_access.get(key)
+        async with self._start_locks.setdefault(key, asyncio.Lock()):
+            success, error = await self._spawn_stream(key, rtsp_url)
+        if last_access is not None:
+            self._last_access[key] = last_access
+        if not success:
+            self._handle_unexpected_exit(key, None, error or "FFmpeg failed to start")
+
+    def _circuit_retry_in(self, key: StreamKey) -> Optional[float]:
+        """Seconds until an open restart circuit allows another attempt, if open."""
+        open_until = self._circuit_open_until.get(key)
+        if open_until is None:
+            return None
+        remaining = open_until - time.monotonic()
+        return remaining if remaining > 0 else None
+
+    def get_supervisor_status(self, key: StreamKey) -> Dict[str, Any]:
+        """Get restart counters and the last exit reason for a camera stream."""
+        retry_in = self._circuit_retry_in(key)
+        return {
+            "supervised": key in self._supervised,
+            "restart_count": self._restart_counts.get(key, 0),
+            "consecutive_failures": self._consecutive_failures.get(key, 0),
+            "restart_pending": key in self._restart_tasks,
+            "circuit_open": retry_in is not None,
+            "circuit_retry_in": round(retry_in, 1) if retry_in is not None else None,
+            "last_exit": self._last_exit.get(key),
+        }
+
+    @staticmethod
+    def _records(key: StreamKey) -> bool:
+        """Whether a stream should carry its camera's recording output."""
+        return key.profile == "main" and key.channel == 1 and recorder.is_enabled(key.camera_id)
+
+    def get_start_latency(self, key: StreamKey) -> Optional[float]:
+        """Get how long a stream's last start took to become playable, in milliseconds."""
+        latency = self._start_latency.get(key)
+        return round(latency * 1000) if latency is not None else None
+
+    def get_startup_status(self) -> Dict[str, Any]:
+        """Summarize recent start latencies for health reporting."""
+        latencies = sorted(self._recent_start_latencies)
+        if not latencies:
+            return {"starts": 0}
+        return {
+            "starts": len(latencies),
+            "median_ms": round(latencies[len(latencies) // 2] * 1000),
+            "max_ms": round(latencies[-1] * 1000),
+            "last_ms": {str(key): round(latency * 1000) for key, latency in sorted(self._start_latency.items())},
+        }
+
+    def get_metrics(self, key: StreamKey, history: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Get a stream's FFmpeg telemetry over the rolling window.
+
+        Args:
+            key: Camera and profile of the stream
+            history: Include the raw per-report series
+
+        Returns:
+            Summary dict, or None if the stream has not been started
+        """
+        metrics = self._metrics.get(key)
+        if metrics is None:
+            return None
+        summary = metrics.summary(settings.stream_metrics_min_speed, settings.stream_metrics_stall_seconds)
+        summary["running"] = self.is_streaming(key)
+        if history:
+            summary["history"] = metrics.history()
+        return summary
+
+    def get_metrics_streams(self) -> List[StreamKey]:
+        """Get streams with telemetry, including ones that have exited."""
+        return sorted(self._metrics)
+
+    def get_supervised_streams(self) -> List[StreamKey]:
+        """Get streams with supervisor history."""
+        return sorted(set(self._supervised) | set(self._restart_counts) | set(self._last_exit))
+
+    def _cleanup_stream_files(self, key: StreamKey) -> None:
         """Delete all existing HLS files for a camera."""
-        output_path = self._get_stream_path(camera_id)
+        output_path = self._get_stream_path(key)
         for f in output_path.glob("*"):
             try:
                 f.unlink()
             except Exception:
                 pass
 
-    def start_stream(self, camera_id: int, rtsp_url: str) -> Tuple[bool, Optional[str]]:
+    async def start_stream(
+        self,
+        key: StreamKey,
+        rtsp_url: str,
+        wait: bool = True,
+        viewer_id: Optional[str] = None,
+    ) -> Tuple[bool, Optional[str]]:
         """
-        Start streaming from a camera.
+        Start streaming from a camera, or join a stream that is already running.
+
+        Viewers attach to a running FFmpeg process instead of restarting it,
+        so a second tablet opening the same camera does not open another
+        RTSP session or interrupt the first viewer.
 
         Args:
-            camera_id: Database ID of the camera
+            key: Camera and profile of the stream
             rtsp_url: Full RTSP URL including credentials
+            wait: Wait until the first segment is playable. When False the
+                stream is left in the "starting" state for clients to poll.
+            viewer_id: Viewer session to attach; an anonymous one is
+                registered when omitted
 
         Returns:
             Tuple of (success, error_message)
         """
-        if camera_id in self._processes:
-            self.stop_stream(camera_id)
+        if self._worker is not None:
+            return await self._start_on_worker("start_stream", key, rtsp_url, wait, viewer_id=viewer_id)
+
+        lock = self._start_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Turning recording on or off needs a new FFmpeg output
+            same_source = (
+                self._rtsp_urls.get(key) == rtsp_url
+                and (key in self._recording) == self._records(key)
+            )
+            if same_source and key in self._restart_tasks:
+                # Join the pending supervised restart rather than bypassing its backoff
+                await self._attach_viewer(key, viewer_id)
+                retry_in = self._circuit_retry_in(key)
+                if retry_in is not None:
+                    return False, f"Camera connection suspended after repeated failures - retrying in {retry_in:.0f}s"
+                return True, None
+            if self.is_streaming(key) and same_source:
+                print(f"[StreamManager] Attaching viewer to running stream for camera {key}")
+            else:
+                lease = None if self._leases.holds(key) else await self._leases.claim(key)
+                if lease is not None:
+                    # Another worker runs this stream; join it there
+                    print(f"[StreamManager] Joining stream for camera {key} run by worker {lease.owner}")
+                    self._leases.join(key, lease)
+                    # Kept to take the stream over if that worker dies
+                    self._rtsp_urls[key] = rtsp_url
+                else:
+                    self._leases.leave(key)
+                    success, error = await self._spawn_stream(key, rtsp_url)
+                    if not success:
+                        if not (self.is_streaming(key) or key in self._restart_tasks):
+                            self._leases.release(key)
+                        return False, error
+            await self._attach_viewer(key, viewer_id)
+
+        if not wait:
+            return True, None
+        return await self.wait_until_ready(key)
+
+    async def _start_on_worker(self, method: str, key: StreamKey, rtsp_url: str, wait: bool, **params: Any) -> Tuple[bool, Optional[str]]:
+        """Have the stream worker start or pin a stream, then wait on its lease here."""
+        try:
+            # Starts may queue for admission on the worker
+            success, error = await self._worker.call(
+                method, timeout=settings.stream_admission_timeout + 10,
+                key=list(key), rtsp_url=rtsp_url, wait=False, **params,
+            )
+        except StreamWorkerError as e:
+            return False, str(e)
+        if not success:
+            return success, error
+        if not wait:
+            # So status calls see the stream starting straight away
+            await self._leases.refresh(key)
+            return success, error
+        return await self._wait_for_remote(key)
+
+    async def _attach_viewer(self, key: StreamKey, viewer_id: Optional[str]) -> None:
+        """Register a viewer session for a running stream."""
+        viewers = self._viewers.setdefault(key, [])
+        viewer_id = viewer_id or f"anon-{uuid.uuid4().hex}"
+        if viewer_id not in viewers:
+            viewers.append(viewer_id)
+            if self._leases.joined(key):
+                await self._leases.attach(key, 1)
+
+    def get_viewer_count(self, key: StreamKey) -> int:
+        """Get the number of viewer sessions attached to a camera stream, on any worker."""
+        local = len(self._viewers.get(key, []))
+        if self._runs_here(key):
+            return local + self._leases.remote_viewers(key)
+        lease = self._lease_elsewhere(key)
+        return lease.viewers + lease.remote_viewers if lease is not None else local
+
+    async def release_viewer(self, key: StreamKey, viewer_id: Optional[str] = None) -> int:
+        """
+        Detach a viewer session and stop the stream when the last one leaves.
+
+        Args:
+            key: Camera and profile of the stream
+            viewer_id: Viewer session to detach; the most recently attached
+                session is released when omitted
+
+        Returns:
+            Number of viewers still attached
+        """
+        if self._worker is not None:
+            return await self._forward("release_viewer", 0, key=list(key), viewer_id=viewer_id)
+
+        viewers = self._viewers.get(key, [])
+        before = len(viewers)
+        if viewer_id is None:
+            anonymous = [v for v in viewers if v != self.PINNED_VIEWER]
+            if anonymous:
+                viewers.remove(anonymous[-1])
+        elif viewer_id in viewers:
+            viewers.remove(viewer_id)
+
+        if self._leases.joined(key):
+            # The worker running the stream stops it once no worker has viewers
+            lease = None
+            if len(viewers) != before:
+                lease = await self._leases.attach(key, len(viewers) - before)
+            if not viewers:
+                self._forget_remote(key)
+            if lease is None:
+                return len(viewers)
+            return lease.viewers + lease.remote_viewers
+
+        if not viewers:
+            remote_viewers = await self._leases.viewers_elsewhere(key)
+            if remote_viewers > 0:
+                # Viewers on other workers keep it running
+                return remote_viewers
+            await self.stop_stream(key)
+            return 0
+        return len(viewers) + self._leases.remote_viewers(key)
+
+    async def pin_stream(self, key: StreamKey, rtsp_url: str, wait: bool = True) -> Tuple[bool, Optional[str]]:
+        """
+        Keep a camera stream running regardless of viewers.
+
+        Pinned streams are exempt from the idle reaper and are restarted by
+        the supervisor even if they fail before ever becoming playable.
+        """
+        if self._worker is not None:
+            return await self._start_on_worker("pin_stream", key, rtsp_url, wait)
+        self._pinned.add(key)
+        return await self.start_stream(key, rtsp_url, wait=wait, viewer_id=self.PINNED_VIEWER)
+
+    async def pin_streams(self, targets: List[Tuple[StreamKey, str]], concurrency: int = 4) -> None:
+        """Pin several camera streams, starting them concurrently."""
+        if self._worker is not None:
+            # The worker starts them concurrently in the background
+            for key, rtsp_url in targets:
+                await self._start_on_worker("pin_stream", key, rtsp_url, wait=False)
+            return
+        self._pinned.update(key for key, _ in targets)
+        async for key, success, error in self.start_streams(
+            targets, concurrency=concurrency, viewer_id=self.PINNED_VIEWER
+        ):
+            if success:
+                print(f"[StreamManager] Pinned stream ready for camera {key}")
+            else:
+                print(f"[StreamManager] Pinned stream for camera {key} failed to start: {error}")
+
+    async def unpin_stream(self, key: StreamKey) -> None:
+        """Stop keeping a camera warm; the stream stops once no viewers remain."""
+        if self._worker is not None:
+            await self._forward("unpin_stream", key=list(key))
+        elif key in self._pinned:
+            self._pinned.discard(key)
+            await self.release_viewer(key, self.PINNED_VIEWER)
+
+    def is_pinned(self, key: StreamKey) -> bool:
+        """Check if a camera stream is pinned always-on."""
+        if key in self._pinned:
+            return True
+        lease = self._lease_elsewhere(key)
+        return lease is not None and lease.pinned
+
+    async def set_recording(self, camera_id: int, enabled: bool) -> None:
+        """
+        Record (or stop recording) a camera's main stream from its next FFmpeg start.
+
+        A recording stream that viewers still watch is restarted without its
+        recording output straight away. Pinned-only streams are left to
+        pin_stream and unpin_stream, which restart or stop them anyway.
+        """
+        recorder.set_enabled(camera_id, enabled)
+        if self._worker is not None:
+            await self._forward("set_recording", camera_id=camera_id, enabled=enabled)
+            return
+        if enabled:
+            return
+        for key in [key for key in self._recording if key.camera_id == camera_id]:
+            async with self._start_locks.setdefault(key, asyncio.Lock()):
+                rtsp_url = self._rtsp_urls.get(key)
+                watched = self._leases.remote_viewers(key) or any(
+                    viewer != self.PINNED_VIEWER for viewer in self._viewers.get(key, [])
+                )
+                if rtsp_url is None or key not in self._recording or not self.is_streaming(key) or not watched:
+                    continue
+                print(f"[StreamManager] Recording disabled for camera {key}, restarting its stream")
+                success, error = await self._spawn_stream(key, rtsp_url)
+            if not success:
+                self._handle_unexpected_exit(key, None, error or "FFmpeg failed to start")
+
+    def set_abr_sources(self, camera_id: int, sources: Dict[str, str], channel: int = 1) -> None:
+        """
+        Register the renditions a camera's ABR master playlist offers.
+
+        Args:
+            camera_id: Database ID of the camera
+            sources: RTSP URL per profile, e.g. "main", "sub" and "low"
+            channel: NVR channel the renditions belong to
+        """
+        self._abr_sources[(camera_id, channel)] = dict(sources)
+
+    def get_abr_source(self, key: StreamKey) -> Optional[str]:
+        """Get the RTSP URL of an ABR rendition, or None if it is not offered."""
+        return self._abr_sources.get((key.camera_id, key.channel), {}).get(key.profile)
+
+    def get_master_playlist_url(self, camera_id: int, channel: int = 1) -> str:
+        """Get the URL for a camera's ABR master playlist."""
+        return f"/streams/{self._stream_name(StreamKey(camera_id, channel=channel))}/master.m3u8"
+
+    def get_master_playlist(self, camera_id: int, channel: int = 1) -> Optional[str]:
+        """
+        Build the ABR master playlist for a camera.
+
+        Bandwidths are the configured estimates, since copied renditions run
+        at whatever bitrate the camera is set to. Variant URIs are relative to
+        the master playlist, which is published under the main stream.
+        """
+        sources = self._abr_sources.get((camera_id, channel))
+        if not sources:
+            return None
+
+        bandwidths = {
+            "main": settings.hls_abr_main_bandwidth_kbps,
+            "sub": settings.hls_abr_sub_bandwidth_kbps,
+            self.LOW_PROFILE: settings.hls_abr_low_bitrate_kbps,
+        }
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+        for profile in sorted(sources, key=lambda p: bandwidths.get(p, 0), reverse=True):
+            stream_name = self._stream_name(StreamKey(camera_id, profile, channel))
+            lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidths.get(profile, 0) * 1000}")
+            lines.append(f"../{stream_name}/stream.m3u8")
+        return "\n".join(lines) + "\n"
+
+    async def ensure_abr_rendition(self, key: StreamKey) -> bool:
+        """
+        Start an ABR rendition the first time a player asks for it.
+
+        Returns:
+            True if the rendition is (now) running
+        """
+        if self.is_streaming(key) or self._leases.joined(key):
+            return True
+        if self._worker is not None and self.get_stream_state(key) in ("starting", "ready"):
+            return True
+        rtsp_url = self.get_abr_source(key)
+        if rtsp_url is None:
+            return False
+        success, _ = await self.start_stream(key, rtsp_url, viewer_id=self.ABR_VIEWER)
+        return success
+
+    def _video_options(self, key: StreamKey) -> List[str]:
+        """FFmpeg video codec options for a stream's profile."""
+        if key.profile != self.LOW_PROFILE:
+            return ["-c:v", "copy"]  # Copy video codec (no transcoding)
+
+        bitrate = settings.hls_abr_low_bitrate_kbps
+        return [
+            "-c:v", "libx264",
+            "-preset", "veryfast",
+            "-tune", "zerolatency",
+            "-vf", f"scale=-2:{settings.hls_abr_low_height}",
+            "-b:v", f"{bitrate}k",
+            "-maxrate", f"{bitrate}k",
+            "-bufsize", f"{bitrate * 2}k",
+            # A keyframe per second so every HLS segment is switchable
+            "-force_key_frames", "expr:gte(t,n_forced*1)",
+        ]
+
+    def _estimate_cost(self, key: StreamKey, decode: bool = False) -> Tuple[float, int]:
+        """Estimated (CPU cores, bandwidth in kbps) of one stream, or of a decoder reading it."""
+        if decode:
+            cpu = settings.stream_cpu_decode
+        elif key.profile == self.LOW_PROFILE:
+            cpu = settings.stream_cpu_transcode
+        else:
+            cpu = settings.stream_cpu_copy
+        bandwidth = {
+            "main": settings.hls_abr_main_bandwidth_kbps,
+            "sub": settings.hls_abr_sub_bandwidth_kbps,
+            self.LOW_PROFILE: settings.hls_abr_low_bitrate_kbps,
+        }.get(key.profile, settings.hls_abr_main_bandwidth_kbps)
+        return cpu, bandwidth
+
+    async def _evict_for(self, key: StreamKey) -> bool:
+        """Stop the least recently viewed stream that is not pinned to make room for another."""
+        candidates = [
+            other for other in self.get_active_streams()
+            if other != key and other not in self._pinned and not self._admission.is_reserved(other)
+        ]
+        if not candidates:
+            return False
+        victim = min(candidates, key=lambda other: self._last_access.get(other, 0.0))
+        print(f"[StreamManager] Stream budget reached, evicting least recently "
+              f"viewed stream for camera {victim} to start camera {key}")
+        self._reaper_log.append({
+            "camera_id": victim.camera_id,
+            "profile": victim.profile,
+            "channel": victim.channel,
+            "action": "evicted",
+            "idle_seconds": round(self.get_idle_seconds(victim) or 0.0, 1),
+            "stale_viewers": self.get_viewer_count(victim),
+            "at": datetime.now(timezone.utc).isoformat(),
+        })
+        await self.stop_stream(victim)
+        return True
+
+    async def acquire_session(self, name: str, key: StreamKey, decode: bool = False, pid: Optional[int] = None) -> Optional[str]:
+        """
+        Admit an FFmpeg session opened outside the HLS pipeline.
+
+        WebSocket relays, snapshot decoders and motion detectors each open
+        their own RTSP connection, so they count against the same process
+        cap and CPU and bandwidth budgets as HLS streams, under the same
+        admission policy. Sessions are held until release_session; those of
+        a process that died without releasing them are dropped by
+        housekeeping.
+
+        Args:
+            name: Identifies the session within the calling process
+            key: Camera, profile and channel the session reads
+            decode: Whether the session decodes video rather than copying it
+            pid: Calling process, when forwarded from an API process
+
+        Returns:
+            None if admitted, otherwise an error starting with BUDGET_ERROR
+        """
+        pid = pid or os.getpid()
+        if self._worker is not None:
+            return await self._forward("acquire_session", name=name, key=list(key), decode=decode, pid=pid)
+        return await self._admission.acquire_session(pid, name, key, self._estimate_cost(key, decode))
+
+    async def release_session(self, name: str, pid: Optional[int] = None) -> None:
+        """Free the budget held by a session once its FFmpeg has exited."""
+        pid = pid or os.getpid()
+        if self._worker is not None:
+            await self._forward("release_session", name=name, pid=pid)
+            return
+        self._admission.release_session(pid, name)
+
+    def get_budget_status(self) -> Dict[str, Any]:
+        """Summarize stream budget utilization for health reporting."""
+        return self._admission.get_status()
+
+    async def _spawn_stream(self, key: StreamKey, rtsp_url: str) -> Tuple[bool, Optional[str]]:
+        """
+        Launch a fresh FFmpeg process for a camera, replacing any existing one.
+
+        Viewers and pinning of a dead or reconfigured stream carry over to
+        the new process.
+        """
+        restart_task = self._restart_tasks.pop(key, None)
+        if restart_task is not None:
+            restart_task.cancel()
+        await self._terminate_process(key)
+
+        admission_error = await self._admission.admit(key, self._estimate_cost(key))
+        if admission_error is not None:
+            return False, admission_error
 
         # Clear previous errors
-        self._errors.pop(camera_id, None)
-        self._playlist_tokens.pop(camera_id, None)
+        self._errors.pop(key, None)
+        self._playlist_tokens.pop(key, None)
 
-        output_path = self._get_stream_path(camera_id)
-        playlist_path = output_path / "stream.m3u8"
         start_token = int(time.time() * 1000)
-        self._playlist_tokens[camera_id] = start_token
-        self._cleanup_stream_files(camera_id)
+        self._playlist_tokens[key] = start_token
+        segment_name = f"segment_{start_token}_%03d.ts"
+
+        # 1 second segments, 3 in the playlist, for lower latency
+        segment_options = ["-hls_time", "1", "-hls_list_size", "3"]
+        low_latency = settings.hls_storage == "memory" and settings.hls_low_latency
+
+        if settings.hls_storage == "memory":
+            # FFmpeg uploads straight into the in-process segment store
+            ingest_token = self._memory_store.open(
+                self._stream_name(key),
+                low_latency=low_latency,
+                part_target=settings.hls_part_duration,
+                parts_per_segment=settings.hls_parts_per_segment,
+            )
+            self._memory_streams.add(key)
+            ingest_base = (f"{settings.internal_base_url}/streams/ingest/"
+                           f"{self._stream_name(key)}/{ingest_token}")
+            playlist_target = f"{ingest_base}/stream.m3u8"
+            segment_target = f"{ingest_base}/{segment_name}"
+            output_options = ["-method", "PUT", "-http_persistent", "1"]
+            # The store evicts old segments itself
+            hls_flags = "omit_endlist"
+            readiness_playlist = None
+            segment_prefix = None
+
+            if low_latency:
+                # FFmpeg cuts short fMP4 fragments; the store republishes
+                # them as LL-HLS parts and writes its own playlist
+                segment_target = f"{ingest_base}/part_{start_token}_%05d.m4s"
+                segment_options = [
+                    "-hls_time", str(settings.hls_part_duration),
+                    "-hls_list_size", str(settings.hls_parts_per_segment * 2),
+                    "-hls_segment_type", "fmp4",
+                    "-hls_fmp4_init_filename", INIT_SEGMENT_NAME,
+                ]
+                hls_flags = "split_by_time+omit_endlist"
+        else:
+            self._stream_roots[key] = self._select_storage_root(key)
+            output_path = self._get_stream_path(key)
+            self._cleanup_stream_files(key)
+            playlist_target = str(output_path / "stream.m3u8")
+            segment_target = str(output_path / segment_name)
+            # Keep segments past the playlist on disk for event clip pre-roll
+            output_options = ["-hls_delete_threshold", str(math.ceil(settings.clip_preroll_seconds) + 1)]
+            hls_flags = "delete_segments+append_list+omit_endlist+temp_file"
+            readiness_playlist = "stream.m3u8"
+            segment_prefix = f"segment_{start_token}_"
+
+        # A second, stream-copied output feeds the recording ring buffer
+        # from the same RTSP session
+        recording_options = []
+        self._recording.discard(key)
+        self._open_segments.pop(key, None)
+        if self._records(key):
+            recording_options = recorder.output_options(key.camera_id, start_token)
+            self._recording.add(key)
 
         # Log sanitized URL (hide password)
         safe_url = rtsp_url
@@ -104,26 +1147,34 @@ class StreamManager:
             if ':' in auth_part:
                 username = auth_part.split(':')[0]
                 safe_url = f"rtsp://{username}:****@{parts[1]}"
-        print(f"[StreamManager] Starting stream for camera {camera_id}: {safe_url}")
+        print(f"[StreamManager] Starting stream for camera {key}: {safe_url}")
 
         # FFmpeg command to convert RTSP to HLS
         # Low-latency settings for real-time monitoring
         cmd = [
             "ffmpeg",
+            "-hide_banner",
+            "-nostats",  # No per-frame status lines on stderr
+            # Disk readiness and recording need the muxers' info-level
+            # "Opening" lines; memory streams are signalled by the ingest
+            # route instead
+            "-loglevel", "info" if readiness_playlist or recording_options else "warning",
+            "-progress", "pipe:2",  # fps/bitrate/drop/speed telemetry
             "-y",  # Overwrite output files
             "-fflags", "+genpts+nobuffer+flush_packets",  # Low latency flags
             "-flags", "low_delay",
             "-rtsp_transport", "tcp",
             "-timeout", "5000000",  # Connection timeout (microseconds)
             "-i", rtsp_url,
-            "-c:v", "copy",  # Copy video codec (no transcoding)
+            *self._video_options(key),
             "-an",  # No audio
             "-f", "hls",
-            "-hls_time", "1",  # 1 second segments for lower latency
-            "-hls_list_size", "3",  # Keep only 3 segments
-            "-hls_flags", "delete_segments+append_list+omit_endlist",
-            "-hls_segment_filename", str(output_path / f"segment_{start_token}_%03d.ts"),
-            str(playlist_path),
+            *segment_options,
+            "-hls_flags", hls_flags,
+            *output_options,
+            "-hls_segment_filename", segment_target,
+            playlist_target,
+            *recording_options,
         ]
 
         try:
@@ -131,109 +1182,618 @@ class StreamManager:
             debug_cmd = ' '.join(cmd).replace(rtsp_url, safe_url)
             print(f"[StreamManager] Running: {debug_cmd}")
 
-            # Start FFmpeg process
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.PIPE,
-                stdin=subprocess.DEVNULL,  # Prevent FFmpeg from waiting for input
-            )
-            self._processes[camera_id] = process
-
-            # Start monitoring thread
-            monitor_thread = threading.Thread(
-                target=self._monitor_ffmpeg,
-                args=(camera_id, process),
-                daemon=True
-            )
-            monitor_thread.start()
-
-            # Wait for playlist file to be created (up to 30 seconds)
-            # Dahua cameras can be slow to start streaming
-            for i in range(60):
-                time.sleep(0.5)
-                if playlist_path.exists() and playlist_path.stat().st_size > 0:
-                    # Ensure at least one segment from this specific start attempt exists
-                    segments = list(output_path.glob(f"segment_{start_token}_*.ts"))
-                    if segments:
-                        print(f"[StreamManager] Stream ready for camera {camera_id} (took {(i+1)*0.5:.1f}s)")
-                        return True, None
-                # Check if process died
-                if process.poll() is not None:
-                    error = self._errors.get(camera_id, "FFmpeg process terminated unexpectedly")
-                    return False, error
-                # Log progress every 5 seconds
-                if (i + 1) % 10 == 0:
-                    print(f"[StreamManager] Waiting for stream... {(i+1)*0.5:.0f}s")
-
-            # Timeout - check if process is still running
-            if process.poll() is None:
-                # Process running but no playlist yet - return success anyway and let HLS.js retry
-                print(f"[StreamManager] Stream taking long but FFmpeg still running, allowing connection")
-                return True, None
+            if settings.stream_handover and key in self._stream_roots:
+                # Detached, so the next server process can adopt it
+                process = await DetachedProcess.start(cmd, self._get_stream_path(key) / self.HANDOVER_PIPE)
             else:
-                error = self._errors.get(camera_id, "FFmpeg failed to start stream")
-                self._playlist_tokens.pop(camera_id, None)
-                return False, error
+                # Start FFmpeg process without blocking the event loop
+                process = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                    stdin=asyncio.subprocess.DEVNULL,  # Prevent FFmpeg from waiting for input
+                )
+            self._processes[key] = process
+            self._rtsp_urls[key] = rtsp_url
+            self._ready_events[key] = asyncio.Event()
+            self._started_at[key] = time.monotonic()
+            self._last_access[key] = time.monotonic()
+            self._metrics[key] = StreamMetrics(settings.stream_metrics_samples)
 
+            # Start monitoring task
+            self._monitors[key] = asyncio.create_task(
+                self._monitor_ffmpeg(
+                    key, process, readiness_playlist,
+                    recording=bool(recording_options),
+                    segment_prefix=segment_prefix,
+                )
+            )
+            self._publish(key)
         except FileNotFoundError:
             error = "FFmpeg not found. Please install FFmpeg."
             print(f"[StreamManager] {error}")
-            self._playlist_tokens.pop(camera_id, None)
+            self._playlist_tokens.pop(key, None)
+            self._release_output(key)
             return False, error
         except Exception as e:
             error = f"Error starting stream: {e}"
             print(f"[StreamManager] {error}")
-            self._playlist_tokens.pop(camera_id, None)
+            self._playlist_tokens.pop(key, None)
+            self._release_output(key)
             return False, error
+        finally:
+            self._admission.release_reservation(key)
 
-    def stop_stream(self, camera_id: int) -> bool:
+        return True, None
+
+    async def wait_until_ready(self, key: StreamKey, timeout: Optional[float] = None) -> Tuple[bool, Optional[str]]:
         """
-        Stop streaming from a camera.
+        Wait for a started stream to produce its first playable segment.
 
         Args:
-            camera_id: Database ID of the camera
+            key: Camera and profile of the stream
+            timeout: Seconds to wait, defaults to READY_TIMEOUT
 
         Returns:
-            True if stream stopped successfully
+            Tuple of (success, error_message)
         """
-        if camera_id not in self._processes:
-            return True
+        if self._leases.joined(key):
+            return await self._wait_for_remote(key, timeout)
+        process = self._processes.get(key)
+        ready_event = self._ready_events.get(key)
+        monitor = self._monitors.get(key)
+        if process is None or ready_event is None or monitor is None:
+            return False, self._errors.get(key, "Stream is not running")
+        if ready_event.is_set():
+            return True, None
 
-        process = self._processes[camera_id]
+        ready_waiter = asyncio.ensure_future(ready_event.wait())
         try:
-            process.terminate()
-            process.wait(timeout=5)
-        except Exception:
-            try:
-                process.kill()
-            except Exception:
-                pass
+            done, _ = await asyncio.wait(
+                {ready_waiter, monitor},
+                timeout=timeout or self.READY_TIMEOUT,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        finally:
+            ready_waiter.cancel()
+
+        if ready_event.is_set():
+            elapsed = self._start_latency.get(key, 0.0)
+            print(f"[StreamManager] Stream ready for camera {key} (took {elapsed * 1000:.0f} ms)")
+            return True, None
+
+        # Check if process died
+        if process.returncode is not None or monitor in done:
+            error = self._errors.get(key, "FFmpeg process terminated unexpectedly")
+            if self._processes.get(key) is process:
+                self._playlist_tokens.pop(key, None)
+            return False, error
+
+        # Process running but no playlist yet - return success anyway and let HLS.js retry
+        print(f"[StreamManager] Stream taking long but FFmpeg still running, allowing connection")
+        return True, None
+
+    async def _wait_for_remote(self, key: StreamKey, timeout: Optional[float] = None) -> Tuple[bool, Optional[str]]:
+        """Poll the lease of a stream run by another worker until it is playable."""
+        deadline = time.monotonic() + (timeout or self.READY_TIMEOUT)
+        while True:
+            lease = await self._leases.refresh(key)
+            if lease is None or not lease.live:
+                return False, "Stream stopped on the worker running it"
+            if self._leases.joined(key):
+                self._leases.join(key, lease)
+            if lease.state == "ready":
+                return True, None
+            if lease.state == "error":
+                return False, lease.error or "FFmpeg process terminated unexpectedly"
+            if time.monotonic() >= deadline:
+                # As for a slow local start, let HLS.js retry
+                return True, None
+            await asyncio.sleep(0.5)
+
+    async def start_streams(
+        self,
+        targets: List[Tuple[StreamKey, str]],
+        concurrency: int = 4,
+        viewer_id: Optional[str] = None,
+    ) -> AsyncIterator[Tuple[StreamKey, bool, Optional[str]]]:
+        """
+        Start several streams concurrently.
+
+        Args:
+            targets: (key, rtsp_url) pairs to start
+            concurrency: Maximum number of streams starting at once
+            viewer_id: Viewer session to attach to every stream
+
+        Yields:
+            Tuple of (key, success, error_message) as each start finishes
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
 
-        del self._processes[camera_id]
-        self._playlist_tokens.pop(camera_id, None)
+        async def start_one(key: StreamKey, rtsp_url: str) -> Tuple[StreamKey, bool, Optional[str]]:
+            async with semaphore:
+                success, error = await self.start_stream(key, rtsp_url, viewer_id=viewer_id)
+                return key, success, error
 
-        # Clean up HLS files
-        self._cleanup_stream_files(camera_id)
+        # Starts already in flight keep running if the consumer goes away
+        tasks = [asyncio.create_task(start_one(key, rtsp_url)) for key, rtsp_url in targets]
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
 
+    async def stop_stream(self, key: StreamKey) -> bool:
+        """
+        Stop streaming from a camera, detaching all of its viewers.
+
+        This also unpins an always-on stream until it is pinned again.
+
+        Args:
+            key: Camera and profile of the stream
+
+        Returns:
+            True if stream stopped successfully
+        """
+        self._leases.forget(key)
+        if self._worker is not None:
+            return await self._forward("stop_stream", False, key=list(key))
+        if not self._runs_here(key) and self._leases.enabled:
+            # Stop it on whichever worker runs it
+            await self._leases.request_stop(key)
+            self._forget_remote(key)
+        self._viewers.pop(key, None)
+        self._pinned.discard(key)
+        self._errors.pop(key, None)
+        self._supervised.discard(key)
+        self._ready_at.pop(key, None)
+        self._start_latency.pop(key, None)
+        self._metrics.pop(key, None)
+        self._rtsp_urls.pop(key, None)
+        self._last_access.pop(key, None)
+        restart_task = self._restart_tasks.pop(key, None)
+        if restart_task is not None:
+            restart_task.cancel()
+        self._playlist_tokens.pop(key, None)
+        await self._terminate_process(key)
+        self._leases.release(key)
         return True
 
-    def is_streaming(self, camera_id: int) -> bool:
+    def get_camera_streams(self, camera_id: int) -> List[StreamKey]:
+        """Get every running, restarting or pinned stream of a camera, on any worker."""
+        keys = set(self._processes) | set(self._restart_tasks) | self._pinned | self._leases.live_streams()
+        return sorted(key for key in keys if key.camera_id == camera_id)
+
+    async def stop_camera(self, camera_id: int) -> None:
+        """Stop all of a camera's streams, whatever their profile."""
+        for source in [source for source in self._abr_sources if source[0] == camera_id]:
+            del self._abr_sources[source]
+        if self._worker is not None:
+            await self._forward("stop_camera", camera_id=camera_id)
+            self._leases.forget_camera(camera_id)
+            return
+        await asyncio.gather(*(self.stop_stream(key) for key in self.get_camera_streams(camera_id)))
+
+    async def _terminate_process(self, key: StreamKey) -> None:
+        """Terminate a camera's FFmpeg process and remove its HLS files."""
+        process = self._processes.pop(key, None)
+        if process is not None:
+            self._ready_events.pop(key, None)
+            self._monitors.pop(key, None)
+            self._started_at.pop(key, None)
+            try:
+                process.terminate()
+                await asyncio.wait_for(process.wait(), timeout=5)
+            except Exception:
+                try:
+                    process.kill()
+                except Exception:
+                    pass
+
+        # Clean up HLS output, including that left behind by a crashed process
+        self._release_output(key)
+        self._admission.notify_capacity()
+
+    def is_streaming(self, key: StreamKey) -> bool:
         """Check if a camera is currently streaming."""
-        if camera_id not in self._processes:
+        if key not in self._processes:
             return False
 
-        process = self._processes[camera_id]
-        return process.poll() is None
+        process = self._processes[key]
+        return process.returncode is None
+
+    def get_active_streams(self) -> List[StreamKey]:
+        """Get the streams that are currently running."""
+        return [key for key in self._processes.keys() if self.is_streaming(key)]
+
+    def touch(self, key: StreamKey) -> None:
+        """Record that a camera's playlist or segments were just fetched."""
+        now = time.monotonic()
+        if key in self._last_access:
+            self._last_access[key] = now
+        elif self._lease_elsewhere(key) is not None:
+            # Another worker runs the stream; keep its idle reaper informed
+            self._leases.touch(key)
+
+    def get_idle_seconds(self, key: StreamKey) -> Optional[float]:
+        """Seconds since a stream's HLS output was last fetched, or None if not running."""
+        last_access = self._last_access.get(key)
+        if last_access is None:
+            return None
+        return time.monotonic() - last_access
+
+    async def _reap_idle_streams(self) -> None:
+        """Stop streams whose HLS output has not been fetched within the idle timeout."""
+        idle_timeout = settings.stream_idle_timeout
+        if idle_timeout <= 0:
+            return
+
+        for key in list(set(self._processes) | set(self._restart_tasks)):
+            if key in self._pinned:
+                continue
+            idle_seconds = self.get_idle_seconds(key)
+            if idle_seconds is None or idle_seconds < idle_timeout:
+                continue
+
+            viewers = self.get_viewer_count(key)
+            print(f"[StreamManager] Reaping idle stream for camera {key} "
+                  f"(no requests for {idle_seconds:.0f}s, {viewers} stale viewer(s))")
+            self._reaper_log.append({
+                "camera_id": key.camera_id,
+                "profile": key.profile,
+                "channel": key.channel,
+                "action": "stopped",
+                "idle_seconds": round(idle_seconds, 1),
+                "stale_viewers": viewers,
+                "at": datetime.now(timezone.utc).isoformat(),
+            })
+            await self.stop_stream(key)
+
+    async def _enforce_storage_budget(self) -> None:
+        """
+        Keep RAM-backed streams within their per-camera size budget.
+
+        Segments no longer referenced by the playlist are removed first. A
+        stream whose live window alone exceeds the budget is moved to disk.
+        """
+        if self._ram_root is None:
+            return
+
+        budget = settings.hls_ram_budget_mb * 1024 * 1024
+        for key, root in list(self._stream_roots.items()):
+            if root != self._ram_root or key not in self._processes:
+                continue
+
+            path = root / self._stream_name(key)
+            files = []
+            for f in path.glob("*"):
+                try:
+                    files.append((f, f.stat()))
+                except OSError:
+                    pass
+            used = sum(stat.st_size for _, stat in files)
+            if used <= budget:
+                continue
+
+            try:
+                referenced = (path / "stream.m3u8").read_text()
+            except OSError:
+                referenced = ""
+            stale = [(f, stat) for f, stat in files if f.suffix == ".ts" and f.name not in referenced]
+            for f, stat in sorted(stale, key=lambda item: item[1].st_mtime):
+                if used <= budget:
+                    break
+                try:
+                    f.unlink()
+                    used -= stat.st_size
+                except OSError:
+                    pass
+
+            rtsp_url = self._rtsp_urls.get(key)
+            if used > budget and rtsp_url:
+                print(f"[StreamManager] Camera {key} segments exceed the "
+                      f"{settings.hls_ram_budget_mb} MB RAM budget, moving to disk")
+                self._disk_only.add(key)
+                async with self._start_locks.setdefault(key, asyncio.Lock()):
+                    await self._spawn_stream(key, rtsp_url)
+
+    async def _housekeeping_loop(self) -> None:
+        """Periodically run background maintenance for running streams."""
+        while True:
+            await asyncio.sleep(settings.stream_reaper_interval)
+            try:
+                await self._reap_idle_streams()
+                await self._enforce_storage_budget()
+                orphaned = self._admission.drop_orphaned_sessions()
+                if orphaned:
+                    print(f"[StreamManager] Released {orphaned} session(s) of exited processes")
+            except Exception as e:
+                print(f"[StreamManager] Housekeeping error: {e}")
+
+    def start_housekeeping(self) -> None:
+        """Start the background housekeeping task on the running event loop."""
+        if self._housekeeping_task is None or self._housekeeping_task.done():
+            self._housekeeping_task = asyncio.create_task(self._housekeeping_loop())
+        if self._leases.enabled and (self._registry_task is None or self._registry_task.done()):
+            self._registry_task = asyncio.create_task(self._registry_loop())
+
+    async def stop_housekeeping(self) -> None:
+        """Cancel the background housekeeping and registry tasks."""
+        tasks = [self._housekeeping_task, self._registry_task]
+        self._housekeeping_task = self._registry_task = None
+        for task in tasks:
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+    def _lease_values(self, key: StreamKey) -> Dict[str, Any]:
+        """State of a local stream as published in its lease."""
+        process = self._processes.get(key)
+        error = self._errors.get(key)
+        return {
+            "pid": process.pid if process is not None else None,
+            # Identifies the process's output, so a reused PID is never taken for it
+            "token": self._playlist_tokens.get(key) if process is not None else None,
+            "state": self.get_stream_state(key),
+            "stream_url": self.get_playlist_url(key),
+            "error": error[-500:] if error else None,
+            "viewers": len(self._viewers.get(key, [])),
+            "pinned": key in self._pinned,
+        }
+
+    def _publish(self, key: StreamKey) -> None:
+        """Push a local stream's state to its lease straight away."""
+        if self._leases.holds(key):
+            self._leases.publish(key, self._lease_values(key))
+
+    def _forget_remote(self, key: StreamKey) -> None:
+        """Drop local state of a stream run by another worker."""
+        if self._leases.leave(key):
+            self._viewers.pop(key, None)
+            self._rtsp_urls.pop(key, None)
+
+    async def _take_over(self, key: StreamKey, rtsp_url: str) -> None:
+        """Start a stream here whose worker stopped heartbeating, unless another worker won it."""
+        async with self._start_locks.setdefault(key, asyncio.Lock()):
+            if await self._leases.claim(key) is not None:
+                return
+            print(f"[StreamManager] Taking over stream for camera {key} from a stopped worker")
+            self._leases.leave(key)
+            success, error = await self._spawn_stream(key, rtsp_url)
+        if not success:
+            print(f"[StreamManager] Taking over camera {key} failed: {error}")
+            self._leases.release(key)
 
-    def get_active_streams(self) -> List[int]:
-        """Get list of camera IDs that are currently streaming."""
-        return [cid for cid in self._processes.keys() if self.is_streaming(cid)]
+    async def _sync_registry(self) -> None:
+        """Heartbeat this worker's leases and follow the streams it joined on other workers."""
+        values = {key: self._lease_values(key) for key in self._leases.held()}
+        leases = await self._leases.heartbeat(values)
+        for key, lease in leases.items():
+            if lease is None:
+                print(f"[StreamManager] Lost the lease on camera {key} to another worker, stopping")
+                await self.stop_stream(key)
+                continue
+            if lease.accessed_at is not None and key in self._last_access:
+                # Map the other worker's wall-clock fetch time onto our monotonic clock
+                accessed = time.monotonic() - max(time.time() - lease.accessed_at, 0.0)
+                self._last_access[key] = max(self._last_access[key], accessed)
+            starting = key in self._start_locks and self._start_locks[key].locked()
+            if lease.stop_requested:
+                print(f"[StreamManager] Stopping camera {key} as requested by another worker")
+                await self.stop_stream(key)
+            elif not (starting or self._viewers.get(key) or lease.remote_viewers or key in self._pinned):
+                print(f"[StreamManager] Stopping camera {key}: no viewers left on any worker")
+                await self.stop_stream(key)
 
-    def stop_all_streams(self):
-        """Stop all active streams."""
-        for camera_id in list(self._processes.keys()):
-            self.stop_stream(camera_id)
+        await self._leases.sync()
+        for key, known in self._leases.joined_streams().items():
+            lease = self._leases.synced(key)
+            if lease is not None and lease.live:
+                if lease.owner != known.owner:
+                    # A worker took the stream over; count our viewers on its lease
+                    viewers = len(self._viewers.get(key, []))
+                    lease = await self._leases.attach(key, viewers) or lease
+                self._leases.join(key, lease)
+                continue
+            rtsp_url = self._rtsp_urls.get(key)
+            # An abandoned lease means its worker died; a deleted one that
+            # the stream was stopped, which only pinned streams outlast
+            if rtsp_url and (key in self._pinned or (lease is not None and self._viewers.get(key))):
+                await self._take_over(key, rtsp_url)
+            else:
+                self._forget_remote(key)
+
+    async def _registry_loop(self) -> None:
+        """Periodically sync with the cross-worker stream registry."""
+        while True:
+            await asyncio.sleep(settings.stream_heartbeat_interval)
+            try:
+                await self._sync_registry()
+            except Exception as e:
+                print(f"[StreamManager] Registry sync error: {e}")
+
+    async def get_registry_status(self) -> Optional[Dict[str, Any]]:
+        """Summarize the stream leases of all workers for health reporting, or None if the registry is off."""
+        return await self._leases.get_status()
+
+    def get_reaper_status(self) -> Dict[str, Any]:
+        """Summarize idle-stream reaping for health reporting."""
+        return {
+            "idle_timeout": settings.stream_idle_timeout,
+            "idle_seconds": {
+                str(key): round(idle_seconds, 1)
+                for key in self.get_active_streams()
+                if (idle_seconds := self.get_idle_seconds(key)) is not None
+            },
+            "recent": list(self._reaper_log),
+        }
+
+    async def hand_over(self) -> None:
+        """
+        Leave running streams to the next server process, e.g. on a reload or deploy.
+
+        Playable disk- and RAM-backed streams started with stream_handover
+        keep their FFmpeg process and output, and their lease records what
+        the next process needs to adopt them (see adopt_streams). Every
+        other stream is stopped as by stop_all_streams.
+        """
+        for key, process in list(self._processes.items()):
+            ready_event = self._ready_events.get(key)
+            if not (
+                isinstance(process, DetachedProcess)
+                and process.returncode is None
+                and ready_event is not None and ready_event.is_set()
+                and self._leases.holds(key)
+            ):
+                continue
+            values = self._lease_values(key)
+            values.update(
+                output_root=str(self._stream_roots[key]),
+                recording=key in self._recording,
+                viewer_ids=json.dumps(self._viewers.get(key, [])),
+            )
+            if not await self._leases.hand_over(key, values):
+                continue
+            monitor = self._monitors.pop(key, None)
+            if monitor is not None:
+                monitor.cancel()
+            process.detach()
+            del self._processes[key]
+            # The output stays with the running process
+            self._stream_roots.pop(key, None)
+            self._recording.discard(key)
+            print(f"[StreamManager] Handed over stream for camera {key} (FFmpeg process {process.pid})")
+        await self.stop_all_streams()
+
+    def _handover_healthy(self, key: StreamKey, lease: Lease, rtsp_url: str) -> bool:
+        """Whether a handed-over FFmpeg still runs the stream's command and keeps its playlist fresh."""
+        if not (lease.pid and lease.token and lease.output_root):
+            return False
+        if Path(lease.output_root) not in self.storage_roots:
+            # Storage was reconfigured, so its output would not be served
+            return False
+        if not runs_command(lease.pid, f"segment_{lease.token}_", rtsp_url):
+            return False
+        stream_path = Path(lease.output_root) / self._stream_name(key)
+        try:
+            stalled = time.time() - (stream_path / "stream.m3u8").stat().st_mtime
+        except OSError:
+            return False
+        return stalled < self.HANDOVER_MAX_STALL and (stream_path / self.HANDOVER_PIPE).exists()
+
+    def _resume_segment_history(self, key: StreamKey, token: int) -> None:
+        """Rebuild an adopted stream's segment history from its files on disk."""
+        prefix = f"segment_{token}_"
+        segments = []
+        for f in self._get_stream_path(key).glob(f"{prefix}*"):
+            try:
+                segments.append((int(f.name[len(prefix):].split(".")[0]), f.name, f.stat().st_mtime))
+            except (OSError, ValueError):
+                pass
+        ended = None
+        for _, filename, modified in sorted(segments):
+            if filename.endswith(".tmp"):
+                # temp_file: the segment FFmpeg is writing
+                self._open_segments[key] = (filename.removesuffix(".tmp"), ended or modified)
+            else:
+                self._segment_completed(key, filename, modified)
+                ended = modified
+
+    async def adopt_streams(self, rtsp_url_for: Callable[[StreamKey], Optional[str]]) -> int:
+        """
+        Adopt the FFmpeg processes an earlier server process on this host handed over.
+
+        A process is adopted if it still runs its camera's current RTSP URL
+        and has updated its playlist within HANDOVER_MAX_STALL seconds; its
+        viewers, pinning and recording carry over. Other handed-over
+        processes are stopped, and their streams start afresh when next
+        requested or pinned.
+
+        Args:
+            rtsp_url_for: Resolves a stream's RTSP URL, or None if its camera is gone
+
+        Returns:
+            Number of streams adopted
+        """
+        if self._worker is not None:
+            return 0
+        adopted = 0
+        for key, lease in await self._leases.handovers():
+            rtsp_url = rtsp_url_for(key)
+            if not self._leases.enabled:
+                # Handover was turned off since
+                print(f"[StreamManager] Stopping handed-over stream for camera {key}: the registry is off")
+                await self._leases.end_handover(key, lease)
+                continue
+            if rtsp_url is None or not self._handover_healthy(key, lease, rtsp_url):
+                print(f"[StreamManager] Stopping handed-over stream for camera {key}: FFmpeg is gone, stalled or outdated")
+                await self._leases.end_handover(key, lease)
+                continue
+            if not await self._leases.adopt(key, lease):
+                # Another worker adopted it first
+                continue
+
+            root = Path(lease.output_root)
+            log_pipe = root / self._stream_name(key) / self.HANDOVER_PIPE
+            try:
+                process = await DetachedProcess.adopt(lease.pid, log_pipe)
+            except OSError as e:
+                print(f"[StreamManager] Cannot follow handed-over stream for camera {key} ({e}), stopping it")
+                DetachedProcess(lease.pid, log_pipe).terminate()
+                self._leases.release(key)
+                continue
+
+            self._stream_roots[key] = root
+            self._processes[key] = process
+            self._playlist_tokens[key] = lease.token
+            self._rtsp_urls[key] = rtsp_url
+            self._ready_events[key] = asyncio.Event()
+            self._ready_events[key].set()
+            self._supervised.add(key)
+            self._ready_at[key] = self._last_access[key] = time.monotonic()
+            self._metrics[key] = StreamMetrics(settings.stream_metrics_samples)
+            self._viewers[key] = list(lease.viewer_ids)
+            if lease.pinned:
+                self._pinned.add(key)
+            self._resume_segment_history(key, lease.token)
+            if lease.recording:
+                self._recording.add(key)
+                recorder.resume(key.camera_id, lease.token)
+            self._monitors[key] = asyncio.create_task(
+                self._monitor_ffmpeg(
+                    key, process, None,
+                    recording=lease.recording,
+                    segment_prefix=f"segment_{lease.token}_",
+                )
+            )
+            self._publish(key)
+            print(f"[StreamManager] Adopted running stream for camera {key} (FFmpeg process {lease.pid})")
+            adopted += 1
+        return adopted
+
+    async def stop_all_streams(self, everywhere: bool = False):
+        """
+        Stop all of this worker's streams concurrently.
+
+        Viewers joined to streams of other workers are detached; with
+        ``everywhere`` the other workers are asked to stop theirs as well.
+        Streams of the standalone stream worker are left running unless
+        ``everywhere`` is given, so restarting the API does not drop them.
+        """
+        if self._worker is not None:
+            if everywhere:
+                await self._forward("stop_all_streams", everywhere=True)
+                self._leases.forget_all()
+            return
+        for key in self._leases.joined_streams():
+            viewers = len(self._viewers.pop(key, []))
+            if viewers:
+                await self._leases.attach(key, -viewers)
+            self._forget_remote(key)
+        if everywhere and self._leases.enabled:
+            await self._leases.request_stop_all()
+        camera_ids = set(self._processes) | set(self._restart_tasks)
+        await asyncio.gather(*(self.stop_stream(key) for key in camera_ids))
 
 
 # Global stream manager instance
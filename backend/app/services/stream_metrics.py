@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import re
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional
+
+# One "key=value" line of FFmpeg's -progress output
+_PROGRESS_LINE = re.compile(rb"^([a-z0-9_]+)=\s*(\S*)\s*$")
+
+
+class ProgressSample(NamedTuple):
+    """One FFmpeg progress report."""
+
+    at: float  # time.time() when the report completed
+    frame: int
+    fps: float
+    bitrate_kbps: Optional[float]  # None until FFmpeg knows the output size
+    speed: Optional[float]
+    drop: int  # Cumulative for the process
+    dup: int
+
+
+def _number(value: Optional[bytes], suffix: bytes = b"") -> Optional[float]:
+    if not value:
+        return None
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return float(value)
+    except ValueError:
+        # "N/A" before the first packet is written
+        return None
+
+
+class StreamMetrics:
+    """
+    Rolling window of an FFmpeg process's -progress reports.
+
+    FFmpeg writes a block of ``key=value`` lines about twice a second,
+    ending with ``progress=continue``. ``feed`` consumes those lines from
+    the stderr reader and keeps the last ``max_samples`` completed blocks
+    as compact tuples; anything else is left for the regular log handling.
+    """
+
+    def __init__(self, max_samples: int):
+        self.samples: Deque[ProgressSample] = deque(maxlen=max_samples)
+        self._pending: Dict[bytes, bytes] = {}
+
+    def feed(self, line: bytes) -> bool:
+        """Consume a progress line. Returns False for ordinary log lines."""
+        match = _PROGRESS_LINE.match(line)
+        if match is None:
+            return False
+        name, value = match.groups()
+        if name != b"progress":
+            self._pending[name] = value
+            return True
+
+        fields, self._pending = self._pending, {}
+        self.samples.append(ProgressSample(
+            at=time.time(),
+            frame=int(_number(fields.get(b"frame")) or 0),
+            fps=_number(fields.get(b"fps")) or 0.0,
+            bitrate_kbps=_number(fields.get(b"bitrate"), b"kbits/s"),
+            speed=_number(fields.get(b"speed"), b"x"),
+            drop=int(_number(fields.get(b"drop_frames")) or 0),
+            dup=int(_number(fields.get(b"dup_frames")) or 0),
+        ))
+        return True
+
+    def summary(self, min_speed: float, stall_after: float) -> Dict[str, Any]:
+        """
+        Summarize the window.
+
+        A stream is degraded when it runs slower than real time on average,
+        dropped frames within the window, or has stopped reporting.
+        """
+        if not self.samples:
+            return {"samples": 0, "degraded": False}
+
+        first, latest = self.samples[0], self.samples[-1]
+        fps = [sample.fps for sample in self.samples]
+        bitrates = [sample.bitrate_kbps for sample in self.samples if sample.bitrate_kbps is not None]
+        speeds = [sample.speed for sample in self.samples if sample.speed is not None]
+        # Counters are cumulative, so the window's share is the difference
+        dropped = latest.drop - first.drop
+        duplicated = latest.dup - first.dup
+        speed_avg = sum(speeds) / len(speeds) if speeds else None
+        age = time.time() - latest.at
+        return {
+            "samples": len(self.samples),
+            "window_seconds": round(latest.at - first.at, 1),
+            "age": round(age, 1),
+            "frames": latest.frame,
+            "fps": latest.fps,
+            "fps_avg": round(sum(fps) / len(fps), 2),
+            "fps_min": min(fps),
+            "bitrate_kbps": latest.bitrate_kbps,
+            "bitrate_avg_kbps": round(sum(bitrates) / len(bitrates), 1) if bitrates else None,
+            "speed": latest.speed,
+            "speed_avg": round(speed_avg, 3) if speed_avg is not None else None,
+            "dropped": dropped,
+            "duplicated": duplicated,
+            "degraded": (
+                (speed_avg is not None and speed_avg < min_speed)
+                or dropped > 0
+                or age > stall_after
+            ),
+        }
+
+    def history(self) -> Dict[str, List[Any]]:
+        """Get the window as per-field series, oldest first."""
+        return {
+            field: [getattr(sample, field) for sample in self.samples]
+            for field in ProgressSample._fields
+        }
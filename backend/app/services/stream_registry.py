@@ -0,0 +1,427 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import json
+import os
+import signal
+import socket
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
+
+from sqlalchemy.exc import IntegrityError
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.stream_lease import StreamLease
+from .detached_process import runs_command
+
+T = TypeVar("T")
+
+
+class Lease(NamedTuple):
+    """Snapshot of a stream's registry entry."""
+
+    owner: str
+    pid: Optional[int]
+    state: str
+    stream_url: Optional[str]
+    error: Optional[str]
+    viewers: int
+    remote_viewers: int
+    pinned: bool
+    stop_requested: bool
+    handover: bool
+    token: Optional[int]
+    output_root: Optional[str]
+    recording: bool
+    viewer_ids: List[str]
+    accessed_at: Optional[float]
+    heartbeat_at: float
+    live: bool
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class StreamRegistry:
+    """
+    Cross-process record of which API worker runs each stream.
+
+    Every worker of a multi-worker deployment shares the stream_leases
+    table. A worker claims a stream's lease before spawning FFmpeg and keeps
+    it alive with heartbeats; a worker that finds a live lease held by
+    another joins that stream instead of starting a second process, and
+    answers status from the lease. A lease whose heartbeat is older than
+    stream_lease_timeout, or whose worker process is gone, is taken over
+    with a compare-and-swap update, so only one claimant wins. A worker
+    shutting down can instead hand a stream over: its lease stays live for
+    the next server process on the host to adopt the running FFmpeg.
+
+    Keys are StreamKey-like tuples (camera_id, profile, channel).
+
+    Its methods do blocking database work; async callers go through run()
+    or submit(), which execute them in order on the registry's own thread.
+    """
+
+    def __init__(self):
+        self._owner = ""
+        self._owner_pid: Optional[int] = None
+        self._host = socket.gethostname()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream-registry")
+
+    @property
+    def enabled(self) -> bool:
+        """Whether streams are shared through the registry; a lone API process keeps them in memory."""
+        return bool(
+            settings.stream_multi_worker
+            or settings.stream_worker_socket is not None
+            or settings.stream_handover
+        )
+
+    async def run(self, method: Callable[..., T], *args: Any) -> T:
+        """Run a registry method on the registry thread and wait for its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(method, *args))
+
+    def submit(self, method: Callable[..., Any], *args: Any) -> None:
+        """Queue a registry write on the registry thread without waiting for it."""
+        self._executor.submit(method, *args).add_done_callback(self._log_failure)
+
+    @staticmethod
+    def _log_failure(future: Future) -> None:
+        error = future.exception()
+        if error is not None:
+            print(f"[StreamRegistry] Registry write failed: {error}")
+
+    @property
+    def owner(self) -> str:
+        """Identity of this worker; the boot suffix tells a restarted worker from one reusing its PID."""
+        if self._owner_pid != os.getpid():
+            # Forked workers get their own identity
+            self._owner_pid = os.getpid()
+            self._owner = f"{self._host}:{self._owner_pid}:{uuid.uuid4().hex[:8]}"
+        return self._owner
+
+    @staticmethod
+    def _query(db, key):
+        return db.query(StreamLease).filter(
+            StreamLease.camera_id == key[0],
+            StreamLease.profile == key[1],
+            StreamLease.channel == key[2],
+        )
+
+    def _owner_pid_on_host(self, owner: str) -> Optional[int]:
+        """PID of a lease owner running on this host, or None if it runs elsewhere."""
+        try:
+            host, pid, _ = owner.rsplit(":", 2)
+            return int(pid) if host == self._host else None
+        except ValueError:
+            return None
+
+    def _is_live(self, lease: StreamLease, now: float) -> bool:
+        if lease.owner == self.owner:
+            return True
+        if now - lease.heartbeat_at > settings.stream_lease_timeout:
+            return False
+        if lease.handover:
+            # Its worker is gone, but the FFmpeg it left waits to be adopted
+            return True
+        pid = self._owner_pid_on_host(lease.owner)
+        if pid is not None:
+            # A restarted worker may reuse the PID of the one it replaced
+            return pid != os.getpid() and pid_alive(pid)
+        return True
+
+    def _snapshot(self, lease: StreamLease, now: Optional[float] = None) -> Lease:
+        return Lease(
+            owner=lease.owner,
+            pid=lease.pid,
+            state=lease.state,
+            stream_url=lease.stream_url,
+            error=lease.error,
+            viewers=lease.viewers or 0,
+            remote_viewers=lease.remote_viewers or 0,
+            pinned=bool(lease.pinned),
+            stop_requested=bool(lease.stop_requested),
+            handover=bool(lease.handover),
+            token=lease.token,
+            output_root=lease.output_root,
+            recording=bool(lease.recording),
+            viewer_ids=json.loads(lease.viewer_ids) if lease.viewer_ids else [],
+            accessed_at=lease.accessed_at,
+            heartbeat_at=lease.heartbeat_at,
+            live=self._is_live(lease, now or time.time()),
+        )
+
+    def _kill_orphan(self, lease: StreamLease) -> None:
+        """Stop the FFmpeg process a dead worker left behind on this host."""
+        if not (lease.pid and lease.token) or self._owner_pid_on_host(lease.owner) is None:
+            return
+        # The PID may have been reused, even by another stream's FFmpeg; only
+        # this stream's output names carry its start token
+        if not runs_command(lease.pid, "ffmpeg", f"_{lease.token}_"):
+            return
+        try:
+            os.kill(lease.pid, signal.SIGTERM)
+            print(f"[StreamRegistry] Stopped orphaned FFmpeg process {lease.pid}")
+        except OSError:
+            pass
+
+    def claim(self, key) -> Optional[Lease]:
+        """
+        Take a stream's lease unless another live worker holds it.
+
+        Returns:
+            None if this worker now runs the stream, otherwise the lease of
+            the worker that does
+        """
+        db = SessionLocal()
+        try:
+            for _ in range(3):
+                now = time.time()
+                lease = self._query(db, key).first()
+                if lease is None:
+                    db.add(StreamLease(
+                        camera_id=key[0], profile=key[1], channel=key[2],
+                        owner=self.owner, heartbeat_at=now, started_at=now,
+                    ))
+                    try:
+                        db.commit()
+                        return None
+                    except IntegrityError:
+                        # Another worker inserted it first
+                        db.rollback()
+                        continue
+                if lease.owner == self.owner:
+                    return None
+                if self._is_live(lease, now):
+                    return self._snapshot(lease, now)
+
+                self._kill_orphan(lease)
+                previous = lease.owner
+                taken = self._query(db, key).filter(
+                    StreamLease.owner == previous,
+                    StreamLease.heartbeat_at == lease.heartbeat_at,
+                ).update({
+                    "owner": self.owner, "pid": None, "state": "starting", "stream_url": None,
+                    "error": None, "viewers": 0, "remote_viewers": 0, "pinned": False, "stop_requested": False,
+                    "handover": False, "token": None, "output_root": None, "recording": False, "viewer_ids": None,
+                    "accessed_at": None, "heartbeat_at": now, "started_at": now,
+                }, synchronize_session=False)
+                db.commit()
+                if taken:
+                    print(f"[StreamRegistry] Took over stream {key[0]}/{key[1]}/{key[2]} from {previous}")
+                    return None
+                db.expire_all()
+            lease = self._query(db, key).first()
+            return self._snapshot(lease) if lease is not None else None
+        finally:
+            db.close()
+
+    def heartbeat(self, updates: Dict[Any, Dict[str, Any]]) -> Dict[Any, Optional[Lease]]:
+        """
+        Refresh this worker's leases with the current state of its streams.
+
+        Returns:
+            The updated lease per key, or None where the lease was lost to
+            another worker
+        """
+        if not updates:
+            return {}
+        now = time.time()
+        db = SessionLocal()
+        try:
+            held = [
+                key for key, values in updates.items()
+                if self._query(db, key).filter(StreamLease.owner == self.owner).update(
+                    {**values, "heartbeat_at": now}, synchronize_session=False
+                )
+            ]
+            db.commit()
+            results: Dict[Any, Optional[Lease]] = dict.fromkeys(updates)
+            for key in held:
+                lease = self._query(db, key).first()
+                results[key] = self._snapshot(lease, now) if lease is not None else None
+            return results
+        finally:
+            db.close()
+
+    def release(self, key) -> None:
+        """Drop this worker's lease on a stream it no longer runs."""
+        db = SessionLocal()
+        try:
+            self._query(db, key).filter(StreamLease.owner == self.owner).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def hand_over(self, key, values: Dict[str, Any]) -> bool:
+        """
+        Leave a running stream to the next server process on this host.
+
+        Returns:
+            False if this worker no longer held the lease
+        """
+        db = SessionLocal()
+        try:
+            handed = self._query(db, key).filter(StreamLease.owner == self.owner).update(
+                {**values, "handover": True, "heartbeat_at": time.time()}, synchronize_session=False
+            )
+            db.commit()
+            return bool(handed)
+        finally:
+            db.close()
+
+    def get_handovers(self) -> List[Tuple[Tuple[int, str, int], Lease]]:
+        """Get (key, lease) of the streams earlier server processes on this host handed over."""
+        now = time.time()
+        db = SessionLocal()
+        try:
+            leases = db.query(StreamLease).filter(StreamLease.handover == True).all()
+            return [
+                ((lease.camera_id, lease.profile, lease.channel), self._snapshot(lease, now))
+                for lease in leases
+                if lease.owner != self.owner and self._owner_pid_on_host(lease.owner) is not None
+            ]
+        finally:
+            db.close()
+
+    def adopt(self, key, lease: Lease) -> bool:
+        """
+        Take over a handed-over lease along with its running FFmpeg.
+
+        Viewers of other workers re-attach once they see the new owner, so
+        their count starts from zero.
+
+        Returns:
+            False if another worker adopted or claimed the stream first
+        """
+        db = SessionLocal()
+        try:
+            adopted = self._query(db, key).filter(
+                StreamLease.owner == lease.owner,
+                StreamLease.heartbeat_at == lease.heartbeat_at,
+            ).update({
+                "owner": self.owner, "handover": False, "remote_viewers": 0, "stop_requested": False,
+                "heartbeat_at": time.time(),
+            }, synchronize_session=False)
+            db.commit()
+            return bool(adopted)
+        finally:
+            db.close()
+
+    def end_handover(self, key, lease: Lease) -> None:
+        """Stop a handed-over FFmpeg that cannot be adopted and drop its lease."""
+        db = SessionLocal()
+        try:
+            row = self._query(db, key).filter(
+                StreamLease.owner == lease.owner, StreamLease.handover == True
+            ).first()
+            if row is not None:
+                self._kill_orphan(row)
+                db.delete(row)
+                db.commit()
+        finally:
+            db.close()
+
+    def get_all(self) -> Dict[Tuple[int, str, int], Lease]:
+        """Get every stream's lease by (camera_id, profile, channel)."""
+        now = time.time()
+        db = SessionLocal()
+        try:
+            return {
+                (lease.camera_id, lease.profile, lease.channel): self._snapshot(lease, now)
+                for lease in db.query(StreamLease).all()
+            }
+        finally:
+            db.close()
+
+    def get(self, key) -> Optional[Lease]:
+        """Get a stream's lease, whoever holds it; check ``live`` for abandoned ones."""
+        db = SessionLocal()
+        try:
+            lease = self._query(db, key).first()
+            return self._snapshot(lease) if lease is not None else None
+        finally:
+            db.close()
+
+    def _update(self, key, values: Dict[str, Any]) -> Optional[Lease]:
+        db = SessionLocal()
+        try:
+            self._query(db, key).update(values, synchronize_session=False)
+            db.commit()
+            lease = self._query(db, key).first()
+            return self._snapshot(lease) if lease is not None else None
+        finally:
+            db.close()
+
+    def attach(self, key, count: int) -> Optional[Lease]:
+        """Add (or with a negative count remove) viewers joined through this worker."""
+        return self._update(key, {"remote_viewers": StreamLease.remote_viewers + count})
+
+    def request_stop(self, key) -> None:
+        """Ask the worker running a stream to stop it."""
+        self._update(key, {"stop_requested": True})
+
+    def request_stop_all(self) -> None:
+        """Ask every other worker to stop its streams."""
+        db = SessionLocal()
+        try:
+            db.query(StreamLease).filter(StreamLease.owner != self.owner).update(
+                {"stop_requested": True}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def touch(self, key) -> None:
+        """Record an HLS fetch served for a stream another worker runs."""
+        db = SessionLocal()
+        try:
+            self._query(db, key).filter(StreamLease.owner != self.owner).update(
+                {"accessed_at": time.time()}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def get_status(self) -> Dict[str, Any]:
+        """List every lease with its owner and heartbeat age."""
+        now = time.time()
+        db = SessionLocal()
+        try:
+            leases = db.query(StreamLease).order_by(StreamLease.camera_id).all()
+            return {
+                "worker": self.owner,
+                "streams": [
+                    {
+                        "camera_id": lease.camera_id,
+                        "profile": lease.profile,
+                        "channel": lease.channel,
+                        "owner": lease.owner,
+                        "local": lease.owner == self.owner,
+                        "state": lease.state,
+                        "viewers": (lease.viewers or 0) + (lease.remote_viewers or 0),
+                        "heartbeat_age": round(now - lease.heartbeat_at, 1),
+                        "live": self._is_live(lease, now),
+                        "handover": bool(lease.handover),
+                    }
+                    for lease in leases
+                ],
+            }
+        finally:
+            db.close()
+
+
+# Global stream registry instance
+stream_registry = StreamRegistry()
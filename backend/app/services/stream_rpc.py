@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class StreamWorkerError(RuntimeError):
+    """The stream worker could not be reached or failed a call."""
+
+
+# One JSON request line per connection, answered with one JSON line
+_LINE_LIMIT = 1024 * 1024
+
+
+class StreamWorkerClient:
+    """
+    Calls the standalone stream worker (``python -m app.stream_worker``)
+    over its Unix socket.
+
+    Every call opens its own connection, so the API keeps working across
+    worker restarts and never shares a stream between concurrent calls.
+    """
+
+    def __init__(self, socket_path: Path):
+        self.socket_path = socket_path
+
+    async def call(self, method: str, timeout: float = 10.0, **params: Any) -> Any:
+        """
+        Invoke a stream worker method and return its result.
+
+        Raises:
+            StreamWorkerError: If the worker is down, times out or fails
+        """
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_unix_connection(str(self.socket_path), limit=_LINE_LIMIT), timeout=timeout
+            )
+            writer.write(json.dumps({"method": method, "params": params}).encode() + b"\n")
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), timeout=timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise StreamWorkerError(f"Stream worker is not reachable: {e or 'timed out'}") from e
+        finally:
+            if writer is not None:
+                writer.close()
+        if not line:
+            raise StreamWorkerError("Stream worker closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise StreamWorkerError(response["error"])
+        return response.get("result")
+
+
+async def serve(
+    socket_path: Path,
+    handlers: Dict[str, Callable[..., Awaitable[Any]]],
+) -> asyncio.AbstractServer:
+    """
+    Answer stream worker calls on a Unix socket.
+
+    The socket is only accessible to the owning user, since calls carry
+    camera RTSP URLs with credentials.
+    """
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            line = await reader.readline()
+            if not line:
+                return
+            try:
+                request = json.loads(line)
+                handler: Optional[Callable[..., Awaitable[Any]]] = handlers.get(request.get("method"))
+                if handler is None:
+                    response = {"error": f"Unknown method: {request.get('method')}"}
+                else:
+                    response = {"result": await handler(**request.get("params", {}))}
+            except Exception as e:
+                response = {"error": f"{type(e).__name__}: {e}"}
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    # A stale socket from a crashed worker would make bind fail
+    socket_path.unlink(missing_ok=True)
+    # Bind under a restrictive umask so the socket is never reachable by
+    # other users, not even between bind and chmod
+    umask = os.umask(0o077)
+    try:
+        server = await asyncio.start_unix_server(handle, path=str(socket_path), limit=_LINE_LIMIT)
+    finally:
+        os.umask(umask)
+    os.chmod(socket_path, 0o600)
+    return server
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.camera import Camera
+from .motion_detector import motion_detector
+from .stream_manager import StreamKey, stream_manager
+
+
+def stream_rtsp_url(key: StreamKey) -> Optional[str]:
+    """Get the RTSP URL a stream is started from, or None if its camera is gone or inactive."""
+    db = SessionLocal()
+    try:
+        camera = db.query(Camera).filter(Camera.id == key.camera_id, Camera.is_active == True).first()
+        if camera is None or not (camera.username and camera.password):
+            return None
+        # The low ABR rendition is transcoded from the substream
+        profile = "sub" if key.profile == stream_manager.LOW_PROFILE else key.profile
+        return camera.profile_rtsp_url(profile, key.channel)
+    except ValueError:
+        return None
+    finally:
+        db.close()
+
+
+async def start_pinned_streams(detect_motion: bool = True) -> None:
+    """
+    Start always-on and recorded camera streams, and motion detectors, in the background.
+
+    Args:
+        detect_motion: Also start motion detectors; they run in the API
+            process, which reconfigures them as cameras are edited
+    """
+    db = SessionLocal()
+    try:
+        cameras = db.query(Camera).filter(
+            (Camera.always_on == True) | (Camera.record == True), Camera.is_active == True
+        ).all()
+        recording = {camera.id: bool(camera.record) for camera in cameras}
+        targets = [
+            (StreamKey(camera.id, profile), camera.profile_rtsp_url(profile))
+            for camera in cameras
+            for profile in camera.pinned_profiles(stream_manager.GRID_PROFILE)
+        ]
+        detectors = []
+        if detect_motion:
+            detected = db.query(Camera).filter(Camera.motion_detection == True, Camera.is_active == True).all()
+            detectors = [
+                (camera.id, camera.profile_rtsp_url("sub"))
+                for camera in detected
+                if camera.username and camera.password
+            ]
+    finally:
+        db.close()
+
+    for camera_id, enabled in recording.items():
+        await stream_manager.set_recording(camera_id, enabled)
+    for camera_id, rtsp_url in detectors:
+        await motion_detector.configure(camera_id, rtsp_url)
+
+    if targets:
+        print(f"Pre-warming {len(targets)} pinned camera stream(s)")
+        await stream_manager.pin_streams(targets, concurrency=settings.stream_start_concurrency)
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import settings
+from .recorder import recorder
+from .stream_manager import StreamKey, stream_manager
+
+
+class Thumbnail:
+    """A cached camera thumbnail."""
+
+    def __init__(self, data: bytes, source: str):
+        self.data = data
+        self.source = source
+        self.created = time.time()
+        self.etag = f'"{hashlib.sha1(data).hexdigest()[:16]}"'
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.created
+
+
+class ThumbnailWorker:
+    """
+    Keep a small JPEG per camera for the camera list.
+
+    Thumbnails are cut from the newest segment a camera already produced:
+    its running stream's latest HLS segment, or else the latest segment of
+    its recording. FFmpeg only decodes keyframes (``-skip_frame nokey``)
+    and stops after the first one, so no RTSP session is opened and a
+    refresh costs a single intra-frame decode. A background task refreshes
+    streaming cameras every ``thumbnail_interval``; others are extracted on
+    request. Entries live in an LRU of ``thumbnail_cache_size`` cameras and
+    are served for up to ``thumbnail_ttl`` seconds.
+    """
+
+    def __init__(self):
+        self._cache: "OrderedDict[int, Thumbnail]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None  # Created on the event loop
+        self._failures = 0
+
+    def start(self) -> None:
+        """Start refreshing thumbnails in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.thumbnail_interval)
+            try:
+                camera_ids = {key.camera_id for key in stream_manager.get_active_streams()}
+                for camera_id in sorted(camera_ids):
+                    cached = self._cache.get(camera_id)
+                    if cached is None or cached.age >= settings.thumbnail_interval:
+                        await self.refresh(camera_id)
+            except Exception as e:
+                print(f"[ThumbnailWorker] Refresh error: {e}")
+
+    @staticmethod
+    def _newest_segment(camera_id: int) -> Optional[Tuple[bytes, str]]:
+        """Get (segment bytes, source label) of a camera's newest segment."""
+        # The substream is cheaper to decode and plenty for a thumbnail
+        for profile in ("sub", "main"):
+            key = StreamKey(camera_id, profile)
+            for _, _, filename in reversed(stream_manager.get_recent_segments(key)):
+                data = stream_manager.read_segment(key, filename)
+                if data:
+                    return data, f"live/{profile}"
+        path = recorder.get_latest_segment_path(camera_id)
+        if path is not None:
+            try:
+                return path.read_bytes(), "recording"
+            except OSError:
+                pass
+        return None
+
+    async def refresh(self, camera_id: int) -> Optional[Thumbnail]:
+        """Extract a fresh thumbnail for a camera, or None if it has no segments."""
+        segment = self._newest_segment(camera_id)
+        if segment is None:
+            return None
+        data, source = segment
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(2)
+        async with self._semaphore:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    "ffmpeg", "-hide_banner", "-nostats", "-loglevel", "error",
+                    "-skip_frame", "nokey",
+                    "-i", "pipe:0",
+                    "-frames:v", "1",
+                    "-vf", f"scale={settings.thumbnail_width}:-2",
+                    "-q:v", str(settings.snapshot_quality),
+                    "-f", "image2pipe",
+                    "-c:v", "mjpeg",
+                    "pipe:1",
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL,
+                )
+                jpeg, _ = await asyncio.wait_for(process.communicate(data), timeout=10)
+            except FileNotFoundError:
+                return None
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                jpeg = b""
+
+        if not jpeg:
+            self._failures += 1
+            return None
+        thumbnail = Thumbnail(jpeg, source)
+        self._cache[camera_id] = thumbnail
+        self._cache.move_to_end(camera_id)
+        while len(self._cache) > settings.thumbnail_cache_size:
+            self._cache.popitem(last=False)
+        return thumbnail
+
+    async def get(self, camera_id: int) -> Optional[Thumbnail]:
+        """Get a camera's thumbnail, extracting one if the cached copy expired."""
+        cached = self._cache.get(camera_id)
+        if cached is not None and cached.age < settings.thumbnail_ttl:
+            self._cache.move_to_end(camera_id)
+            return cached
+        self._cache.pop(camera_id, None)
+        return await self.refresh(camera_id)
+
+    def discard(self, camera_id: int) -> None:
+        self._cache.pop(camera_id, None)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get cache occupancy and thumbnail ages."""
+        return {
+            "cached": len(self._cache),
+            "failures": self._failures,
+            "ages": {camera_id: round(thumbnail.age, 1) for camera_id, thumbnail in self._cache.items()},
+        }
+
+
+# Global thumbnail worker instance
+thumbnail_worker = ThumbnailWorker()
@@ -0,0 +1,137 @@
+"""
+Standalone stream worker: runs every FFmpeg stream outside the API server.
+
+    STREAM_WORKER_SOCKET=/run/jarvis/streams.sock python -m app.stream_worker
+
+With STREAM_WORKER_SOCKET also set for the API, API processes forward
+stream starts and stops to this worker over the Unix socket and read stream
+state from the shared stream registry, so API reloads, crashes and extra
+API workers leave running streams alone. The API serves the HLS files
+straight from the worker's disk or tmpfs output.
+"""
+import argparse
+import asyncio
+import signal
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+from .database import init_db
+from .services.recorder import recorder
+from .services.stream_manager import StreamKey, stream_manager
+from .services.stream_registry import stream_registry
+from .services.stream_rpc import serve
+from .services.stream_targets import start_pinned_streams, stream_rtsp_url
+
+
+async def _start_stream(key: List[Any], rtsp_url: str, wait: bool = True, viewer_id: Optional[str] = None):
+    return await stream_manager.start_stream(StreamKey(*key), rtsp_url, wait=wait, viewer_id=viewer_id)
+
+
+async def _pin_stream(key: List[Any], rtsp_url: str, wait: bool = True):
+    return await stream_manager.pin_stream(StreamKey(*key), rtsp_url, wait=wait)
+
+
+async def _unpin_stream(key: List[Any]) -> None:
+    await stream_manager.unpin_stream(StreamKey(*key))
+
+
+async def _release_viewer(key: List[Any], viewer_id: Optional[str] = None) -> int:
+    return await stream_manager.release_viewer(StreamKey(*key), viewer_id)
+
+
+async def _stop_stream(key: List[Any]) -> bool:
+    return await stream_manager.stop_stream(StreamKey(*key))
+
+
+async def _stop_camera(camera_id: int) -> None:
+    await stream_manager.stop_camera(camera_id)
+
+
+async def _stop_all_streams(everywhere: bool = False) -> None:
+    await stream_manager.stop_all_streams(everywhere=everywhere)
+
+
+async def _set_recording(camera_id: int, enabled: bool) -> None:
+    await stream_manager.set_recording(camera_id, enabled)
+
+
+async def _acquire_session(name: str, key: List[Any], decode: bool = False, pid: Optional[int] = None) -> Optional[str]:
+    return await stream_manager.acquire_session(name, StreamKey(*key), decode=decode, pid=pid)
+
+
+async def _release_session(name: str, pid: Optional[int] = None) -> None:
+    await stream_manager.release_session(name, pid=pid)
+
+
+async def _status() -> Dict[str, Any]:
+    return {
+        "worker": stream_registry.owner,
+        "active_streams": [str(key) for key in stream_manager.get_active_streams()],
+        "budget": stream_manager.get_budget_status(),
+        "startup": stream_manager.get_startup_status(),
+        "reaper": stream_manager.get_reaper_status(),
+        "storage": stream_manager.get_storage_status(),
+        "recordings": recorder.get_status(),
+    }
+
+
+HANDLERS = {
+    "start_stream": _start_stream,
+    "pin_stream": _pin_stream,
+    "unpin_stream": _unpin_stream,
+    "release_viewer": _release_viewer,
+    "stop_stream": _stop_stream,
+    "stop_camera": _stop_camera,
+    "stop_all_streams": _stop_all_streams,
+    "set_recording": _set_recording,
+    "acquire_session": _acquire_session,
+    "release_session": _release_session,
+    "status": _status,
+}
+
+
+async def run(socket_path: Path) -> None:
+    """Serve stream calls until SIGINT or SIGTERM, then stop (or hand over) every stream."""
+    init_db()
+    # This is the process the API forwards to
+    stream_manager.run_locally()
+    adopted = await stream_manager.adopt_streams(stream_rtsp_url)
+    if adopted:
+        print(f"Adopted {adopted} running stream(s) from the previous stream worker")
+    server = await serve(socket_path, HANDLERS)
+    print(f"Stream worker listening on {socket_path}")
+    print(f"HLS streams will be saved to: {', '.join(str(root) for root in stream_manager.storage_roots)}")
+    stream_manager.start_housekeeping()
+    # Motion detectors stay in the API process, which configures them
+    pinned_startup = asyncio.create_task(start_pinned_streams(detect_motion=False))
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    await stopping.wait()
+
+    pinned_startup.cancel()
+    server.close()
+    await server.wait_closed()
+    await stream_manager.stop_housekeeping()
+    if settings.stream_handover:
+        print("Handing over running streams...")
+        await stream_manager.hand_over()
+    else:
+        print("Stopping all streams...")
+        await stream_manager.stop_all_streams()
+    socket_path.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run camera streams outside the API server")
+    parser.add_argument("--socket", type=Path, default=settings.stream_worker_socket,
+                        help="Unix socket to listen on (default: STREAM_WORKER_SOCKET)")
+    args = parser.parse_args()
+    if args.socket is None:
+        parser.exit(2, "Set STREAM_WORKER_SOCKET or pass --socket\n")
+    if settings.hls_storage == "memory":
+        parser.exit(2, "HLS_STORAGE=memory keeps segments inside the API process; use auto, ram or disk\n")
+    asyncio.run(run(args.socket))
@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Keep importing the app from touching the checkout: settings create the HLS
+# directory on import and the services resolve their paths from settings
+_ROOT = Path(tempfile.mkdtemp(prefix="jarvis-tests-"))
+os.environ["HLS_OUTPUT_DIR"] = str(_ROOT / "streams")
+os.environ["RECORDING_DIR"] = str(_ROOT / "recordings")
+os.environ["CLIP_DIR"] = str(_ROOT / "clips")
+os.environ["DATABASE_URL"] = f"sqlite:///{_ROOT / 'jarvis.db'}"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
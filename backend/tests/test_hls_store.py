@@ -0,0 +1,171 @@
+import asyncio
+import struct
+
+import pytest
+
+from app.services.hls_store import INIT_SEGMENT_NAME, HLSMemoryStore, starts_with_keyframe
+
+
+def _box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def _fragment(keyframe: bool) -> bytes:
+    """A moof whose trun carries the first sample's flags."""
+    first_sample_flags = 0x02000000 if keyframe else 0x01010000
+    trun = _box(b"trun", struct.pack(">III", 0x000004, 1, first_sample_flags))
+    tfhd = _box(b"tfhd", struct.pack(">II", 0x020000, 1))
+    return _box(b"moof", _box(b"traf", tfhd + trun)) + _box(b"mdat", b"frame")
+
+
+def _playlist(*parts, duration: float = 0.33334) -> bytes:
+    lines = ["#EXTM3U", "#EXT-X-TARGETDURATION:1"]
+    for name in parts:
+        lines += [f"#EXTINF:{duration},", name]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def test_starts_with_keyframe():
+    assert starts_with_keyframe(_fragment(keyframe=True))
+    assert not starts_with_keyframe(_fragment(keyframe=False))
+    assert not starts_with_keyframe(b"not an mp4 fragment")
+    assert not starts_with_keyframe(_box(b"mdat", b"frame"))
+
+
+def test_put_requires_token():
+    store = HLSMemoryStore(max_segments=3, max_bytes=1024)
+    token = store.open("camera_1")
+    assert not store.put("camera_1", "wrong", "stream.m3u8", b"#EXTM3U")
+    assert not store.put("camera_2", token, "stream.m3u8", b"#EXTM3U")
+    assert store.put("camera_1", token, "stream.m3u8", b"#EXTM3U")
+    assert store.get("camera_1", "stream.m3u8") == b"#EXTM3U"
+
+
+def test_reopen_replaces_buffer():
+    store = HLSMemoryStore(max_segments=3, max_bytes=1024)
+    old = store.open("camera_1")
+    store.put("camera_1", old, "segment_000.ts", b"old")
+    new = store.open("camera_1")
+    assert not store.put("camera_1", old, "segment_001.ts", b"late")
+    assert store.get("camera_1", "segment_000.ts") is None
+    assert store.put("camera_1", new, "segment_001.ts", b"new")
+    store.close("camera_1")
+    assert not store.has_stream("camera_1")
+
+
+def test_segments_ring_evicts_oldest():
+    store = HLSMemoryStore(max_segments=2, max_bytes=1024)
+    token = store.open("camera_1")
+    for number in range(3):
+        store.put("camera_1", token, f"segment_{number:03d}.ts", b"x" * 10)
+    assert store.get("camera_1", "segment_000.ts") is None
+    assert store.get("camera_1", "segment_002.ts") == b"x" * 10
+    assert store.get_stats()["camera_1"]["bytes"] == 20
+
+
+def test_segments_ring_keeps_newest_over_byte_limit():
+    store = HLSMemoryStore(max_segments=5, max_bytes=15)
+    token = store.open("camera_1")
+    store.put("camera_1", token, "segment_000.ts", b"x" * 10)
+    store.put("camera_1", token, "segment_001.ts", b"y" * 20)
+    assert store.get("camera_1", "segment_000.ts") is None
+    assert store.get("camera_1", "segment_001.ts") == b"y" * 20
+
+
+def test_segment_rewrite_is_counted_once():
+    store = HLSMemoryStore(max_segments=5, max_bytes=1024)
+    token = store.open("camera_1")
+    store.put("camera_1", token, "segment_000.ts", b"x" * 10)
+    store.put("camera_1", token, "segment_000.ts", b"x" * 4)
+    assert store.get_stats()["camera_1"]["bytes"] == 4
+
+
+@pytest.fixture
+def low_latency():
+    store = HLSMemoryStore(max_segments=2, max_bytes=1024)
+    token = store.open("camera_1", low_latency=True, part_target=0.333, parts_per_segment=3)
+
+    def upload(filename: str, data: bytes) -> None:
+        assert store.put("camera_1", token, filename, data)
+
+    return store, upload
+
+
+def test_low_latency_publishes_listed_fragments(low_latency):
+    store, upload = low_latency
+    upload(INIT_SEGMENT_NAME, b"init")
+    upload("f0.m4s", _fragment(keyframe=True))
+    upload("f1.m4s", _fragment(keyframe=False))
+    assert store.get("camera_1", "stream.m3u8") is None
+
+    upload("stream.m3u8", _playlist("f0.m4s"))
+    assert store.get("camera_1", INIT_SEGMENT_NAME) == b"init"
+    assert store.get("camera_1", "p0.0.m4s") == _fragment(keyframe=True)
+    assert store.get("camera_1", "p0.1.m4s") is None
+
+    playlist = store.get("camera_1", "stream.m3u8").decode()
+    assert "#EXT-X-PART-INF:PART-TARGET=0.33334" in playlist
+    assert 'URI="p0.0.m4s",INDEPENDENT=YES' in playlist
+    assert '#EXT-X-PRELOAD-HINT:TYPE=PART,URI="p0.1.m4s"' in playlist
+
+
+def test_low_latency_groups_parts_into_segments(low_latency):
+    store, upload = low_latency
+    names = [f"f{number}.m4s" for number in range(4)]
+    for name in names:
+        upload(name, name.encode())
+    upload("stream.m3u8", _playlist(*names))
+
+    assert store.get("camera_1", "s0.m4s") == b"f0.m4sf1.m4sf2.m4s"
+    # The second segment is still incomplete
+    assert store.get("camera_1", "s1.m4s") is None
+    assert store.get("camera_1", "p1.0.m4s") == b"f3.m4s"
+    playlist = store.get("camera_1", "stream.m3u8").decode()
+    assert "#EXT-X-MEDIA-SEQUENCE:0" in playlist
+    assert "s0.m4s" in playlist and "s1.m4s" not in playlist
+    assert '#EXT-X-PRELOAD-HINT:TYPE=PART,URI="p1.1.m4s"' in playlist
+
+
+def test_low_latency_drops_whole_segments(low_latency):
+    store, upload = low_latency
+    names = [f"f{number}.m4s" for number in range(7)]
+    for name in names:
+        upload(name, name.encode())
+        upload("stream.m3u8", _playlist(name))
+
+    # Two segments of three parts are kept, so the first segment went
+    assert store.get("camera_1", "p0.0.m4s") is None
+    assert store.get("camera_1", "s0.m4s") is None
+    assert store.get("camera_1", "p1.0.m4s") == b"f3.m4s"
+    assert store.get("camera_1", "p2.0.m4s") == b"f6.m4s"
+    assert "#EXT-X-MEDIA-SEQUENCE:1" in store.get("camera_1", "stream.m3u8").decode()
+
+
+def test_low_latency_drops_fragments_never_listed(low_latency):
+    store, upload = low_latency
+    upload("f0.m4s", b"lost")
+    upload("f1.m4s", b"kept")
+    upload("stream.m3u8", _playlist("f1.m4s"))
+    assert store.get("camera_1", "p0.0.m4s") == b"kept"
+    assert store.get_stats()["camera_1"]["pending"] == 0
+
+
+def test_low_latency_blocking_reload(low_latency):
+    store, upload = low_latency
+
+    async def scenario():
+        # More than two segments ahead of the next part is rejected
+        assert await store.wait_until_available("camera_1", "stream.m3u8", msn=3, part=0) == "invalid"
+        assert await store.wait_until_available("camera_1", "stream.m3u8", msn=0, part=0, timeout=0.01) == "timeout"
+        # Requests that cannot block are answered straight away
+        assert await store.wait_until_available("camera_1", "stream.m3u8") == "ready"
+
+        waiter = asyncio.ensure_future(store.wait_until_available("camera_1", "p0.0.m4s", timeout=1.0))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        upload("f0.m4s", b"part")
+        upload("stream.m3u8", _playlist("f0.m4s"))
+        assert await waiter == "ready"
+        assert store.get_stats()["camera_1"]["requests"]["blocked"] == 2
+
+    asyncio.run(scenario())
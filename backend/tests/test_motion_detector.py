@@ -0,0 +1,71 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.services.motion_detector import MotionAnalyzer  # noqa: E402
+
+WIDTH, HEIGHT = 64, 32
+
+
+def _frame(value: int = 100, box=None, box_value: int = 200) -> bytes:
+    frame = np.full((HEIGHT, WIDTH), value, dtype=np.uint8)
+    if box is not None:
+        x, y, width, height = box
+        frame[y:y + height, x:x + width] = box_value
+    return frame.tobytes()
+
+
+@pytest.fixture
+def analyzer():
+    return MotionAnalyzer(WIDTH, HEIGHT, pixel_threshold=25, alpha=0.05, block=8)
+
+
+def test_first_frame_sets_background(analyzer):
+    assert analyzer.frame_size == WIDTH * HEIGHT
+    assert analyzer.analyze(_frame(box=(0, 0, 64, 32))) == (0.0, None)
+
+
+def test_static_scene_has_no_motion(analyzer):
+    analyzer.analyze(_frame())
+    assert analyzer.analyze(_frame()) == (0.0, None)
+
+
+def test_changes_below_threshold_are_noise(analyzer):
+    analyzer.analyze(_frame(100))
+    assert analyzer.analyze(_frame(120)) == (0.0, None)
+
+
+def test_moving_region_is_boxed_on_cells(analyzer):
+    analyzer.analyze(_frame())
+    fraction, box = analyzer.analyze(_frame(box=(16, 8, 16, 16)))
+    # 2x2 of the 8x4 cells
+    assert fraction == 4 / 32
+    assert box == (16, 8, 16, 16)
+
+
+def test_box_covers_cells_partly_changed(analyzer):
+    analyzer.analyze(_frame())
+    # 4x4 pixels is exactly a quarter of a cell, 3x3 is not enough
+    fraction, box = analyzer.analyze(_frame(box=(4, 4, 4, 4)))
+    assert (fraction, box) == (1 / 32, (0, 0, 8, 8))
+    analyzer.analyze(_frame())
+    assert analyzer.analyze(_frame(box=(44, 20, 3, 3))) == (0.0, None)
+
+
+def test_box_spans_separate_regions(analyzer):
+    analyzer.analyze(_frame())
+    frame = np.frombuffer(_frame(box=(0, 0, 8, 8)), dtype=np.uint8).copy().reshape(HEIGHT, WIDTH)
+    frame[24:32, 56:64] = 200
+    fraction, box = analyzer.analyze(frame.tobytes())
+    assert fraction == 2 / 32
+    assert box == (0, 0, 64, 32)
+
+
+def test_background_adapts_to_lasting_change():
+    analyzer = MotionAnalyzer(WIDTH, HEIGHT, pixel_threshold=25, alpha=0.5, block=8)
+    analyzer.analyze(_frame(100))
+    changed = _frame(200)
+    assert analyzer.analyze(changed)[0] == 1.0
+    for _ in range(5):
+        result = analyzer.analyze(changed)
+    assert result == (0.0, None)
@@ -0,0 +1,139 @@
+import time
+
+from app.services.recorder import INDEX_FILENAME, PENDING_PREFIX, RecordingIndex
+
+
+def _append(index: RecordingIndex, start_ms: int, duration_ms: int = 2000, size: int = 100) -> None:
+    pending = index.directory / f"{PENDING_PREFIX}1_{start_ms}.ts"
+    pending.write_bytes(b"x" * size)
+    index.append(pending, start_ms, duration_ms)
+
+
+def test_append_moves_and_indexes_segment(tmp_path):
+    index = RecordingIndex(tmp_path)
+    _append(index, 1000, size=10)
+    _append(index, 3000, size=20)
+
+    assert list(index.starts) == [1000, 3000]
+    assert list(index.durations) == [2000, 2000]
+    assert list(index.sizes) == [10, 20]
+    assert index.total_bytes == 30
+    assert index.segment_path(3000).read_bytes() == b"x" * 20
+    assert not list(tmp_path.glob(f"{PENDING_PREFIX}*"))
+
+
+def test_append_keeps_index_sorted(tmp_path):
+    index = RecordingIndex(tmp_path)
+    _append(index, 5000)
+    # The wall clock stepped back
+    _append(index, 4000)
+    assert list(index.starts) == [5000, 5001]
+    assert index.segment_path(5001).exists()
+
+
+def test_append_skips_missing_segment(tmp_path):
+    index = RecordingIndex(tmp_path)
+    index.append(tmp_path / "pending_1_gone.ts", 1000, 2000)
+    assert not index.starts
+
+
+def test_index_reloads_from_disk(tmp_path):
+    index = RecordingIndex(tmp_path)
+    for start in (1000, 3000, 5000):
+        _append(index, start)
+
+    reloaded = RecordingIndex(tmp_path)
+    assert list(reloaded.starts) == [1000, 3000, 5000]
+    assert reloaded.total_bytes == 300
+
+
+def test_refresh_follows_another_writer(tmp_path):
+    writer = RecordingIndex(tmp_path)
+    reader = RecordingIndex(tmp_path)
+    _append(writer, 1000)
+    assert not reader.starts
+    reader.refresh()
+    assert list(reader.starts) == [1000]
+
+
+def test_find_returns_overlapping_segments(tmp_path):
+    index = RecordingIndex(tmp_path)
+    for start in (0, 2000, 4000, 6000):
+        _append(index, start)
+
+    # The segment in progress at the start of the range is included
+    assert index.find(2500, 5000) == [(2000, 2000), (4000, 2000)]
+    assert index.find(4000, 4001) == [(4000, 2000)]
+    assert index.find(0, 100_000) == [(0, 2000), (2000, 2000), (4000, 2000), (6000, 2000)]
+    assert index.find(8000, 9000) == []
+    assert RecordingIndex(tmp_path / "empty").find(0, 1000) == []
+
+
+def test_find_skips_gaps(tmp_path):
+    index = RecordingIndex(tmp_path)
+    _append(index, 0, duration_ms=1000)
+    _append(index, 5000)
+    assert index.find(2000, 4000) == []
+
+
+def test_contains(tmp_path):
+    index = RecordingIndex(tmp_path)
+    _append(index, 1000)
+    _append(index, 3000)
+    assert index.contains(3000)
+    assert not index.contains(2000)
+    assert not index.contains(4000)
+
+
+def test_retention_by_size(tmp_path):
+    index = RecordingIndex(tmp_path)
+    for start in (1000, 3000, 5000, 7000):
+        _append(index, start, size=100)
+
+    assert index.enforce_retention(max_age_ms=0, max_bytes=250) == 2
+    assert list(index.starts) == [5000, 7000]
+    assert index.total_bytes == 200
+    assert not index.segment_path(1000).exists()
+    assert not index.segment_path(3000).exists()
+    assert index.segment_path(5000).exists()
+    assert list(RecordingIndex(tmp_path).starts) == [5000, 7000]
+
+
+def test_retention_by_age(tmp_path):
+    index = RecordingIndex(tmp_path)
+    now_ms = int(time.time() * 1000)
+    _append(index, now_ms - 120_000)
+    _append(index, now_ms - 30_000)
+
+    assert index.enforce_retention(max_age_ms=60_000, max_bytes=0) == 1
+    assert list(index.starts) == [now_ms - 30_000]
+    assert index.enforce_retention(max_age_ms=60_000, max_bytes=0) == 0
+
+
+def test_torn_record_is_ignored_and_repaired(tmp_path):
+    index = RecordingIndex(tmp_path)
+    _append(index, 1000)
+    with open(tmp_path / INDEX_FILENAME, "ab") as f:
+        f.write(b"\x01\x02\x03")
+
+    reloaded = RecordingIndex(tmp_path)
+    assert list(reloaded.starts) == [1000]
+    reloaded.prepare()
+    assert (tmp_path / INDEX_FILENAME).stat().st_size == RecordingIndex.RECORD.size
+
+
+def test_prepare_drops_unfinished_segments(tmp_path):
+    (tmp_path / f"{PENDING_PREFIX}7_000.ts").write_bytes(b"partial")
+    index = RecordingIndex(tmp_path)
+    index.prepare()
+    assert not list(tmp_path.glob(f"{PENDING_PREFIX}*"))
+
+
+def test_adopt_keeps_writer_segments(tmp_path):
+    for name in ("7_001.ts", "7_000.ts", "8_000.ts"):
+        (tmp_path / f"{PENDING_PREFIX}{name}").write_bytes(b"data")
+    index = RecordingIndex(tmp_path)
+    assert [path.name for path in index.adopt(7)] == [f"{PENDING_PREFIX}7_000.ts", f"{PENDING_PREFIX}7_001.ts"]
+    # Adopting counts as prepared, so nothing is deleted afterwards
+    index.prepare()
+    assert len(list(tmp_path.glob(f"{PENDING_PREFIX}*"))) == 3
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.stream_admission import StreamAdmission
+
+
+@pytest.fixture(autouse=True)
+def budgets(monkeypatch):
+    monkeypatch.setattr(settings, "stream_max_processes", 2)
+    monkeypatch.setattr(settings, "stream_cpu_budget", 0.0)
+    monkeypatch.setattr(settings, "stream_bandwidth_budget_kbps", 0)
+    monkeypatch.setattr(settings, "stream_admission_policy", "reject")
+    monkeypatch.setattr(settings, "stream_admission_timeout", 1.0)
+
+
+def _admission(running: dict, victims: list = ()) -> StreamAdmission:
+    victims = list(victims)
+
+    async def evict(key):
+        if not victims:
+            return False
+        del running[victims.pop(0)]
+        return True
+
+    return StreamAdmission(running=lambda: dict(running), evict=evict)
+
+
+def test_admit_reserves_until_released():
+    admission = _admission({"a": (0.1, 1000)})
+    assert asyncio.run(admission.admit("b", (0.1, 1000))) is None
+    assert admission.is_reserved("b")
+    assert admission.usage() == (2, pytest.approx(0.2), 2000)
+
+    error = asyncio.run(admission.admit("c", (0.1, 1000)))
+    assert error.startswith(StreamAdmission.BUDGET_ERROR)
+    admission.release_reservation("b")
+    assert asyncio.run(admission.admit("c", (0.1, 1000))) is None
+    assert admission.get_status()["rejected"] == 1
+
+
+def test_restart_replaces_own_process():
+    admission = _admission({"a": (0.1, 1000), "b": (0.1, 1000)})
+    assert asyncio.run(admission.admit("a", (0.1, 1000))) is None
+
+
+def test_cpu_and_bandwidth_budgets(monkeypatch):
+    monkeypatch.setattr(settings, "stream_max_processes", 0)
+    monkeypatch.setattr(settings, "stream_cpu_budget", 1.0)
+    monkeypatch.setattr(settings, "stream_bandwidth_budget_kbps", 5000)
+    admission = _admission({"a": (0.5, 3000)})
+    assert admission.fits((0.5, 2000))
+    assert not admission.fits((0.6, 1000))
+    assert not admission.fits((0.1, 2001))
+
+
+def test_evict_policy(monkeypatch):
+    monkeypatch.setattr(settings, "stream_admission_policy", "evict")
+    running = {"a": (0.1, 1000), "b": (0.1, 1000)}
+    admission = _admission(running, victims=["a"])
+    assert asyncio.run(admission.admit("c", (0.1, 1000))) is None
+    assert "a" not in running
+    # Nothing left that may be evicted
+    assert asyncio.run(admission.admit("d", (0.1, 1000))).startswith(StreamAdmission.BUDGET_ERROR)
+    assert admission.get_status()["evicted"] == 1
+
+
+def test_queue_policy_waits_for_capacity(monkeypatch):
+    monkeypatch.setattr(settings, "stream_admission_policy", "queue")
+    running = {"a": (0.1, 1000), "b": (0.1, 1000)}
+    admission = _admission(running)
+
+    async def scenario():
+        waiter = asyncio.ensure_future(admission.admit("c", (0.1, 1000)))
+        await asyncio.sleep(0.01)
+        assert admission.get_status()["queued"] == 1
+        del running["a"]
+        admission.notify_capacity()
+        assert await waiter is None
+
+    asyncio.run(scenario())
+
+
+def test_queue_policy_times_out(monkeypatch):
+    monkeypatch.setattr(settings, "stream_admission_policy", "queue")
+    monkeypatch.setattr(settings, "stream_admission_timeout", 0.01)
+    admission = _admission({"a": (0.1, 1000), "b": (0.1, 1000)})
+    assert asyncio.run(admission.admit("c", (0.1, 1000))).startswith(StreamAdmission.BUDGET_ERROR)
+
+
+def test_sessions_count_against_budget():
+    admission = _admission({"a": (0.1, 1000)})
+    assert asyncio.run(admission.acquire_session(1, "relay:a", "a", (0.05, 0))) is None
+    # The same session is only counted once
+    assert asyncio.run(admission.acquire_session(1, "relay:a", "a", (0.05, 0))) is None
+    assert admission.get_status()["sessions"] == 1
+    assert asyncio.run(admission.admit("b", (0.1, 1000))).startswith(StreamAdmission.BUDGET_ERROR)
+    admission.release_session(1, "relay:a")
+    assert asyncio.run(admission.admit("b", (0.1, 1000))) is None
+
+
+def test_orphaned_sessions_are_dropped(monkeypatch):
+    monkeypatch.setattr("app.services.stream_admission.pid_alive", lambda pid: pid != 4242)
+    admission = _admission({})
+    asyncio.run(admission.acquire_session(4242, "motion:1", "a", (0.25, 0)))
+    asyncio.run(admission.acquire_session(4243, "motion:2", "b", (0.25, 0)))
+    assert admission.drop_orphaned_sessions() == 1
+    assert admission.get_status()["sessions"] == 1
@@ -0,0 +1,43 @@
+import pytest
+
+from app.config import settings
+from app.services.stream_manager import restart_backoff
+
+
+@pytest.fixture(autouse=True)
+def backoff_settings(monkeypatch):
+    monkeypatch.setattr(settings, "stream_restart_base_delay", 2.0)
+    monkeypatch.setattr(settings, "stream_restart_max_delay", 60.0)
+    monkeypatch.setattr(settings, "stream_restart_max_failures", 5)
+    monkeypatch.setattr(settings, "stream_circuit_cooldown", 300.0)
+
+
+@pytest.mark.parametrize("failures, ceiling", [(1, 2.0), (2, 4.0), (3, 8.0), (4, 16.0)])
+def test_restart_backoff_doubles_with_jitter(failures, ceiling):
+    for _ in range(50):
+        delay, why = restart_backoff(failures, "Connection refused")
+        assert why is None
+        assert ceiling / 2 <= delay <= ceiling
+
+
+def test_restart_backoff_is_capped(monkeypatch):
+    monkeypatch.setattr(settings, "stream_restart_max_failures", 20)
+    for _ in range(50):
+        delay, why = restart_backoff(10, "Connection timed out")
+        assert why is None
+        assert 30.0 <= delay <= 60.0
+
+
+def test_restart_backoff_opens_circuit_after_max_failures():
+    assert restart_backoff(5, "Connection refused") == (300.0, "5 consecutive failures")
+    assert restart_backoff(7, "") == (300.0, "7 consecutive failures")
+
+
+@pytest.mark.parametrize("reason", [
+    "method DESCRIBE failed: 401 Unauthorized",
+    "Server returned 401 Unauthorized (authorization failed)",
+    "UNAUTHORIZED",
+])
+def test_restart_backoff_opens_circuit_on_auth_failure(reason):
+    # Even the first failure, so repeated logins cannot lock the account
+    assert restart_backoff(1, reason) == (300.0, "authentication failure")
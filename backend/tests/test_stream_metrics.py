@@ -0,0 +1,117 @@
+import time
+
+from app.services.stream_metrics import StreamMetrics
+
+
+def _report(metrics: StreamMetrics, **fields) -> None:
+    values = {
+        "frame": "100",
+        "fps": "25.0",
+        "bitrate": "1024.5kbits/s",
+        "drop_frames": "0",
+        "dup_frames": "0",
+        "speed": "1.0x",
+        **fields,
+    }
+    for name, value in values.items():
+        assert metrics.feed(f"{name}={value}".encode())
+    assert metrics.feed(b"progress=continue")
+
+
+def test_feed_ignores_log_lines():
+    metrics = StreamMetrics(max_samples=4)
+    assert not metrics.feed(b"[hls @ 0x55d5] Opening 'segment_001.ts' for writing")
+    assert not metrics.feed(b"Input #0, rtsp, from 'rtsp://camera'")
+    assert not metrics.samples
+
+
+def test_feed_builds_sample_per_progress_block():
+    metrics = StreamMetrics(max_samples=4)
+    assert metrics.feed(b"frame=250")
+    assert metrics.feed(b"fps=24.8")
+    # The block is only complete once FFmpeg writes its progress line
+    assert not metrics.samples
+
+    _report(metrics, frame="300", fps="25.1", bitrate="2048.0kbits/s", speed="1.02x", drop_frames="3", dup_frames="1")
+    _report(metrics, frame="310")
+    assert len(metrics.samples) == 2
+    assert metrics.samples[-1].frame == 310
+    sample = metrics.samples[0]
+    assert (sample.frame, sample.fps, sample.bitrate_kbps, sample.speed, sample.drop, sample.dup) == (
+        300, 25.1, 2048.0, 1.02, 3, 1
+    )
+
+
+def test_feed_handles_unknown_values():
+    metrics = StreamMetrics(max_samples=4)
+    # Before the first packet is written FFmpeg reports N/A
+    _report(metrics, bitrate="N/A", speed="N/A", fps="0.00")
+    sample = metrics.samples[0]
+    assert sample.bitrate_kbps is None
+    assert sample.speed is None
+    assert sample.fps == 0.0
+
+
+def test_feed_keeps_last_samples():
+    metrics = StreamMetrics(max_samples=3)
+    for frame in range(5):
+        _report(metrics, frame=str(frame))
+    assert [sample.frame for sample in metrics.samples] == [2, 3, 4]
+
+
+def test_summary_of_empty_window():
+    assert StreamMetrics(max_samples=4).summary(min_speed=0.9, stall_after=5.0) == {"samples": 0, "degraded": False}
+
+
+def test_summary_of_healthy_stream():
+    metrics = StreamMetrics(max_samples=4)
+    _report(metrics, frame="100", fps="24.0", bitrate="1000kbits/s", drop_frames="2")
+    _report(metrics, frame="150", fps="26.0", bitrate="N/A", drop_frames="2")
+    summary = metrics.summary(min_speed=0.9, stall_after=5.0)
+    assert summary["samples"] == 2
+    assert summary["frames"] == 150
+    assert summary["fps"] == 26.0
+    assert summary["fps_avg"] == 25.0
+    assert summary["fps_min"] == 24.0
+    assert summary["bitrate_kbps"] is None
+    assert summary["bitrate_avg_kbps"] == 1000.0
+    assert summary["speed_avg"] == 1.0
+    # Frames dropped before the window do not count
+    assert summary["dropped"] == 0
+    assert not summary["degraded"]
+
+
+def test_summary_degraded_by_drops():
+    metrics = StreamMetrics(max_samples=4)
+    _report(metrics, drop_frames="2")
+    _report(metrics, drop_frames="5")
+    summary = metrics.summary(min_speed=0.9, stall_after=5.0)
+    assert summary["dropped"] == 3
+    assert summary["degraded"]
+
+
+def test_summary_degraded_by_slow_speed():
+    metrics = StreamMetrics(max_samples=4)
+    _report(metrics, speed="0.8x")
+    _report(metrics, speed="0.9x")
+    summary = metrics.summary(min_speed=0.9, stall_after=5.0)
+    assert summary["speed_avg"] == 0.85
+    assert summary["degraded"]
+
+
+def test_summary_degraded_when_reports_stop():
+    metrics = StreamMetrics(max_samples=4)
+    _report(metrics)
+    metrics.samples[-1] = metrics.samples[-1]._replace(at=time.time() - 10)
+    summary = metrics.summary(min_speed=0.9, stall_after=5.0)
+    assert summary["age"] >= 10
+    assert summary["degraded"]
+
+
+def test_history_is_per_field():
+    metrics = StreamMetrics(max_samples=4)
+    _report(metrics, frame="1")
+    _report(metrics, frame="2")
+    history = metrics.history()
+    assert history["frame"] == [1, 2]
+    assert len(history["at"]) == 2
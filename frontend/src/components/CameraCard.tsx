@@ -1,7 +1,7 @@
 import { useCallback, useEffect, useRef, useState } from 'react';
 import Hls from 'hls.js';
 import { Camera, Play, Square, Maximize2, Settings, AlertCircle, Loader2 } from 'lucide-react';
-import type { Camera as CameraType } from '../types';
+import type { Camera as CameraType, StreamProfile } from '../types';
 import { streamApi, API_BASE_URL } from '../services/api';
 
 interface CameraCardProps {
@@ -11,6 +11,7 @@ interface CameraCardProps {
   autoStartTrigger?: number; // Increment this to trigger auto-start
   autoStartOnMount?: boolean;
   fitContainer?: boolean;
+  profile?: StreamProfile; // Grid tiles use the substream, fullscreen the main stream
 }
 
 export default function CameraCard({
@@ -20,6 +21,7 @@ export default function CameraCard({
   autoStartTrigger,
   autoStartOnMount = false,
   fitContainer = false,
+  profile = 'sub',
 }: CameraCardProps) {
   const videoRef = useRef<HTMLVideoElement>(null);
   const hlsRef = useRef<Hls | null>(null);
@@ -27,6 +29,7 @@ export default function CameraCard({
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const lastTriggerRef = useRef<number>(0);
+  const viewerIdRef = useRef<string | null>(null);
 
   const startStream = useCallback(async () => {
     if (!videoRef.current) return;
@@ -40,14 +43,10 @@ export default function CameraCard({
     setError(null);
 
     try {
-      const status = await streamApi.getStatus(camera.id);
-      let streamPath = status.stream_url;
-
-      // If stream isn't already running, start it.
-      if (!status.streaming || !streamPath) {
-        const response = await streamApi.start(camera.id);
-        streamPath = response.stream_url;
-      }
+      // Starting attaches this viewer to an already running stream.
+      const response = await streamApi.start(camera.id, viewerIdRef.current ?? undefined, profile);
+      viewerIdRef.current = response.viewer_id ?? null;
+      const streamPath = response.stream_url;
 
       if (!streamPath) {
         throw new Error('No stream URL returned by server');
@@ -139,7 +138,7 @@ export default function CameraCard({
       setError(errorMessage);
       setIsLoading(false);
     }
-  }, [camera.id]);
+  }, [camera.id, profile]);
 
   const stopStream = useCallback(async () => {
     if (hlsRef.current) {
@@ -152,13 +151,14 @@ export default function CameraCard({
     }
 
     try {
-      await streamApi.stop(camera.id);
+      await streamApi.stop(camera.id, viewerIdRef.current ?? undefined, profile);
+      viewerIdRef.current = null;
     } catch {
       // Ignore stop errors
     }
 
     setIsStreaming(false);
-  }, [camera.id]);
+  }, [camera.id, profile]);
 
   const scheduleAutoStart = useCallback(() => {
     let frameId = 0;
@@ -1089,7 +1089,7 @@ function ExpandedCameraView({ camera, onClose }: ExpandedCameraViewProps) {
         </button>
       </div>
       <div className="flex-1 min-h-0 p-2 sm:p-4">
-        <CameraCard camera={camera} autoStartOnMount fitContainer />
+        <CameraCard camera={camera} autoStartOnMount fitContainer profile="main" />
       </div>
     </div>
   );
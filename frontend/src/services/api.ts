@@ -10,6 +10,7 @@ import type {
   ShoppingItem,
   ShoppingItemCreate,
   Stats,
+  StreamProfile,
 } from '../types';
 
 const DEFAULT_API_BASE_URL = import.meta.env.VITE_API_URL?.trim() || '';
@@ -124,13 +125,17 @@ export const cameraApi = {
 
 // Stream API
 export const streamApi = {
-  start: async (cameraId: number): Promise<{ status: string; stream_url: string }> => {
-    const { data } = await api.post(`/streams/${cameraId}/start`);
+  start: async (
+    cameraId: number,
+    viewerId?: string,
+    profile: StreamProfile = 'main'
+  ): Promise<{ status: string; stream_url: string; viewer_id?: string; profile?: StreamProfile }> => {
+    const { data } = await api.post(`/streams/${cameraId}/start`, null, { params: { viewer_id: viewerId, profile } });
     return data;
   },
 
-  stop: async (cameraId: number): Promise<{ status: string }> => {
-    const { data } = await api.post(`/streams/${cameraId}/stop`);
+  stop: async (cameraId: number, viewerId?: string, profile: StreamProfile = 'main'): Promise<{ status: string; viewers?: number }> => {
+    const { data } = await api.post(`/streams/${cameraId}/stop`, null, { params: { viewer_id: viewerId, profile } });
     return data;
   },
 
@@ -10,6 +10,9 @@ export interface Camera {
   location?: string;
   brand: string;
   channels: number;
+  always_on: boolean;
+  record: boolean;
+  motion_detection: boolean;
   is_active: boolean;
   created_at: string;
   updated_at?: string;
@@ -26,8 +29,14 @@ export interface CameraCreate {
   location?: string;
   brand?: string;
   channels?: number;
+  always_on?: boolean;
+  record?: boolean;
+  motion_detection?: boolean;
 }
 
+// "main" is the camera's HD stream, "sub" its low-resolution substream
+export type StreamProfile = 'main' | 'sub';
+
 export interface CameraDiscovery {
   ip_address: string;
   port: number;